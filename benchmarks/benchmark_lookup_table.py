@@ -0,0 +1,109 @@
+"""
+Benchmark the LookupTableClassifier accelerator against the sklearn and ONNX prediction paths
+
+Usage: python benchmarks/benchmark_lookup_table.py [n_pixels] [n_windows]
+"""
+
+import json
+import sys
+import time
+
+import numpy as np
+from skl2onnx import to_onnx
+from sklearn.ensemble import RandomForestClassifier
+
+from planetsca import predict
+
+
+def make_model(random_state: int = 0) -> RandomForestClassifier:
+    # a forest with the train.train_model defaults, fitted to synthetic reflectance
+    rng = np.random.default_rng(random_state)
+    X = rng.integers(1, 10000, size=(20000, 4)) / 10000
+    y = (X[:, 0] - X[:, 3] + rng.normal(0, 0.1, len(X)) > 0).astype(int)
+    return RandomForestClassifier(
+        n_estimators=10, max_depth=10, max_features=4, random_state=random_state
+    ).fit(X, y)
+
+
+def make_pixels(n_pixels: int, n_spectra: int = 50000, random_state: int = 1):
+    # integer DN scaled to 0-1, drawn from a limited set of spectra like a real scene
+    rng = np.random.default_rng(random_state)
+    spectra = rng.integers(1, 10000, size=(n_spectra, 4))
+    return (spectra[rng.integers(0, n_spectra, n_pixels)] / 10000).astype(np.float32)
+
+
+def timeit(predict_fn, X):
+    start = time.perf_counter()
+    y = predict_fn(X)
+    return y, time.perf_counter() - start
+
+
+def timeit_windows(predict_fn, X, window_pixels):
+    # one call per window, like predict_sca(windowed=True) or n_threads
+    start = time.perf_counter()
+    y = np.concatenate(
+        [predict_fn(X[i : i + window_pixels]) for i in range(0, len(X), window_pixels)]
+    )
+    return y, time.perf_counter() - start
+
+
+def main_windows(n_windows: int = 60, window_pixels: int = 256 * 256) -> dict:
+    """
+    Benchmark many windows of diverse reflectance (each pixel drawn independently), where most codes are new to the memo
+    """
+    model = make_model()
+    n_pixels = n_windows * window_pixels
+    X = make_pixels(n_pixels, n_spectra=n_pixels)
+    lut = predict.LookupTableClassifier(model)
+
+    y_sklearn, t_sklearn = timeit_windows(model.predict, X, window_pixels)
+    y_lut, t_lut = timeit_windows(lut.predict, X, window_pixels)
+    return {
+        "n_windows": n_windows,
+        "window_pixels": window_pixels,
+        "memo_size": lut.cache_size,
+        "seconds": {"sklearn": t_sklearn, "lookup_table": t_lut},
+        "lookup_table_matches_sklearn": bool((y_lut == y_sklearn).all()),
+    }
+
+
+def main(n_pixels: int = 2_000_000) -> dict:
+    model = make_model()
+    X = make_pixels(n_pixels)
+
+    onnx_model = to_onnx(model, X[:1], target_opset=12)
+    lut = predict.LookupTableClassifier(model)
+
+    y_sklearn, t_sklearn = timeit(model.predict, X)
+    y_onnx, t_onnx = timeit(predict.make_predict_fn(onnx_model, engine="onnx"), X)
+    y_cold, t_cold = timeit(lut.predict, X)
+    y_warm, t_warm = timeit(lut.predict, X)
+
+    results = {
+        "n_pixels": n_pixels,
+        "bins_per_band": [len(edges) + 1 for edges in lut.bin_edges],
+        "seconds": {
+            "sklearn": t_sklearn,
+            "onnx": t_onnx,
+            "lookup_table_cold": t_cold,
+            "lookup_table_warm": t_warm,
+        },
+        "pixels_per_second": {
+            "sklearn": n_pixels / t_sklearn,
+            "onnx": n_pixels / t_onnx,
+            "lookup_table_cold": n_pixels / t_cold,
+            "lookup_table_warm": n_pixels / t_warm,
+        },
+        "lookup_table_matches_sklearn": bool(
+            (y_cold == y_sklearn).all() and (y_warm == y_sklearn).all()
+        ),
+        "onnx_matches_sklearn": float((y_onnx == y_sklearn).mean()),
+    }
+    return results
+
+
+if __name__ == "__main__":
+    n_pixels = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    n_windows = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    print(json.dumps(main(n_pixels), indent=2))
+    print(json.dumps(main_windows(n_windows), indent=2))
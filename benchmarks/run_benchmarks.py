@@ -0,0 +1,266 @@
+"""
+Benchmark suite for the predict, train and rasterize hot paths
+
+Synthetic 4-band GeoTIFFs of several sizes, labeled polygons and a small random forest are built locally (no network access
+is needed). Each benchmark runs in a fresh process so that its peak resident set size (RSS) is measured on its own. Results
+are written as JSON lines, one record per benchmark and image size, so they can be compared between releases.
+
+Usage: python benchmarks/run_benchmarks.py [--sizes 512 2048] [--repeat 3] [--output results.jsonl]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# benchmarks that can be run, in the order they are run
+BENCHMARKS = [
+    "predict_sca",
+    "predict_sca_windowed",
+    "predict_sca_numpy",
+    "predict_sca_lookup_table",
+    "predict_sca_onnx",
+    "vector_rasterize",
+    "data_training_new",
+    "train_model",
+]
+
+
+def make_image(filepath: str, size: int, nodata_fraction: float = 0.3) -> str:
+    """
+    Write a synthetic 4-band PlanetScope SR image of size x size pixels, with a clipped (nodata) border
+    """
+    import rasterio
+    from rasterio.transform import from_origin
+
+    rng = np.random.default_rng(size)
+    arr = rng.integers(1, 10000, size=(4, size, size), dtype=np.uint16)
+    arr[:, : int(size * nodata_fraction), :] = 0
+    with rasterio.open(
+        filepath,
+        "w",
+        driver="GTiff",
+        transform=from_origin(600000, 4200000, 3, 3),
+        dtype=rasterio.uint16,
+        count=4,
+        crs="EPSG:32611",
+        width=size,
+        height=size,
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+    ) as dst:
+        dst.write(arr)
+    return filepath
+
+
+def make_polygons(filepath: str, size: int, n_polygons: int = 20) -> str:
+    """
+    Write synthetic labeled polygons (snow = 1, no snow = 0) covering parts of a synthetic image
+    """
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    rng = np.random.default_rng(size)
+    extent = size * 3
+    corners = rng.uniform(0, extent * 0.9, size=(n_polygons, 2))
+    widths = rng.uniform(extent * 0.02, extent * 0.1, size=(n_polygons, 2))
+    gdf = gpd.GeoDataFrame(
+        {"label": rng.integers(0, 2, n_polygons)},
+        geometry=[
+            box(600000 + x, 4200000 - y - h, 600000 + x + w, 4200000 - y)
+            for (x, y), (w, h) in zip(corners, widths)
+        ],
+        crs="EPSG:32611",
+    )
+    gdf.to_file(filepath, driver="GeoJSON")
+    return filepath
+
+
+def make_training_data(n_samples: int = 20000):
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        rng.integers(1, 10000, size=(n_samples, 4)) / 10000,
+        columns=["blue", "green", "red", "nir"],
+    )
+    df["label"] = (df["blue"] - df["nir"] + rng.normal(0, 0.1, n_samples) > 0).astype(
+        int
+    )
+    return df
+
+
+def make_model():
+    from sklearn.ensemble import RandomForestClassifier
+
+    # a forest with the train.train_model defaults
+    df = make_training_data()
+    return RandomForestClassifier(
+        n_estimators=10, max_depth=10, max_features=4, random_state=0
+    ).fit(df[["blue", "green", "red", "nir"]], df["label"])
+
+
+def run_benchmark(name: str, size: int, workdir: str, repeat: int) -> dict:
+    """
+    Set up and time a single benchmark in this process
+    """
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    from planetsca import predict, train
+
+    image = os.path.join(workdir, f"bench_{size}_SR.tif")
+    polygons = os.path.join(workdir, f"bench_{size}_polygons.geojson")
+    outdir = os.path.join(workdir, f"out_{name}_{size}")
+    os.makedirs(outdir, exist_ok=True)
+
+    if name.startswith("predict_sca"):
+        model = make_model()
+        if name == "predict_sca_onnx":
+            from skl2onnx import to_onnx
+
+            model = to_onnx(model, np.zeros((1, 4), dtype=np.float32), target_opset=12)
+            run = lambda: predict.predict_sca_onnx(image, model, outdir)  # noqa: E731
+        else:
+            kwargs = {
+                "predict_sca": {},
+                "predict_sca_windowed": {"windowed": True},
+                "predict_sca_numpy": {"engine": "numpy"},
+                "predict_sca_lookup_table": {"engine": "lookup_table"},
+            }[name]
+            run = lambda: predict.predict_sca(image, model, outdir, **kwargs)  # noqa: E731
+        n_pixels = size * size
+    elif name == "vector_rasterize":
+        run = lambda: train.vector_rasterize(polygons, image)  # noqa: E731
+        n_pixels = size * size
+    elif name == "data_training_new":
+        run = lambda: train.data_training_new(polygons, image)  # noqa: E731
+        n_pixels = size * size
+    elif name == "train_model":
+        df = make_training_data(n_samples=size * 20)
+        run = lambda: train.train_model(  # noqa: E731
+            df,
+            os.path.join(outdir, "model.joblib"),
+            os.path.join(outdir, "scores.csv"),
+            random_state=0,
+        )
+        n_pixels = len(df)
+    else:
+        raise ValueError(f"Unknown benchmark: {name}")
+
+    rss_start = current_rss()
+    wall_times, cpu_times = [], []
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run()
+        wall_times.append(time.perf_counter() - wall_start)
+        cpu_times.append(time.process_time() - cpu_start)
+
+    wall_time = min(wall_times)
+    return {
+        "benchmark": name,
+        "size": size,
+        "n_pixels": n_pixels,
+        "repeat": repeat,
+        "wall_time_s": wall_time,
+        "cpu_time_s": min(cpu_times),
+        "pixels_per_s": n_pixels / wall_time,
+        "peak_rss_bytes": peak_rss(),
+        "rss_before_bytes": rss_start,
+        "peak_rss_increase_bytes": max(peak_rss() - rss_start, 0),
+    }
+
+
+def peak_rss() -> int:
+    """
+    Peak resident set size of this process, in bytes
+    """
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def current_rss() -> int:
+    """
+    Current resident set size of this process, in bytes (the peak RSS where this is not available)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return peak_rss()
+
+
+def _run_in_child(queue, *args):
+    try:
+        queue.put(run_benchmark(*args))
+    except Exception as e:
+        queue.put({"benchmark": args[0], "size": args[1], "error": repr(e)})
+
+
+def main(sizes=(512, 2048), benchmarks=BENCHMARKS, repeat=3, output=None) -> list:
+    from planetsca import __version__
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            make_image(os.path.join(workdir, f"bench_{size}_SR.tif"), size)
+            make_polygons(os.path.join(workdir, f"bench_{size}_polygons.geojson"), size)
+
+        for name in benchmarks:
+            for size in sizes:
+                # a fresh process for each benchmark, so peak RSS is not shared between them
+                queue = context.Queue()
+                process = context.Process(
+                    target=_run_in_child, args=(queue, name, size, workdir, repeat)
+                )
+                process.start()
+                result = queue.get()
+                process.join()
+
+                result.update(
+                    {
+                        "planetsca_version": __version__,
+                        "python_version": platform.python_version(),
+                        "machine": platform.machine(),
+                        "cpu_count": os.cpu_count(),
+                    }
+                )
+                results.append(result)
+                line = json.dumps(result)
+                print(line)
+                if output is not None:
+                    with open(output, "a") as f:
+                        f.write(line + "\n")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[512, 2048],
+        help="image sizes in pixels",
+    )
+    parser.add_argument(
+        "--benchmarks", nargs="+", default=BENCHMARKS, choices=BENCHMARKS
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="timed runs per benchmark"
+    )
+    parser.add_argument("--output", help="JSON lines file to append the results to")
+    args = parser.parse_args()
+    main(args.sizes, args.benchmarks, args.repeat, args.output)
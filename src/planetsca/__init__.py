@@ -1,11 +1,14 @@
-from . import download, predict, search, train
+from . import catalog, download, instrument, predict, search, stats, train
 from .version import version as __version__
 
 __all__ = [
     "__version__",
+    "catalog",
     "download",
+    "instrument",
     "train",
     "predict",
     "search",
+    "stats",
     "simplify_aoi",
 ]
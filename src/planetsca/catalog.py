@@ -0,0 +1,328 @@
+import glob
+import os
+import re
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+import rasterio
+from rasterio.warp import transform_bounds
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenes (
+    path TEXT PRIMARY KEY,
+    scene_id TEXT,
+    acquired TEXT,
+    west REAL,
+    south REAL,
+    east REAL,
+    north REAL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    added REAL
+);
+CREATE INDEX IF NOT EXISTS scenes_scene_id ON scenes (scene_id);
+CREATE INDEX IF NOT EXISTS scenes_acquired ON scenes (acquired);
+CREATE TABLE IF NOT EXISTS predictions (
+    path TEXT,
+    model_hash TEXT,
+    options_hash TEXT,
+    output_path TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    output_size INTEGER,
+    output_mtime_ns INTEGER,
+    created REAL,
+    PRIMARY KEY (path, model_hash, options_hash)
+);
+"""
+
+# PlanetScope scene ids, e.g. 20230725_180512_37_2479, at the start of the file names
+SCENE_ID_PATTERN = re.compile(r"(\d{8})_(\d{6})(?:_\d{2})?_[0-9a-f]{4}")
+
+
+def connect(catalog_path: str) -> sqlite3.Connection:
+    """
+    Open (and create if needed) a catalog database
+    """
+    connection = sqlite3.connect(catalog_path, timeout=60)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def parse_scene_id(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Find the PlanetScope scene id and acquisition time in a file name
+
+    Parameters
+    ----------
+        path: str
+            file path to a PlanetScope image, e.g. '20230725_180512_37_2479_3B_AnalyticMS_SR_clip.tif'
+
+    Returns
+    ----------
+        scene_id: Optional[str]
+            the scene id, e.g. '20230725_180512_37_2479', or None if the file name does not contain one
+        acquired: Optional[str]
+            the acquisition time, e.g. '2023-07-25T18:05:12Z', or None
+    """
+    match = SCENE_ID_PATTERN.search(os.path.basename(path))
+    if match is None:
+        return None, None
+    date, hms = match.groups()
+    acquired = f"{date[:4]}-{date[4:6]}-{date[6:]}T{hms[:2]}:{hms[2:4]}:{hms[4:]}Z"
+    return match.group(0), acquired
+
+
+def add_scenes(catalog_path: str, paths: List[str]) -> None:
+    """
+    Record images in the catalog, with their scene id, acquisition time, footprint, size and modification time
+
+    Parameters
+    ----------
+        catalog_path: str
+            Path to the SQLite catalog database
+        paths: List[str]
+            file paths to PlanetScope images
+    """
+    rows = []
+    for path in paths:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        scene_id, acquired = parse_scene_id(path)
+        with rasterio.open(path) as ds:
+            # footprint as longitude and latitude bounds
+            bounds = (
+                transform_bounds(ds.crs, "EPSG:4326", *ds.bounds)
+                if ds.crs is not None
+                else (None, None, None, None)
+            )
+        rows.append((path, scene_id, acquired, *bounds, stat.st_size, stat.st_mtime_ns))
+    connection = connect(catalog_path)
+    try:
+        connection.executemany(
+            "INSERT OR REPLACE INTO scenes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(*row, time.time()) for row in rows],
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def scan_directory(
+    catalog_path: str, dirpath: str, pattern: str = "**/*SR*.tif"
+) -> int:
+    """
+    Record the images in a directory that are not in the catalog yet
+
+    Parameters
+    ----------
+        catalog_path: str
+            Path to the SQLite catalog database
+        dirpath: str
+            directory containing PlanetScope images
+        pattern: str
+            glob pattern of the images, defaults to surface reflectance (SR) images in any subdirectory
+
+    Returns
+    ----------
+        n_added: int
+            number of images added to the catalog
+    """
+    paths = [
+        os.path.abspath(path)
+        for path in glob.glob(os.path.join(dirpath, pattern), recursive=True)
+    ]
+    connection = connect(catalog_path)
+    try:
+        known = {
+            path
+            for (path,) in connection.execute(
+                "SELECT path FROM scenes WHERE path >= ? AND path < ?",
+                directory_range(dirpath),
+            )
+        }
+    finally:
+        connection.close()
+    new_paths = [path for path in paths if path not in known]
+    add_scenes(catalog_path, new_paths)
+    return len(new_paths)
+
+
+def directory_range(dirpath: str) -> Tuple[str, str]:
+    """
+    Helper function giving the range of paths inside a directory, for an indexed query on the path column
+    """
+    prefix = os.path.join(os.path.abspath(dirpath), "")
+    # the separator is followed in sort order by the next character
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def find_scenes(
+    catalog_path: str,
+    dirpath: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    bounds: Optional[List[float]] = None,
+    name_contains: Optional[str] = "SR",
+) -> List[str]:
+    """
+    Query the catalog for images, instead of searching directories for them
+
+    Parameters
+    ----------
+        catalog_path: str
+            Path to the SQLite catalog database
+        dirpath: Optional[str]
+            only return images inside this directory, defaults to None (any directory)
+        start: Optional[str]
+            only return images acquired on or after this time, e.g. '2023-07-01', defaults to None
+        end: Optional[str]
+            only return images acquired before this time, e.g. '2023-08-01', defaults to None
+        bounds: Optional[List[float]]
+            only return images whose footprint intersects these longitude and latitude bounds, in the order
+            [minLon, minLat, maxLon, maxLat], defaults to None
+        name_contains: Optional[str]
+            only return images whose file name contains this string, defaults to "SR" (surface reflectance images)
+
+    Returns
+    ----------
+        paths: List[str]
+            file paths of the images, sorted by path
+    """
+    conditions, parameters = [], []
+    if dirpath is not None:
+        conditions.append("path >= ? AND path < ?")
+        parameters.extend(directory_range(dirpath))
+    if start is not None:
+        conditions.append("acquired >= ?")
+        parameters.append(start)
+    if end is not None:
+        conditions.append("acquired < ?")
+        parameters.append(end)
+    if bounds is not None:
+        conditions.append("east >= ? AND west <= ? AND north >= ? AND south <= ?")
+        parameters.extend([bounds[0], bounds[2], bounds[1], bounds[3]])
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    connection = connect(catalog_path)
+    try:
+        paths = [
+            path
+            for (path,) in connection.execute(
+                f"SELECT path FROM scenes{where} ORDER BY path", parameters
+            )
+        ]
+    finally:
+        connection.close()
+    if name_contains is not None:
+        paths = [path for path in paths if name_contains in os.path.basename(path)]
+    return paths
+
+
+def add_predictions(
+    catalog_path: str,
+    predictions: Dict[str, str],
+    model_hash: str,
+    options_hash: str = "",
+) -> None:
+    """
+    Record the SCA images produced from images with a model
+
+    Parameters
+    ----------
+        catalog_path: str
+            Path to the SQLite catalog database
+        predictions: Dict[str, str]
+            file path of the SCA image produced from each image
+        model_hash: str
+            hash that identifies the model, see predict.model_hash()
+        options_hash: str
+            hash of the prediction options that change the SCA images, see predict.options_hash(), defaults to ""
+    """
+    rows = []
+    for path, output_path in predictions.items():
+        stat = os.stat(path)
+        output_stat = os.stat(output_path)
+        rows.append(
+            (
+                os.path.abspath(path),
+                model_hash,
+                options_hash,
+                os.path.abspath(output_path),
+                stat.st_size,
+                stat.st_mtime_ns,
+                output_stat.st_size,
+                output_stat.st_mtime_ns,
+                time.time(),
+            )
+        )
+    connection = connect(catalog_path)
+    try:
+        connection.executemany(
+            "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def find_predictions(
+    catalog_path: str,
+    paths: List[str],
+    model_hash: str,
+    options_hash: str = "",
+    output_paths: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
+    """
+    Find the images that were already predicted with a model and options, and whose image and SCA image have not
+    changed since
+
+    Parameters
+    ----------
+        catalog_path: str
+            Path to the SQLite catalog database
+        paths: List[str]
+            file paths to PlanetScope images
+        model_hash: str
+            hash that identifies the model, see predict.model_hash()
+        options_hash: str
+            hash of the prediction options that change the SCA images, see predict.options_hash(), defaults to ""
+        output_paths: Optional[Dict[str, str]]
+            file path of the SCA image expected for each image, images whose SCA image was written elsewhere are not
+            returned, defaults to None (any SCA image)
+
+    Returns
+    ----------
+        predictions: Dict[str, str]
+            file path of the SCA image already produced from each image, for the images whose size and modification
+            time are unchanged and whose SCA image still exists with its recorded size and modification time (an SCA
+            image overwritten since, e.g. by a prediction without the catalog, is predicted again)
+    """
+    predictions = {}
+    connection = connect(catalog_path)
+    try:
+        for path in paths:
+            row = connection.execute(
+                "SELECT output_path, size, mtime_ns, output_size, output_mtime_ns FROM predictions "
+                "WHERE path = ? AND model_hash = ? AND options_hash = ?",
+                (os.path.abspath(path), model_hash, options_hash),
+            ).fetchone()
+            if row is None or not os.path.isfile(row[0]):
+                continue
+            if output_paths is not None and row[0] != os.path.abspath(
+                output_paths[path]
+            ):
+                continue
+            stat, output_stat = os.stat(path), os.stat(row[0])
+            if (
+                stat.st_size,
+                stat.st_mtime_ns,
+                output_stat.st_size,
+                output_stat.st_mtime_ns,
+            ) == row[1:]:
+                predictions[path] = row[0]
+    finally:
+        connection.close()
+    return predictions
@@ -1,17 +1,31 @@
+import contextlib
+import datetime
+import email.utils
+import fnmatch
+import hashlib
 import json
 import os
 import pathlib
+import random
+import threading
 import time
-from typing import List, Optional
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, List, Literal, Optional
 
+import geopandas as gpd
 import joblib
 import onnx
 import requests
 from huggingface_hub import hf_hub_download
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from sklearn.ensemble import RandomForestClassifier
 
-from planetsca import search
+from planetsca import catalog, search
+
+ORDERS_URL = "https://api.planet.com/compute/ops/orders/v2"
+# maximum number of items the Planet Orders API accepts in one order
+MAX_ITEMS_PER_ORDER = 500
 
 
 def order(
@@ -29,7 +43,8 @@ def order(
         api_key: str
             Planet API key
         id_list: List[str]
-            Item id that contains date and location information
+            Item id that contains date and location information, at most MAX_ITEMS_PER_ORDER (500) ids, a ValueError is
+            raised for more, see order_and_download_chunks()
         filter: dict
             Dictionary containing data filter information
         item_type: str
@@ -43,6 +58,12 @@ def order(
             URL from which to download image from Planet API
     """
 
+    if len(id_list) > MAX_ITEMS_PER_ORDER:
+        raise ValueError(
+            f"{len(id_list)} image ids is more than the {MAX_ITEMS_PER_ORDER} allowed in one order, "
+            "use order_and_download_chunks() to split them into several orders"
+        )
+
     # build payload
     payload = build_payload(
         id_list,
@@ -58,7 +79,11 @@ def order(
 
 
 def build_payload(
-    item_ids: List[str], aoi_coordinates: List[float], item_type: str, bundle_type: str
+    item_ids: List[str],
+    aoi_coordinates: List[float],
+    item_type: str,
+    bundle_type: str,
+    name: Optional[str] = None,
 ) -> dict:
     """
     Helper function building payload for the Planet API
@@ -73,6 +98,8 @@ def build_payload(
             Class of spacecraft and/or processing level of an item, defaults to PSScene. See https://developers.planet.com/docs/apis/data/items-assets/
         bundle_type: str
             Groups of assets for an item and contain metadata, defaults to analytic_sr_udm2. See https://developers.planet.com/apis/orders/product-bundles-reference/#surface-reflectance-4b
+        name: Optional[str]
+            Name of the order, defaults to the first item id
 
     Returns
     -------
@@ -81,7 +108,8 @@ def build_payload(
     """
 
     payload = {
-        "name": item_ids[0],  # use the first item id as a name for this order payload
+        # use the first item id as a name for this order payload by default
+        "name": name if name is not None else item_ids[0],
         "source_type": "scenes",
         "products": [
             {
@@ -97,6 +125,151 @@ def build_payload(
     return payload
 
 
+def chunk_ids(
+    item_ids: List[str],
+    max_items: int = MAX_ITEMS_PER_ORDER,
+    group_by: Optional[Literal["date", "footprint"]] = "date",
+    gdf: Optional[gpd.GeoDataFrame] = None,
+) -> List[List[str]]:
+    """
+    Helper function splitting item ids into chunks small enough for one order each
+
+    Parameters
+    ----------
+        item_ids: List[str]
+            Item ids that contain date and location information
+        max_items: int
+            Maximum number of item ids in a chunk, defaults to MAX_ITEMS_PER_ORDER (500)
+        group_by: Optional[Literal["date", "footprint"]]
+            "date" to keep items acquired on the same day in the same chunk where possible, "footprint" to put items with
+            nearby footprints in the same chunk (requires gdf), or None to keep the given order, defaults to "date"
+        gdf: Optional[geopandas.geodataframe.GeoDataFrame]
+            GeoDataFrame of search results from search.search(), with the "id", "acquired" and geometry of each item.
+            Without it the acquisition date is read from the start of the item id (YYYYMMDD)
+
+    Returns
+    -------
+        chunks: List[List[str]]
+            item ids of each chunk
+    """
+    if group_by == "date":
+        dates = {}
+        if gdf is not None:
+            dates = dict(zip(gdf["id"], gdf["acquired"].str[:10].str.replace("-", "")))
+        groups = {}
+        for item_id in sorted(item_ids, key=lambda i: (dates.get(i, i[:8]), i)):
+            groups.setdefault(dates.get(item_id, item_id[:8]), []).append(item_id)
+        # pack whole days into chunks, only splitting the days larger than a chunk
+        return pack_groups(list(groups.values()), max_items)
+    if group_by == "footprint":
+        if gdf is None:
+            raise ValueError('group_by="footprint" requires the search results gdf')
+        # order the footprints along a Hilbert curve so that consecutive items are close together
+        footprints = gdf.drop_duplicates("id").set_index("id").loc[item_ids].geometry
+        distance = footprints.centroid.hilbert_distance()
+        item_ids = list(distance.sort_values(kind="stable").index)
+    elif group_by is not None:
+        raise ValueError(f"Unknown group_by {group_by!r}")
+    return [
+        list(item_ids[start : start + max_items])
+        for start in range(0, len(item_ids), max_items)
+    ]
+
+
+def pack_groups(groups: List[List[str]], max_items: int) -> List[List[str]]:
+    """
+    Helper function packing groups of item ids into chunks of at most max_items, keeping each group in one chunk unless
+    it is larger than a chunk
+
+    Parameters
+    ----------
+        groups: List[List[str]]
+            groups of item ids, in order
+        max_items: int
+            Maximum number of item ids in a chunk
+
+    Returns
+    -------
+        chunks: List[List[str]]
+            item ids of each chunk
+    """
+    chunks = [[]]
+    for group in groups:
+        if len(chunks[-1]) + len(group) > max_items and len(group) <= max_items:
+            chunks.append([])
+        for item_id in group:
+            if len(chunks[-1]) == max_items:
+                chunks.append([])
+            chunks[-1].append(item_id)
+    return [chunk for chunk in chunks if chunk]
+
+
+def order_name(item_ids: List[str]) -> str:
+    """
+    Helper function making a deterministic order name from item ids
+
+    The name is made of the first and last item ids (sorted) and a hash of all of them, so the same chunk of items always
+    gets the same name and can be tracked across runs.
+
+    Parameters
+    ----------
+        item_ids: List[str]
+            Item ids in the order
+
+    Returns
+    ----------
+        name: str
+            Name of the order
+    """
+    item_ids = sorted(item_ids)
+    digest = hashlib.sha1("\n".join(item_ids).encode()).hexdigest()[:8]
+    return f"{item_ids[0]}-{item_ids[-1]}_{len(item_ids)}_{digest}"
+
+
+def build_payloads(
+    item_ids: List[str],
+    aoi_coordinates: List[float],
+    item_type: str = "PSScene",
+    bundle_type: str = "analytic_sr_udm2",
+    max_items: int = MAX_ITEMS_PER_ORDER,
+    group_by: Optional[Literal["date", "footprint"]] = "date",
+    gdf: Optional[gpd.GeoDataFrame] = None,
+) -> List[dict]:
+    """
+    Helper function building payloads for the Planet API, splitting the item ids into several orders
+
+    Parameters
+    ----------
+        item_ids: List[str]
+            Item ids that contain date and location information
+        aoi_coordinates: List[float]
+            Area of interest coordinates
+        item_type: str
+            Class of spacecraft and/or processing level of an item, defaults to PSScene. See https://developers.planet.com/docs/apis/data/items-assets/
+        bundle_type: str
+            Groups of assets for an item and contain metadata, defaults to analytic_sr_udm2. See https://developers.planet.com/apis/orders/product-bundles-reference/#surface-reflectance-4b
+        max_items: int
+            Maximum number of item ids in an order, defaults to MAX_ITEMS_PER_ORDER (500)
+        group_by: Optional[Literal["date", "footprint"]]
+            How item ids are grouped into orders, see chunk_ids(), defaults to "date"
+        gdf: Optional[geopandas.geodataframe.GeoDataFrame]
+            GeoDataFrame of search results from search.search(), see chunk_ids()
+
+    Returns
+    -------
+        payloads: List[dict]
+            Dictionaries containing all necessary information for the Planet API, one per order, named with order_name()
+    """
+    return [
+        build_payload(
+            chunk, aoi_coordinates, item_type, bundle_type, name=order_name(chunk)
+        )
+        for chunk in chunk_ids(
+            item_ids, max_items=max_items, group_by=group_by, gdf=gdf
+        )
+    ]
+
+
 def order_now(api_key, payload):
     """
     Helper function for ordering data from Planet
@@ -114,9 +287,8 @@ def order_now(api_key, payload):
             URL from which to download image from Planet API
     """
 
-    orders_url = "https://api.planet.com/compute/ops/orders/v2"
     response = requests.post(
-        orders_url,
+        ORDERS_URL,
         data=json.dumps(payload),
         auth=HTTPBasicAuth(api_key, ""),
         headers={"Content-Type": "application/json"},
@@ -125,14 +297,14 @@ def order_now(api_key, payload):
 
     if response.status_code == 202:
         order_id = response.json()["id"]
-        url = f"https://api.planet.com/compute/ops/orders/v2/{order_id}"
+        url = f"{ORDERS_URL}/{order_id}"
         # feature_check = requests.get(url, auth=(PLANET_API_KEY, ""))
         feature_check = requests.get(url, auth=HTTPBasicAuth(api_key, ""))
         if feature_check.status_code == 200:
             print(
                 f"Submitted a total of {len(feature_check.json()['products'][0]['item_ids'])} image ids: accepted a total of {len(feature_check.json()['products'][0]['item_ids'])} ids"
             )
-            order_url = f"https://api.planet.com/compute/ops/orders/v2/{order_id}"
+            order_url = f"{ORDERS_URL}/{order_id}"
             print(f"Order URL: {order_url}")
             return order_url
     else:
@@ -140,11 +312,452 @@ def order_now(api_key, payload):
         return response
 
 
+class RateLimitedSession(requests.Session):
+    """
+    requests Session that spaces out its requests, so that all the threads sharing it stay under a rate limit
+
+    Parameters
+    ----------
+        requests_per_second: float
+            Maximum number of requests per second
+    """
+
+    def __init__(self, requests_per_second: float):
+        super().__init__()
+        self.interval = 1.0 / requests_per_second
+        self._next_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def request(self, *args, **kwargs) -> requests.Response:
+        # reserve the next free slot, then wait for it outside of the lock
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_time)
+            self._next_time = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+        return super().request(*args, **kwargs)
+
+
+def make_session(
+    api_key: Optional[str] = None,
+    pool_size: int = 10,
+    max_retries: int = 3,
+    requests_per_second: Optional[float] = None,
+) -> requests.Session:
+    """
+    Helper function making a requests Session with a connection pool, shared by concurrent requests
+
+    Parameters
+    ----------
+        api_key: Optional[str]
+            Planet API key used to authenticate requests, defaults to None (no authentication)
+        pool_size: int
+            Maximum number of connections kept open to each host, defaults to 10
+        max_retries: int
+            Number of times to retry failed connections, defaults to 3
+        requests_per_second: Optional[float]
+            Maximum number of requests per second made with the session, across all threads, defaults to None (no limit)
+
+    Returns
+    ----------
+        session: requests.Session
+            the session
+    """
+    if requests_per_second is None:
+        session = requests.Session()
+    else:
+        session = RateLimitedSession(requests_per_second)
+    if api_key is not None:
+        session.auth = HTTPBasicAuth(api_key, "")
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=max_retries
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def verify_checksum(
+    path: str, digests: Optional[dict], chunk_size: int = 1024 * 1024
+) -> bool:
+    """
+    Helper function checking a file against the first supported checksum in a dictionary of digests
+
+    Parameters
+    ----------
+        path: str
+            Path to the file
+        digests: Optional[dict]
+            Expected checksums keyed on hashlib algorithm name, e.g. {"md5": "..."} or {"sha256": "..."}
+        chunk_size: int
+            Number of bytes to read at a time, defaults to 1 MiB
+
+    Returns
+    ----------
+        valid: bool
+            False if the file does not match the checksum, True if it does or if there is no supported checksum
+    """
+    for name, digest in (digests or {}).items():
+        if name in hashlib.algorithms_available:
+            hasher = hashlib.new(name)
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    hasher.update(chunk)
+            return hasher.hexdigest() == digest
+    return True
+
+
+def download_range(
+    session: requests.Session,
+    url: str,
+    path: str,
+    offset: int = 0,
+    chunk_size: int = 1024 * 1024,
+) -> Optional[int]:
+    """
+    Helper function streaming a file, from a byte offset onwards, to disk in chunks
+
+    Parameters
+    ----------
+        session: requests.Session
+            Session used to make the request
+        url: str
+            URL of the file to download
+        path: str
+            Path to save the file to, bytes are appended to it if offset is greater than 0
+        offset: int
+            Number of bytes of the file already in path, requested with an HTTP Range request, defaults to 0
+        chunk_size: int
+            Number of bytes to read and write at a time, defaults to 1 MiB
+
+    Returns
+    ----------
+        total_size: Optional[int]
+            Size of the whole file reported by the server, or None if it was not reported
+    """
+    headers = {"Range": f"bytes={offset}-"} if offset > 0 else {}
+    with session.get(url, stream=True, allow_redirects=True, headers=headers) as r:
+        if r.status_code == 416:
+            # the range is not valid for this file, start again from the beginning
+            r.close()
+            return download_range(session, url, path, 0, chunk_size)
+        r.raise_for_status()
+
+        if r.status_code == 206:
+            # the server sent the rest of the file, append it
+            mode = "ab"
+            total_size = r.headers.get("Content-Range", "").rpartition("/")[2]
+        else:
+            # the server sent the whole file
+            mode = "wb"
+            total_size = r.headers.get("Content-Length", "")
+
+        with open(path, mode) as f:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+
+    return int(total_size) if total_size.isdigit() else None
+
+
+def download_file(
+    session: requests.Session,
+    url: str,
+    path: str,
+    chunk_size: int = 1024 * 1024,
+    expected_size: Optional[int] = None,
+    digests: Optional[dict] = None,
+) -> str:
+    """
+    Helper function streaming a file to disk in chunks, so that memory use does not depend on the file size
+
+    The file is first written to a temporary "<path>.part" file, and renamed to path once it is complete and verified.
+    If a "<path>.part" file is left over from an interrupted download, the rest of the file is requested with an HTTP
+    Range request and appended to it.
+
+    Parameters
+    ----------
+        session: requests.Session
+            Session used to make the request
+        url: str
+            URL of the file to download
+        path: str
+            Path to save the file to
+        chunk_size: int
+            Number of bytes to read and write at a time, defaults to 1 MiB
+        expected_size: Optional[int]
+            Expected size of the file in bytes, defaults to None (use the size reported by the server, if any)
+        digests: Optional[dict]
+            Expected checksums of the file keyed on hashlib algorithm name, e.g. {"md5": "..."} or {"sha256": "..."}, as listed in Planet order manifests, defaults to None (no checksum verification)
+
+    Returns
+    ----------
+        path: str
+            Path to the downloaded file
+    """
+    pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+    part_path = path + ".part"
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if expected_size is not None and offset > expected_size:
+        offset = 0
+    if expected_size is None or offset < expected_size:
+        total_size = download_range(session, url, part_path, offset, chunk_size)
+        if expected_size is None:
+            expected_size = total_size
+
+    size = os.path.getsize(part_path)
+    if expected_size is not None and size != expected_size:
+        if size > expected_size:
+            os.remove(part_path)
+        raise OSError(
+            f"Incomplete download of {url}: received {size} of {expected_size} bytes"
+        )
+    if not verify_checksum(part_path, digests, chunk_size):
+        # the partial file is corrupt, remove it so that the next attempt starts from the beginning
+        os.remove(part_path)
+        raise OSError(f"Checksum mismatch for {url}")
+
+    # move the complete file into place
+    os.replace(part_path, path)
+    return path
+
+
+def read_manifest(manifest_path: str, name: str) -> dict:
+    """
+    Helper function reading the file sizes and checksums listed in a Planet order manifest
+
+    Parameters
+    ----------
+        manifest_path: str
+            Path to a downloaded manifest.json file
+        name: str
+            Name of the manifest in the order results, file paths in the manifest are relative to it
+
+    Returns
+    ----------
+        manifest: dict
+            Dictionary of {"size": ..., "digests": {...}} for each file, keyed on the file's name in the order results
+    """
+    with open(manifest_path) as f:
+        files = json.load(f).get("files", [])
+    base = os.path.dirname(name)
+    return {
+        os.path.normpath(os.path.join(base, file["path"])): {
+            "size": file.get("size"),
+            "digests": file.get("digests"),
+        }
+        for file in files
+        if "path" in file
+    }
+
+
+def download_results(
+    results: List[dict],
+    out_dirpath: str,
+    overwrite: bool = False,
+    max_workers: int = 4,
+    chunk_size: int = 1024 * 1024,
+    session: Optional[requests.Session] = None,
+    executor: Optional[Executor] = None,
+) -> List[str]:
+    """
+    Helper function downloading the results of a Planet order concurrently
+
+    Order manifests are downloaded first, and the sizes and checksums they list are used to verify the other files.
+    Interrupted downloads are resumed, and existing files that do not match the manifest are downloaded again.
+
+    Parameters
+    ----------
+        results: List[dict]
+            Order results, each with a "location" (URL) and "name" (relative file path), from the "_links" of an order
+        out_dirpath: str
+            Path to output directory
+        overwrite: bool
+            Whether or not to overwrite existing files, defaults to False
+        max_workers: int
+            Maximum number of files to download at the same time, defaults to 4
+        chunk_size: int
+            Number of bytes to read and write at a time, defaults to 1 MiB
+        session: Optional[requests.Session]
+            Session to make the requests with, defaults to None (make a new session)
+        executor: Optional[Executor]
+            Executor to run the downloads on, e.g. one shared by several orders to limit the total number of downloads, defaults to None (a new pool of max_workers threads)
+
+    Returns
+    ----------
+        paths: List[str]
+            Paths to the downloaded (or already existing) files, in the same order as results
+    """
+    print("{} items to download".format(len(results)))
+    if session is None:
+        session = make_session(pool_size=max_workers)
+
+    manifest = {}
+
+    def download_result(result):
+        path = os.path.join(out_dirpath, result["name"])
+        expected = manifest.get(os.path.normpath(result["name"]), {})
+        expected_size = expected.get("size")
+        if (
+            overwrite
+            or not os.path.exists(path)
+            or (expected_size is not None and os.path.getsize(path) != expected_size)
+        ):
+            print("downloading {} to {}".format(result["name"], path))
+            if overwrite and os.path.exists(path + ".part"):
+                os.remove(path + ".part")
+            download_file(
+                session,
+                result["location"],
+                path,
+                chunk_size=chunk_size,
+                expected_size=expected_size,
+                digests=expected.get("digests"),
+            )
+        else:
+            print("{} already exists, skipping {}".format(path, result["name"]))
+        return path
+
+    is_manifest = [
+        os.path.basename(result["name"]) == "manifest.json" for result in results
+    ]
+    paths = {}
+    for i, result in enumerate(results):
+        if is_manifest[i]:
+            paths[i] = download_result(result)
+            manifest.update(read_manifest(paths[i], result["name"]))
+
+    with contextlib.ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers))
+        futures = {
+            i: executor.submit(download_result, result)
+            for i, result in enumerate(results)
+            if not is_manifest[i]
+        }
+        for i, future in futures.items():
+            paths[i] = future.result()
+
+    return [paths[i] for i in range(len(results))]
+
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    """
+    Helper function reading the number of seconds to wait from the Retry-After header of a response
+
+    Parameters
+    ----------
+        response: requests.Response
+            the response
+
+    Returns
+    ----------
+        seconds: Optional[float]
+            number of seconds to wait, or None if the header is missing or not understood
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        # the header can also be an HTTP date
+        return max(
+            (
+                email.utils.parsedate_to_datetime(value)
+                - datetime.datetime.now(datetime.timezone.utc)
+            ).total_seconds(),
+            0.0,
+        )
+    except (TypeError, ValueError):
+        return None
+
+
+def wait_for_order(
+    order_url: str,
+    session: requests.Session,
+    timeout: Optional[float] = 3600,
+    initial_delay: float = 5,
+    max_delay: float = 120,
+    backoff: float = 2,
+) -> dict:
+    """
+    Helper function polling the state of a Planet order until it has finished, backing off exponentially (with jitter) between requests
+
+    Parameters
+    ----------
+        order_url: str
+            Order url created from order() or order_now()
+        session: requests.Session
+            Session used to make the requests, authenticated with the Planet API key
+        timeout: Optional[float]
+            Maximum number of seconds to wait for the order, defaults to 3600 (None to wait forever)
+        initial_delay: float
+            Number of seconds to wait at most after the first poll, each wait is drawn at random up to the current delay,
+            defaults to 5
+        max_delay: float
+            Maximum number of seconds to wait between polls, defaults to 120
+        backoff: float
+            Factor the wait between polls grows by after each poll, defaults to 2
+
+    Returns
+    ----------
+        order: dict
+            the finished order (in the "success" or "partial" state), as returned by the Planet Orders API
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = initial_delay
+    attempt = 1
+    while True:
+        r = session.get(order_url)
+        wait = None
+        if r.status_code == 200:
+            order = r.json()
+            state = order.get("state")
+            if state in ("success", "partial"):
+                return order
+            elif state in ("failed", "cancelled"):
+                raise RuntimeError(
+                    f"Order {order_url} {state}: {order.get('error_hints', '')}"
+                )
+            print(f"order is {state}, this was attempt number {attempt}")
+        elif r.status_code in (429, 500, 502, 503, 504):
+            # rate limited or temporarily unavailable, wait as long as we are told to
+            wait = retry_after(r)
+            print(f"Got response {r.status_code}, this was attempt number {attempt}")
+        else:
+            r.raise_for_status()
+        r.close()
+
+        if wait is None:
+            # full jitter, so that many pollers do not make requests in lockstep
+            wait = random.uniform(0, delay)
+            delay = min(delay * backoff, max_delay)
+        if deadline is not None and time.monotonic() + wait > deadline:
+            raise TimeoutError(
+                f"Order {order_url} did not finish within {timeout} seconds"
+            )
+        time.sleep(wait)
+        attempt += 1
+
+
 def download(
-    api_key: str, order_url: str, out_dirpath: str, overwrite: bool = False
-) -> None:
+    api_key: str,
+    order_url: str,
+    out_dirpath: str,
+    overwrite: bool = False,
+    max_workers: int = 4,
+    chunk_size: int = 1024 * 1024,
+    timeout: Optional[float] = None,
+    initial_delay: float = 5,
+    max_delay: float = 120,
+    catalog_path: Optional[str] = None,
+) -> List[str]:
     """
-    Helper function for downloading the ordered data from Planet, makes a download request every 60 seconds until data is ready to download
+    Helper function for downloading the ordered data from Planet, polls the order state (backing off exponentially) until the data is ready to download
 
     Parameters
     ----------
@@ -156,48 +769,257 @@ def download(
             Path to output directory
         overwrite: bool
             Whether or not to overwrite existing files, defaults to False
+        max_workers: int
+            Maximum number of files to download at the same time, defaults to 4
+        chunk_size: int
+            Number of bytes to stream to disk at a time, defaults to 1 MiB
+        timeout: Optional[float]
+            Maximum number of seconds to wait for the order to be ready, defaults to None (wait until the order is ready)
+        initial_delay: float
+            Number of seconds to wait after the first poll of the order state, the wait then doubles after each poll, defaults to 5
+        max_delay: float
+            Maximum number of seconds to wait between polls of the order state, defaults to 120
+        catalog_path: Optional[str]
+            Path to a SQLite catalog (see planetsca.catalog) to record the downloaded surface reflectance (SR) images in,
+            defaults to None
 
     Returns
     ----------
-        None
+        paths: List[str]
+            Paths to the downloaded files
     """
 
     print("Attempting to download")
-    request_fufilled = True
-    counter = 1
-    while request_fufilled:
-        r = requests.get(order_url, auth=HTTPBasicAuth(api_key, ""))
-        try:
-            if r.status_code == 200:
-                response = r.json()
-                results = response["_links"]["results"]
-                results_urls = [r["location"] for r in results]
-                results_names = [r["name"] for r in results]
-                print("{} items to download".format(len(results_urls)))
-
-                for url, name in zip(results_urls, results_names):
-                    path = pathlib.Path(os.path.join(out_dirpath, name))
-
-                    if overwrite or not path.exists():
-                        print("downloading {} to {}".format(name, path))
-                        r = requests.get(url, allow_redirects=True)
-                        path.parent.mkdir(parents=True, exist_ok=True)
-                        open(path, "wb").write(r.content)
-                    else:
-                        print("{} already exists, skipping {}".format(path, name))
-            else:
-                print(f"Failed with response {r.status_code}")
-            request_fufilled = False
-        # Data isn't ready yet
-        except Exception:
-            print("data not ready yet, this was attempt number {}".format(counter))
-            print("will automatically try again in 60 seconds")
-            # TODO: use warning or logging to handle these cases
-            counter += 1
-        r.close()
-        time.sleep(60)
+    # one session, and its pool of connections, is shared by polling and all the downloads
+    session = make_session(api_key, pool_size=max_workers)
+    order = wait_for_order(
+        order_url,
+        session,
+        timeout=timeout,
+        initial_delay=initial_delay,
+        max_delay=max_delay,
+    )
+    paths = download_results(
+        order["_links"].get("results", []),
+        out_dirpath,
+        overwrite=overwrite,
+        max_workers=max_workers,
+        chunk_size=chunk_size,
+        session=session,
+    )
+    if catalog_path is not None:
+        catalog.add_scenes(
+            catalog_path,
+            [
+                path
+                for path in paths
+                if fnmatch.fnmatch(os.path.basename(path), "*SR*.tif")
+            ],
+        )
     print("Completed downloads")
-    return None
+    return paths
+
+
+def submit_order(
+    payload: dict,
+    session: requests.Session,
+    orders_url: str = ORDERS_URL,
+) -> str:
+    """
+    Helper function submitting an order to the Planet Orders API
+
+    Parameters
+    ----------
+        payload: dict
+            Dictionary containing all necessary information for the Planet API, see build_payload()
+        session: requests.Session
+            Session used to make the request, authenticated with the Planet API key
+        orders_url: str
+            URL of the Planet Orders API, defaults to ORDERS_URL
+
+    Returns
+    ----------
+        order_url: str
+            URL of the submitted order
+    """
+    while True:
+        response = session.post(orders_url, json=payload)
+        if response.status_code != 429:
+            break
+        # rate limited, wait as long as we are told to
+        time.sleep(retry_after(response) or 1)
+    response.raise_for_status()
+    order_url = f"{orders_url}/{response.json()['id']}"
+    print(f"Order {payload.get('name')} submitted: {order_url}")
+    return order_url
+
+
+def order_and_download_many(
+    api_key: str,
+    payloads: List[dict],
+    out_dirpath: str,
+    max_concurrent_orders: int = 10,
+    max_download_workers: int = 8,
+    requests_per_second: float = 5,
+    overwrite: bool = False,
+    chunk_size: int = 1024 * 1024,
+    timeout: Optional[float] = 3600,
+    initial_delay: float = 5,
+    max_delay: float = 120,
+    orders_url: str = ORDERS_URL,
+    on_complete: Optional[Callable[[dict], None]] = None,
+) -> List[dict]:
+    """
+    Submits many orders, polls them all concurrently, and downloads each one as soon as it is ready
+
+    Each order runs on its own thread, up to max_concurrent_orders at a time. All requests to the Planet API share one
+    rate limited session, and all file downloads share one pool of max_download_workers threads.
+
+    Parameters
+    ----------
+        api_key: str
+            Planet API key
+        payloads: List[dict]
+            Order payloads, see build_payload()
+        out_dirpath: str
+            Path to output directory
+        max_concurrent_orders: int
+            Maximum number of orders submitted and polled at the same time, defaults to 10
+        max_download_workers: int
+            Maximum number of files downloaded at the same time, across all orders, defaults to 8
+        requests_per_second: float
+            Maximum number of requests per second made to the Planet API, across all orders, defaults to 5
+        overwrite: bool
+            Whether or not to overwrite existing files, defaults to False
+        chunk_size: int
+            Number of bytes to stream to disk at a time, defaults to 1 MiB
+        timeout: Optional[float]
+            Maximum number of seconds to wait for each order to be ready, defaults to 3600 (None to wait forever)
+        initial_delay: float
+            Number of seconds to wait after the first poll of each order, defaults to 5
+        max_delay: float
+            Maximum number of seconds to wait between polls of each order, defaults to 120
+        orders_url: str
+            URL of the Planet Orders API, defaults to ORDERS_URL
+        on_complete: Optional[Callable[[dict], None]]
+            Function called with the result of each order (see Returns) as soon as it is downloaded or has failed, e.g. to
+            start processing its images while the other orders are still running. Calls are made one at a time, from the
+            order threads. Defaults to None
+
+    Returns
+    ----------
+        orders: List[dict]
+            For each payload, in the same order, a dictionary with the order "name", "order_url", downloaded "paths" and "error" (None if the order succeeded)
+    """
+    api_session = make_session(
+        api_key,
+        pool_size=max_concurrent_orders,
+        requests_per_second=requests_per_second,
+    )
+    download_session = make_session(pool_size=max_download_workers)
+    on_complete_lock = threading.Lock()
+
+    with ThreadPoolExecutor(max_workers=max_download_workers) as download_executor:
+
+        def run_order(payload):
+            result = {
+                "name": payload.get("name"),
+                "order_url": None,
+                "paths": [],
+                "error": None,
+            }
+            try:
+                result["order_url"] = submit_order(payload, api_session, orders_url)
+                order = wait_for_order(
+                    result["order_url"],
+                    api_session,
+                    timeout=timeout,
+                    initial_delay=initial_delay,
+                    max_delay=max_delay,
+                )
+                result["paths"] = download_results(
+                    order["_links"].get("results", []),
+                    out_dirpath,
+                    overwrite=overwrite,
+                    chunk_size=chunk_size,
+                    session=download_session,
+                    executor=download_executor,
+                )
+            except Exception as e:
+                # one failed order does not stop the others
+                print(f"Order {result['name']} failed: {e!r}")
+                result["error"] = repr(e)
+            if on_complete is not None:
+                with on_complete_lock:
+                    on_complete(result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=max_concurrent_orders) as order_executor:
+            orders = list(order_executor.map(run_order, payloads))
+
+    print(
+        f"Completed {sum(order['error'] is None for order in orders)} of {len(orders)} orders"
+    )
+    return orders
+
+
+def order_and_download_chunks(
+    api_key: str,
+    id_list: List[str],
+    filter: dict,
+    out_dirpath: str,
+    item_type: str = "PSScene",
+    bundle_type: str = "analytic_sr_udm2",
+    max_items: int = MAX_ITEMS_PER_ORDER,
+    group_by: Optional[Literal["date", "footprint"]] = "date",
+    gdf: Optional[gpd.GeoDataFrame] = None,
+    **kwargs,
+) -> List[dict]:
+    """
+    Splits item ids into several orders, submits them, and downloads each one as soon as it is ready
+
+    Each order is named deterministically from its item ids (see order_name()), so it can be tracked and downloaded on its
+    own, e.g. with download(), and the orders that complete first are downloaded while the others are still running.
+
+    Parameters
+    ----------
+        api_key: str
+            Planet API key
+        id_list: List[str]
+            Item ids that contain date and location information
+        filter: dict
+            Dictionary containing data filter information
+        out_dirpath: str
+            Path to output directory
+        item_type: str
+            Class of spacecraft and/or processing level of an item, defaults to PSScene. See https://developers.planet.com/docs/apis/data/items-assets/
+        bundle_type: str
+            Groups of assets for an item and contain metadata, defaults to analytic_sr_udm2. See https://developers.planet.com/apis/orders/product-bundles-reference/#surface-reflectance-4b
+        max_items: int
+            Maximum number of item ids in an order, defaults to MAX_ITEMS_PER_ORDER (500)
+        group_by: Optional[Literal["date", "footprint"]]
+            How item ids are grouped into orders, see chunk_ids(), defaults to "date"
+        gdf: Optional[geopandas.geodataframe.GeoDataFrame]
+            GeoDataFrame of search results from search.search(), see chunk_ids()
+        **kwargs
+            Other arguments of order_and_download_many(), e.g. max_concurrent_orders, requests_per_second or on_complete
+
+    Returns
+    ----------
+        orders: List[dict]
+            For each order, a dictionary with the order "name", "order_url", downloaded "paths" and "error" (None if the order succeeded)
+    """
+    payloads = build_payloads(
+        id_list,
+        search.get_filter(filter, "GeometryFilter")["config"]["coordinates"],
+        item_type,
+        bundle_type,
+        max_items=max_items,
+        group_by=group_by,
+        gdf=gdf,
+    )
+    print(f"Split {len(id_list)} image ids into {len(payloads)} orders")
+    return order_and_download_many(api_key, payloads, out_dirpath, **kwargs)
 
 
 def retrieve_dataset(filename: str, out_dirpath: Optional[str] = ".") -> str:
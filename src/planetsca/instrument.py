@@ -0,0 +1,216 @@
+import json
+import logging
+import threading
+import time
+from typing import Callable, Optional, Union
+
+# sinks that receive a record for each finished span, when there are none spans cost nothing
+_sinks = []
+_sinks_lock = threading.Lock()
+
+
+class Span:
+    """
+    Timing span of a pipeline stage, created with span()
+
+    Records the wall time and CPU time of the stage, along with optional pixel and byte counts
+    and other attributes. When the span finishes, its record is sent to every sink.
+
+    The CPU time is that of the thread running the span, so that spans running at once in other threads
+    are not counted in it. Work the stage hands to other threads or processes is not counted either.
+    """
+
+    __slots__ = ("name", "attributes", "_start", "_wall_start", "_cpu_start")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes) -> None:
+        """
+        Set attributes of the span, e.g. pixels=... or bytes=...
+        """
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._start = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record = {
+            "name": self.name,
+            "start": self._start,
+            "wall_time_s": time.perf_counter() - self._wall_start,
+            "cpu_time_s": time.thread_time() - self._cpu_start,
+            **self.attributes,
+        }
+        if exc_type is not None:
+            record["error"] = repr(exc_value)
+        emit(record)
+        return False
+
+
+class _NullSpan:
+    """
+    Span used when instrumentation is disabled, does nothing
+    """
+
+    __slots__ = ()
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **attributes) -> Union[Span, _NullSpan]:
+    """
+    Time a stage of the pipeline
+
+    Use as a context manager, e.g. ``with span("inference", pixels=n) as s: ...``. When no sinks have been
+    added, a shared span that does nothing is returned.
+
+    Parameters
+    ----------
+        name: str
+            name of the stage, e.g. "read", "preprocess", "inference", "write", "rasterize", "cross_validation" or "fit"
+        **attributes
+            other values to record with the span, e.g. pixels, bytes or file
+
+    Returns
+    ----------
+        span: Span
+            the span, use span.set() to add attributes once they are known
+    """
+    if not _sinks:
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def enabled() -> bool:
+    """
+    Check whether any sinks have been added
+
+    Returns
+    ----------
+        enabled: bool
+            True if spans are being recorded
+    """
+    return bool(_sinks)
+
+
+def emit(record: dict) -> None:
+    """
+    Send a record to every sink
+
+    Parameters
+    ----------
+        record: dict
+            the record to send
+    """
+    for sink in list(_sinks):
+        sink(record)
+
+
+def add_sink(sink: Callable[[dict], None]) -> Callable[[dict], None]:
+    """
+    Add a sink that receives a record (a dictionary) for each finished span
+
+    Sinks are per process, worker processes started by predict_sca(n_workers=...) do not send records to the sinks of the
+    parent process.
+
+    Parameters
+    ----------
+        sink: Callable[[dict], None]
+            a function that takes a record, e.g. a LoggingSink, a JSONLinesSink or a user callback
+
+    Returns
+    ----------
+        sink: Callable[[dict], None]
+            the sink that was added
+    """
+    with _sinks_lock:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink: Callable[[dict], None]) -> None:
+    """
+    Remove a sink added with add_sink()
+
+    Parameters
+    ----------
+        sink: Callable[[dict], None]
+            the sink to remove
+    """
+    with _sinks_lock:
+        _sinks.remove(sink)
+
+
+def clear_sinks() -> None:
+    """
+    Remove all sinks, disabling instrumentation
+    """
+    with _sinks_lock:
+        _sinks.clear()
+
+
+class LoggingSink:
+    """
+    Sink that logs each span record as JSON with the logging module
+
+    Parameters
+    ----------
+        logger: Optional[logging.Logger]
+            the logger to use, defaults to the "planetsca" logger
+        level: int
+            the logging level, defaults to logging.INFO
+    """
+
+    def __init__(
+        self, logger: Optional[logging.Logger] = None, level: int = logging.INFO
+    ):
+        self.logger = logger if logger is not None else logging.getLogger("planetsca")
+        self.level = level
+
+    def __call__(self, record: dict) -> None:
+        self.logger.log(self.level, json.dumps(record, default=str))
+
+
+class JSONLinesSink:
+    """
+    Sink that appends each span record to a JSON lines file
+
+    Parameters
+    ----------
+        filepath: str
+            path to the JSON lines file
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+
+    def __call__(self, record: dict) -> None:
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            with open(self.filepath, "a") as f:
+                f.write(line)
+
+
+class ListSink(list):
+    """
+    Sink that keeps each span record in a list, e.g. for summarizing spans in a notebook
+    """
+
+    def __call__(self, record: dict) -> None:
+        self.append(record)
@@ -1,73 +1,1813 @@
+import contextlib
 import glob
+import hashlib
+import json
 import os
-from typing import List, Union
+import threading
+import warnings
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
+import geopandas as gpd
 import joblib
 import numpy as np
 import onnx
 import pandas as pd
 import rasterio
-from onnxruntime import InferenceSession
+import rasterio.shutil
+from onnxruntime import InferenceSession, SessionOptions
+from rasterio.enums import Resampling
+from rasterio.windows import Window
 from sklearn.ensemble import RandomForestClassifier
 
+from planetsca import catalog
+from planetsca.instrument import span
+from planetsca.stats import SCAStats, read_zones, scene_stats, split_stats, with_stats
+
+# size in pixels of the square tiles of tiled SCA images
+SCA_BLOCKSIZE = 256
+# smallest number of pixels classified at once in windowed prediction, smaller blocks (e.g. the single row
+# strips of striped GeoTIFFs) are merged into strips so that model calls are not paid per block
+WINDOW_MIN_PIXELS = 2**20
+# bands of PlanetScope UDM2 images flagging unusable pixels: shadow (3) and cloud (6)
+UDM2_MASK_BANDS = [3, 6]
+# GeoTIFF tag of SCA images holding the fingerprint of the image and model they were predicted from
+FINGERPRINT_TAG = "PLANETSCA_FINGERPRINT"
+
 
 def check_inputs(
     planet_path: Union[str, List[str]],
     model: Union[str, RandomForestClassifier],
     output_dirpath: str = "",
+    catalog_path: Optional[str] = None,
 ) -> int:
     """
-    Check the inputs for the predict_sca function
+    Check the inputs for the predict_sca function
+
+    Parameters
+    ----------
+        planet_path: str or List[str]
+            file path to a single PlanetScope surface reflectance (SR) image, a list of file paths, or path to a directory containing multiple SR images
+        model: Union[str, RandomForestClassifier]
+            file path to a model joblib file, or an sklearn.ensemble RandomForestClassifier model object
+        output_dirpath: str
+            the directory where output snow cover images will be stored
+        catalog_path: Optional[str]
+            Path to a SQLite catalog (see planetsca.catalog), to find the images in a directory with a query of the catalog
+            instead of searching the directory, defaults to None
+
+    Returns
+    ----------
+        file_list: List[str]
+            a list of filepaths to PlanetScope surface reflectance (SR) images
+        model: RandomForestClassifier
+            an sklearn.ensemble RandomForestClassifier model object
+        output_dirpath: str
+            the directory where output snow cover images will be stored
+    """
+
+    # if output directory is not empty
+    if output_dirpath != "":
+        # check if the directory already exists
+        if not os.path.exists(output_dirpath):
+            # create the output directory if it does not already exist
+            os.mkdir(output_dirpath)
+
+    # check if planet_path is a list
+    if isinstance(planet_path, list):
+        # make sure that each file exists
+        if all(os.path.isfile(filepath) for filepath in planet_path):
+            # then the file list is what was provided in planet_path
+            file_list = planet_path
+    # otherwise planet_path should be a string
+    elif isinstance(planet_path, str):
+        # if planet_path is a directory, then find all images with 'SR' flag, meaning surface reflectance data
+        if os.path.isdir(planet_path):
+            file_list = find_images(planet_path, catalog_path)
+        # otherwise we are working with a single planet image
+        elif os.path.isfile(planet_path):
+            file_list = [planet_path]
+
+    # if provided with a filepath to a model file
+    if isinstance(model, str) and os.path.isfile(model):
+        # open the model
+        print(f"Reading model from file: {model}")
+        model = joblib.load(model)
+    # otherwise "model" is already our RandomForestClassifier model
+
+    return file_list, model, output_dirpath
+
+
+def find_images(dirpath: str, catalog_path: Optional[str] = None) -> List[str]:
+    """
+    Helper function finding the surface reflectance (SR) images in a directory and its subdirectories
+
+    Parameters
+    ----------
+        dirpath: str
+            path to a directory containing multiple SR images
+        catalog_path: Optional[str]
+            Path to a SQLite catalog (see planetsca.catalog). The images are then found with a query of the catalog, and the
+            directory is only searched the first time. Use catalog.scan_directory() to add images that were not
+            downloaded with download.download(catalog_path=...). Defaults to None (search the directory)
+
+    Returns
+    ----------
+        file_list: List[str]
+            a list of filepaths to PlanetScope surface reflectance (SR) images
+    """
+    if catalog_path is None:
+        return glob.glob(dirpath + "/**/*SR*.tif", recursive=True)
+    file_list = catalog.find_scenes(catalog_path, dirpath=dirpath)
+    if len(file_list) == 0:
+        # the directory is not in the catalog yet
+        catalog.scan_directory(catalog_path, dirpath)
+        file_list = catalog.find_scenes(catalog_path, dirpath=dirpath)
+    return file_list
+
+
+def read_bands(
+    ds: rasterio.io.DatasetReader, window: Optional[Window] = None
+) -> np.ndarray:
+    """
+    Read the blue, green, red and NIR bands from an open PlanetScope SR image
+
+    Parameters
+    ----------
+        ds: rasterio.io.DatasetReader
+            an open rasterio dataset of a PlanetScope surface reflectance (SR) image
+        window: Optional[Window]
+            an optional rasterio Window to read, defaults to None (read the whole image)
+
+    Returns
+    ----------
+        arr: np.ndarray
+            an array of raster values of shape (4, rows, cols)
+    """
+    with span("read", file=ds.name) as read_span:
+        if ds.count > 4:  # if we have more than 4 bands
+            # TODO: add functionality for other cases where we have more than 4 bands (e.g. using NDVI or pseudo-NDSI)
+            # use only the first four
+            arr = ds.read(indexes=[1, 2, 3, 4], window=window)
+        else:
+            arr = ds.read(window=window)
+        read_span.set(pixels=arr[0].size, bytes=arr.nbytes)
+    return arr
+
+
+def classify_array(
+    arr: np.ndarray,
+    predict_fn,
+    nodata_flag: int = 9,
+    skip_nodata: bool = True,
+    mask: Optional[np.ndarray] = None,
+    cloud_flag: int = 8,
+) -> np.ndarray:
+    """
+    Apply a snow cover classifier to an array of PlanetScope surface reflectance values
+
+    Parameters
+    ----------
+        arr: np.ndarray
+            an array of raster values of shape (4, rows, cols), with bands in the order blue, green, red, NIR
+        predict_fn: Callable
+            a function that takes an array of shape (n_samples, 4) and returns predicted labels, e.g. model.predict
+        nodata_flag: int
+            the value used to represent no data in the predicted snow cover image, default value is 9
+        skip_nodata: bool
+            set to True to only send pixels with data to the model, or False to classify every pixel, defaults to True
+        mask: Optional[np.ndarray]
+            a boolean array of shape (rows, cols), True for cloudy or shadowed pixels that are not sent to the model (see
+            read_udm2_mask()), defaults to None
+        cloud_flag: int
+            the value used to represent the pixels of mask in the predicted snow cover image, defaults to 8
+
+    Returns
+    ----------
+        img_prediction: np.ndarray
+            an array of predicted snow cover labels of shape (rows, cols)
+    """
+    n_bands, rows, cols = arr.shape
+
+    with span("preprocess", pixels=rows * cols) as preprocess_span:
+        pixels = arr.reshape([n_bands, -1])
+
+        # wherever blue band is zero, we have no data
+        nodata_mask = pixels[0] == 0
+        if mask is not None:
+            mask = mask.reshape(-1)
+            # cloudy and shadowed pixels never go to the model
+            excluded = nodata_mask | mask if skip_nodata else mask
+        else:
+            excluded = nodata_mask if skip_nodata else None
+        if excluded is not None and excluded.any():
+            # only the pixels with data go to the model
+            valid_mask = ~excluded
+            pixels = pixels[:, valid_mask]
+        else:
+            valid_mask = None
+
+        # reshape the band-interleaved array to one row of (blue, green, red, nir) per pixel,
+        # scaling surface reflectance to 0-1 straight into a contiguous float32 array
+        X_img = np.empty((pixels.shape[1], n_bands), dtype=np.float32)
+        np.divide(pixels.T, np.float64(10000), out=X_img, casting="unsafe")
+        preprocess_span.set(bytes=X_img.nbytes)
+
+    # run model prediction, writing labels into a preallocated uint8 classification map
+    with span("inference", pixels=len(X_img)):
+        img_prediction = np.empty((rows, cols), dtype=np.uint8)
+        labels = img_prediction.reshape(-1)
+        if valid_mask is None:
+            labels[:] = predict_fn(X_img)
+        elif len(X_img) > 0:
+            # scatter the labels back to the pixels they came from
+            labels[valid_mask] = predict_fn(X_img)
+        if mask is not None:
+            labels[mask] = cloud_flag
+        labels[nodata_mask] = nodata_flag
+
+    return img_prediction
+
+
+def iter_windows(
+    ds: rasterio.io.DatasetReader,
+    tile_size: Optional[int] = None,
+    min_pixels: Optional[int] = None,
+) -> Iterator[Window]:
+    """
+    Iterate over the windows of a raster used for windowed (block-streaming) prediction
+
+    Parameters
+    ----------
+        ds: rasterio.io.DatasetReader
+            an open rasterio dataset
+        tile_size: Optional[int]
+            size in pixels of square tiles to iterate over, defaults to None (use the raster's internal block windows)
+        min_pixels: Optional[int]
+            when tile_size is None, internal blocks smaller than this number of pixels are merged into full-width strips
+            of whole block rows holding at least this number of pixels, defaults to None (WINDOW_MIN_PIXELS)
+
+    Returns
+    ----------
+        windows: Iterator[Window]
+            rasterio Windows covering the whole raster
+    """
+    if tile_size is None:
+        min_pixels = WINDOW_MIN_PIXELS if min_pixels is None else min_pixels
+        block_height, block_width = ds.block_shapes[0]
+        if block_height * block_width >= min_pixels:
+            for _, window in ds.block_windows(1):
+                yield window
+            return
+        block_rows = -(-min_pixels // (block_height * ds.width))
+        strip_height = block_rows * block_height
+        for row_off in range(0, ds.height, strip_height):
+            yield Window(0, row_off, ds.width, min(strip_height, ds.height - row_off))
+    else:
+        for row_off in range(0, ds.height, tile_size):
+            for col_off in range(0, ds.width, tile_size):
+                yield Window(
+                    col_off,
+                    row_off,
+                    min(tile_size, ds.width - col_off),
+                    min(tile_size, ds.height - row_off),
+                )
+
+
+def iter_strips(ds: rasterio.io.DatasetReader, n_strips: int) -> Iterator[Window]:
+    """
+    Iterate over full-width row strips of a raster, aligned to the raster's internal blocks
+
+    Parameters
+    ----------
+        ds: rasterio.io.DatasetReader
+            an open rasterio dataset
+        n_strips: int
+            approximate number of strips to split the raster into
+
+    Returns
+    ----------
+        windows: Iterator[Window]
+            rasterio Windows covering the whole raster
+    """
+    block_height = ds.block_shapes[0][0]
+    strip_height = -(-ds.height // max(n_strips, 1))  # ceiling division
+    strip_height = -(-strip_height // block_height) * block_height
+    for row_off in range(0, ds.height, strip_height):
+        yield Window(0, row_off, ds.width, min(strip_height, ds.height - row_off))
+
+
+def open_udm2(udm2_path: Optional[str] = None):
+    """
+    Helper function opening a UDM2 image, as a context manager giving None without a udm2_path
+
+    Parameters
+    ----------
+        udm2_path: Optional[str]
+            file path to the UDM2 image of the scene, defaults to None
+
+    Returns
+    ----------
+        udm2_ds: Union[rasterio.io.DatasetReader, contextlib.nullcontext]
+            context manager of the open UDM2 image, or of None
+    """
+    if udm2_path is None:
+        return contextlib.nullcontext()
+    return rasterio.open(udm2_path, "r")
+
+
+def find_udm2(f: str) -> Optional[str]:
+    """
+    Find the UDM2 (usable data mask) image delivered next to a PlanetScope SR image, e.g.
+    20230725_180512_37_2479_3B_udm2_clip.tif for 20230725_180512_37_2479_3B_AnalyticMS_SR_clip.tif
+
+    Parameters
+    ----------
+        f: str
+            file path to a single PlanetScope surface reflectance (SR) image
+
+    Returns
+    ----------
+        udm2_path: Optional[str]
+            file path to the UDM2 image, or None if there is none
+    """
+    scene_id, _ = catalog.parse_scene_id(f)
+    if scene_id is None:
+        scene_id = os.path.basename(f).split("_3B_")[0]
+    matches = glob.glob(
+        os.path.join(
+            glob.escape(os.path.dirname(f)), glob.escape(scene_id) + "*udm2*.tif"
+        )
+    )
+    return sorted(matches)[0] if matches else None
+
+
+def check_cloud_flag(
+    cloud_flag: int = 8,
+    nodata_flag: int = 9,
+    nbits: Optional[int] = None,
+    udm2: bool = False,
+) -> None:
+    """
+    Helper function checking that the cloud_flag is a label of its own in the SCA images
+
+    Parameters
+    ----------
+        cloud_flag: int
+            the value used to represent cloudy and shadowed pixels, defaults to 8
+        nodata_flag: int
+            the value used to represent no data in the predicted snow cover images, default value is 9
+        nbits: Optional[int]
+            number of bits per pixel of the SCA images, defaults to None (8 bits)
+        udm2: bool
+            set to True when cloudy pixels are written with cloud_flag, which must then fit in nbits, defaults to False
+    """
+    if cloud_flag in (0, 1, nodata_flag) or not 0 <= cloud_flag < 256:
+        raise ValueError(
+            f"cloud_flag={cloud_flag} must differ from the no snow (0), snow (1) and nodata_flag={nodata_flag} labels"
+        )
+    if udm2 and nbits is not None and cloud_flag >= 2**nbits:
+        raise ValueError(
+            f"nbits={nbits} can not hold cloud_flag={cloud_flag}, use nbits=2 with a cloud_flag of 3 or less"
+        )
+
+
+def check_udm2(f: str) -> Optional[str]:
+    """
+    Helper function finding the UDM2 image of a PlanetScope image for UDM2-aware prediction
+
+    Parameters
+    ----------
+        f: str
+            file path to a single PlanetScope surface reflectance (SR) image
+
+    Returns
+    ----------
+        udm2_path: Optional[str]
+            file path to the UDM2 image, or None (with a warning) if there is none
+    """
+    udm2_path = find_udm2(f)
+    if udm2_path is None:
+        warnings.warn(
+            f"No UDM2 image found for {f}, predicting without it", stacklevel=3
+        )
+    return udm2_path
+
+
+def read_udm2_mask(
+    udm2_ds: rasterio.io.DatasetReader, window: Optional[Window] = None
+) -> np.ndarray:
+    """
+    Read the cloud and shadow bands of an open UDM2 image
+
+    Parameters
+    ----------
+        udm2_ds: rasterio.io.DatasetReader
+            an open rasterio dataset of a PlanetScope UDM2 image
+        window: Optional[Window]
+            an optional rasterio Window to read, defaults to None (read the whole image)
+
+    Returns
+    ----------
+        mask: np.ndarray
+            a boolean array of shape (rows, cols), True for pixels flagged as cloud or shadow
+    """
+    with span("read", file=udm2_ds.name) as read_span:
+        arr = udm2_ds.read(indexes=UDM2_MASK_BANDS, window=window)
+        read_span.set(pixels=arr[0].size, bytes=arr.nbytes)
+    return (arr != 0).any(axis=0)
+
+
+def classify_window(
+    ds: rasterio.io.DatasetReader,
+    window: Optional[Window],
+    predict_fn,
+    nodata_flag: int = 9,
+    skip_nodata: bool = True,
+    udm2_ds: Optional[rasterio.io.DatasetReader] = None,
+    cloud_flag: int = 8,
+) -> np.ndarray:
+    """
+    Helper function reading and classifying a window of an open PlanetScope image, masking clouds and shadows with an
+    open UDM2 image if one is given
+
+    Parameters
+    ----------
+        ds: rasterio.io.DatasetReader
+            an open rasterio dataset of a PlanetScope surface reflectance (SR) image
+        window: Optional[Window]
+            the rasterio Window to classify, or None for the whole image
+        predict_fn: Callable
+            a function that takes an array of shape (n_samples, 4) and returns predicted labels, e.g. model.predict
+        nodata_flag: int
+            the value used to represent no data in the predicted snow cover image, default value is 9
+        skip_nodata: bool
+            set to True to only send pixels with data to the model, defaults to True
+        udm2_ds: Optional[rasterio.io.DatasetReader]
+            an open rasterio dataset of the UDM2 image of the scene, defaults to None
+        cloud_flag: int
+            the value used to represent cloudy and shadowed pixels, defaults to 8
+
+    Returns
+    ----------
+        img_prediction: np.ndarray
+            an array of predicted snow cover labels of shape (rows, cols)
+    """
+    arr = read_bands(ds, window=window)
+    mask = None
+    if udm2_ds is not None:
+        mask = read_udm2_mask(udm2_ds, window=window)
+        if mask.shape != arr.shape[1:]:
+            raise ValueError(
+                f"UDM2 image {udm2_ds.name} does not have the same size as {ds.name}"
+            )
+    return classify_array(
+        arr,
+        predict_fn,
+        nodata_flag,
+        skip_nodata=skip_nodata,
+        mask=mask,
+        cloud_flag=cloud_flag,
+    )
+
+
+def classify_windows(
+    f: str,
+    windows: Iterator[Window],
+    predict_fn,
+    nodata_flag: int = 9,
+    skip_nodata: bool = True,
+    n_threads: Optional[int] = None,
+    udm2_path: Optional[str] = None,
+    cloud_flag: int = 8,
+) -> Iterator[Tuple[Window, np.ndarray]]:
+    """
+    Read and classify windows of a PlanetScope image, optionally on a pool of threads
+
+    Parameters
+    ----------
+        f: str
+            file path to a single PlanetScope surface reflectance (SR) image
+        windows: Iterator[Window]
+            rasterio Windows to classify
+        predict_fn: Callable
+            a function that takes an array of shape (n_samples, 4) and returns predicted labels, e.g. model.predict
+        nodata_flag: int
+            the value used to represent no data in the predicted snow cover image, default value is 9
+        skip_nodata: bool
+            set to True to only send pixels with data to the model, or False to classify every pixel, defaults to True
+        n_threads: Optional[int]
+            number of threads that read and classify windows at the same time, defaults to None (one window at a time in this thread)
+        udm2_path: Optional[str]
+            file path to the UDM2 image of the scene, whose cloudy and shadowed pixels are not classified, defaults to None
+        cloud_flag: int
+            the value used to represent cloudy and shadowed pixels in the predicted snow cover image, defaults to 8
+
+    Returns
+    ----------
+        results: Iterator[Tuple[Window, np.ndarray]]
+            each window and its array of predicted snow cover labels, in the same order as windows
+    """
+    if n_threads is None or n_threads <= 1:
+        with rasterio.open(f, "r") as ds, open_udm2(udm2_path) as udm2_ds:
+            for window in windows:
+                yield (
+                    window,
+                    classify_window(
+                        ds,
+                        window,
+                        predict_fn,
+                        nodata_flag,
+                        skip_nodata=skip_nodata,
+                        udm2_ds=udm2_ds,
+                        cloud_flag=cloud_flag,
+                    ),
+                )
+        return
+
+    # rasterio datasets can not be shared between threads, so each thread opens its own
+    local = threading.local()
+    datasets = []
+    datasets_lock = threading.Lock()
+
+    def classify_in_thread(window):
+        if not hasattr(local, "ds"):
+            local.ds = rasterio.open(f, "r")
+            local.udm2_ds = None
+            if udm2_path is not None:
+                local.udm2_ds = rasterio.open(udm2_path, "r")
+            with datasets_lock:
+                datasets.extend(
+                    ds for ds in (local.ds, local.udm2_ds) if ds is not None
+                )
+        return window, classify_window(
+            local.ds,
+            window,
+            predict_fn,
+            nodata_flag,
+            skip_nodata=skip_nodata,
+            udm2_ds=local.udm2_ds,
+            cloud_flag=cloud_flag,
+        )
+
+    try:
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            # keep a bounded number of windows in flight so memory does not grow with the image size
+            pending = deque()
+            for window in windows:
+                pending.append(executor.submit(classify_in_thread, window))
+                if len(pending) >= 2 * n_threads:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    finally:
+        for ds in datasets:
+            ds.close()
+
+
+def sca_output_path(f: str, output_dirpath: str = "") -> str:
+    """
+    Helper function giving the file path of the SCA image produced from a PlanetScope image
+
+    Parameters
+    ----------
+        f: str
+            file path to a PlanetScope surface reflectance (SR) image
+        output_dirpath: str
+            the directory where output snow cover images will be stored
+
+    Returns
+    ----------
+        file_out: str
+            file path to the SCA image, <output_dirpath>/<image name>_SCA.tif
+    """
+    return os.path.join(
+        output_dirpath, os.path.splitext(os.path.basename(f))[0] + "_SCA.tif"
+    )
+
+
+def iter_predictions(
+    ds: rasterio.io.DatasetReader,
+    predict_fn,
+    nodata_flag: int = 9,
+    windowed: bool = False,
+    tile_size: Optional[int] = None,
+    skip_nodata: bool = True,
+    n_threads: Optional[int] = None,
+    udm2_path: Optional[str] = None,
+    cloud_flag: int = 8,
+    accumulator: Optional[SCAStats] = None,
+) -> Iterator[Tuple[Window, np.ndarray]]:
+    """
+    Classify a PlanetScope image, yielding the predicted labels of the whole image or of each window in turn
+
+    Parameters
+    ----------
+        ds: rasterio.io.DatasetReader
+            an open rasterio dataset of a PlanetScope surface reflectance (SR) image
+        predict_fn: Callable
+            a function that takes an array of shape (n_samples, 4) and returns predicted labels, e.g. model.predict
+        nodata_flag: int
+            the value used to represent no data in the predicted snow cover image, default value is 9
+        windowed: bool
+            set to True to classify the image one block window at a time, defaults to False
+        tile_size: Optional[int]
+            size in pixels of square tiles to use instead of the image's internal blocks, implies windowed=True, defaults to None
+        skip_nodata: bool
+            set to True to only send pixels with data to the model, defaults to True
+        n_threads: Optional[int]
+            number of threads that read and classify blocks or row strips of the image at the same time, defaults to None (a single thread)
+        udm2_path: Optional[str]
+            file path to the UDM2 image of the scene, whose cloudy and shadowed pixels are not classified, defaults to None
+        cloud_flag: int
+            the value used to represent cloudy and shadowed pixels in the predicted snow cover image, defaults to 8
+        accumulator: Optional[SCAStats]
+            statistics of the scene that the labels of each window are added to as they are predicted, defaults to None
+
+    Returns
+    ----------
+        predictions: Iterator[Tuple[Window, np.ndarray]]
+            the window and the predicted labels (uint8 array) of each window, in the order they can be written
+    """
+    if windowed or tile_size is not None:
+        windows = iter_windows(ds, tile_size)
+    elif n_threads is not None and n_threads > 1:
+        # split the image into a few strips per thread
+        windows = iter_strips(ds, 4 * n_threads)
+    else:
+        windows = None
+        print("Image dimension:".format(), (min(ds.count, 4), ds.height, ds.width))
+        with open_udm2(udm2_path) as udm2_ds:
+            # read and classify all raster values
+            img_prediction = classify_window(
+                ds,
+                None,
+                predict_fn,
+                nodata_flag,
+                skip_nodata=skip_nodata,
+                udm2_ds=udm2_ds,
+                cloud_flag=cloud_flag,
+            )
+        predictions = [(Window(0, 0, ds.width, ds.height), img_prediction)]
+
+    if windows is not None:
+        # classify one window at a time (or a few at a time on threads)
+        predictions = classify_windows(
+            ds.name,
+            windows,
+            predict_fn,
+            nodata_flag,
+            skip_nodata=skip_nodata,
+            n_threads=n_threads,
+            udm2_path=udm2_path,
+            cloud_flag=cloud_flag,
+        )
+
+    for window, img_prediction in predictions:
+        if accumulator is not None:
+            # count the labels while they are in memory, instead of reading the SCA image again
+            accumulator.add(window, img_prediction)
+        yield window, img_prediction
+
+
+def predict_file(
+    f: str,
+    predict_fn,
+    output_dirpath: str = "",
+    nodata_flag: int = 9,
+    windowed: bool = False,
+    tile_size: Optional[int] = None,
+    skip_nodata: bool = True,
+    n_threads: Optional[int] = None,
+    model_digest: Optional[str] = None,
+    hash_inputs: bool = False,
+    compress: Optional[str] = None,
+    tiled: bool = False,
+    overviews: bool = False,
+    cog: bool = False,
+    nbits: Optional[int] = None,
+    in_memory: bool = False,
+    udm2: bool = False,
+    cloud_flag: int = 8,
+    stats: bool = False,
+    zones: Optional[Union[str, gpd.GeoDataFrame]] = None,
+    zone_field: Optional[str] = None,
+) -> Union[str, Tuple[np.ndarray, dict], Tuple[Union[str, tuple], List[dict]]]:
+    """
+    Predict snow cover for a single PlanetScope image and save the result as a geotiff
+
+    Parameters
+    ----------
+        f: str
+            file path to a single PlanetScope surface reflectance (SR) image
+        predict_fn: Callable
+            a function that takes an array of shape (n_samples, 4) and returns predicted labels, e.g. model.predict
+        output_dirpath: str
+            the directory where output snow cover images will be stored
+        nodata_flag: int
+            the value used to represent no data in the predicted snow cover image, default value is 9
+        windowed: bool
+            set to True to read, classify and write the image one block window at a time, so that memory use depends on the block size rather than the image size, defaults to False
+        tile_size: Optional[int]
+            size in pixels of square tiles to use instead of the image's internal blocks, implies windowed=True, defaults to None
+        skip_nodata: bool
+            set to True to only send pixels with data to the model, so that inference cost shrinks with the fraction of nodata pixels, or False to classify every pixel, defaults to True
+        n_threads: Optional[int]
+            number of threads that read and classify blocks or row strips of the image at the same time, while this thread writes the output, defaults to None (a single thread)
+        model_digest: Optional[str]
+            hash of the model (see model_hash()). When given, a fingerprint of the image and the model is stored in the tags
+            of the SCA image, and an existing SCA image with the same fingerprint is kept instead of being predicted again,
+            defaults to None
+        hash_inputs: bool
+            set to True to fingerprint the contents of the image, rather than its size and modification time, defaults to False
+        compress: Optional[str]
+            compression of the SCA image, "deflate", "lzw" or "zstd" (with horizontal differencing), defaults to None (uncompressed)
+        tiled: bool
+            set to True to write the SCA image in square tiles (SCA_BLOCKSIZE pixels) rather than strips, defaults to False
+        overviews: bool
+            set to True to add internal overviews (nearest neighbour) to the SCA image, defaults to False
+        cog: bool
+            set to True to write the SCA image as a Cloud Optimized GeoTIFF, tiled and with overviews, compressed with DEFLATE unless compress is given, defaults to False
+        nbits: Optional[int]
+            number of bits per pixel (1 or 2) to pack the SCA image into, the nodata_flag must fit in them, defaults to None (8 bits)
+        in_memory: bool
+            set to True to return the predicted labels and rasterio profile (see predict_array()) instead of writing the SCA image to disk, defaults to False
+        udm2: bool
+            set to True to read the UDM2 image delivered next to the SR image (see find_udm2()) and leave its cloudy and shadowed pixels out of inference, labelled with cloud_flag, defaults to False
+        cloud_flag: int
+            the value used to represent cloudy and shadowed pixels in the predicted snow cover image when udm2=True, defaults to 8
+        stats: bool
+            set to True to count the pixels of each class while predicting (see stats.SCAStats), and return their statistics rows along with the result, defaults to False
+        zones: Optional[Union[str, gpd.GeoDataFrame]]
+            polygons to also compute statistics over when stats=True, e.g. basins, as a GeoDataFrame or a vector file path, rasterized once per image grid, defaults to None
+        zone_field: Optional[str]
+            column of zones naming each zone in the statistics, defaults to None (the index of zones)
+
+    Returns
+    ----------
+        file_out: str
+            file path to the SCA image produced, or with in_memory=True a tuple of the predicted labels and their rasterio
+            profile. With stats=True, a tuple of the result and the statistics rows (List[dict], see SCAStats.rows())
+    """
+    check_cloud_flag(cloud_flag, nodata_flag, nbits, udm2)
+    udm2_path = check_udm2(f) if udm2 else None
+    accumulator = scene_stats(
+        f, nodata_flag, cloud_flag, zones=zones, zone_field=zone_field, stats=stats
+    )
+
+    if in_memory:
+        print("Start to predict:".format(), os.path.basename(f))
+        result = predict_array(
+            f,
+            predict_fn,
+            nodata_flag,
+            windowed=windowed,
+            tile_size=tile_size,
+            skip_nodata=skip_nodata,
+            n_threads=n_threads,
+            udm2_path=udm2_path,
+            cloud_flag=cloud_flag,
+            accumulator=accumulator,
+        )
+        return with_stats(result, accumulator)
+
+    # save the resulting SCA image out as a geotiff
+    file_out = sca_output_path(f, output_dirpath)
+
+    fingerprint = None
+    if model_digest is not None:
+        fingerprint = input_fingerprint(
+            f,
+            model_digest,
+            hash_inputs=hash_inputs,
+            nodata_flag=nodata_flag,
+            compress=compress,
+            tiled=tiled,
+            overviews=overviews,
+            cog=cog,
+            nbits=nbits,
+            udm2=None if udm2_path is None else os.path.basename(udm2_path),
+            cloud_flag=cloud_flag,
+        )
+        if read_fingerprint(file_out) == fingerprint:
+            print("SCA map is up to date:".format(), file_out)
+            return with_stats(file_out, accumulator, sca_path=file_out)
+
+    print("Start to predict:".format(), os.path.basename(f))
+
+    with rasterio.open(f, "r") as ds:
+        if ds.count > 4:  # if we have more than 4 bands
+            print(
+                "Input image has more than the expected 4 bands (blue, green, red, NIR). \
+            This function will continue running using the first four bands in the input image."
+            )
+            # TODO: use UserWarning, warnings, or logging module to handle messages like this
+
+        print("Save SCA map to: ".format(), file_out)
+        # a COG is copied from a tiled GeoTIFF written next to it
+        write_path = file_out + ".tmp.tif" if cog else file_out
+        with rasterio.open(
+            write_path,
+            "w",
+            **sca_profile(
+                ds, nodata_flag, compress=compress, tiled=tiled or cog, nbits=nbits
+            ),
+        ) as dst:
+            # write the whole image, or each window as soon as it is classified
+            for window, img_prediction in iter_predictions(
+                ds,
+                predict_fn,
+                nodata_flag,
+                windowed=windowed,
+                tile_size=tile_size,
+                skip_nodata=skip_nodata,
+                n_threads=n_threads,
+                udm2_path=udm2_path,
+                cloud_flag=cloud_flag,
+                accumulator=accumulator,
+            ):
+                with span(
+                    "write",
+                    file=file_out,
+                    pixels=img_prediction.size,
+                    bytes=img_prediction.nbytes,
+                ):
+                    dst.write(img_prediction, indexes=1, window=window)
+            if overviews and not cog:
+                build_overviews(dst)
+            if fingerprint is not None:
+                # tag the output once it is complete
+                dst.update_tags(**{FINGERPRINT_TAG: fingerprint})
+
+    if cog:
+        write_cog(write_path, file_out, compress=compress or "deflate", nbits=nbits)
+        os.remove(write_path)
+
+    return with_stats(file_out, accumulator)
+
+
+def predict_array(
+    f: str,
+    predict_fn,
+    nodata_flag: int = 9,
+    windowed: bool = False,
+    tile_size: Optional[int] = None,
+    skip_nodata: bool = True,
+    n_threads: Optional[int] = None,
+    udm2_path: Optional[str] = None,
+    cloud_flag: int = 8,
+    accumulator: Optional[SCAStats] = None,
+) -> Tuple[np.ndarray, dict]:
+    """
+    Predict snow cover for a single PlanetScope image in memory, without writing the SCA image to disk
+
+    Parameters
+    ----------
+        f: str
+            file path to a single PlanetScope surface reflectance (SR) image
+        predict_fn: Callable
+            a function that takes an array of shape (n_samples, 4) and returns predicted labels, e.g. model.predict
+        nodata_flag: int
+            the value used to represent no data in the predicted snow cover image, default value is 9
+        windowed: bool
+            set to True to read and classify the image one block window at a time, defaults to False
+        tile_size: Optional[int]
+            size in pixels of square tiles to use instead of the image's internal blocks, implies windowed=True, defaults to None
+        skip_nodata: bool
+            set to True to only send pixels with data to the model, defaults to True
+        n_threads: Optional[int]
+            number of threads that read and classify blocks or row strips of the image at the same time, defaults to None (a single thread)
+        udm2_path: Optional[str]
+            file path to the UDM2 image of the scene, whose cloudy and shadowed pixels are not classified, defaults to None
+        cloud_flag: int
+            the value used to represent cloudy and shadowed pixels in the predicted snow cover image, defaults to 8
+        accumulator: Optional[SCAStats]
+            statistics of the scene that the labels of each window are added to as they are predicted, defaults to None
+
+    Returns
+    ----------
+        sca: np.ndarray
+            the predicted snow cover labels (uint8 array of shape (rows, cols))
+        profile: dict
+            the rasterio profile of the SCA image, with its transform, crs and nodata, e.g. to write it with
+            rasterio.open(path, "w", **profile) or to a rasterio MemoryFile
+    """
+    with rasterio.open(f, "r") as ds:
+        profile = sca_profile(ds, nodata_flag)
+        sca = np.empty((ds.height, ds.width), dtype=np.uint8)
+        for window, img_prediction in iter_predictions(
+            ds,
+            predict_fn,
+            nodata_flag,
+            windowed=windowed,
+            tile_size=tile_size,
+            skip_nodata=skip_nodata,
+            n_threads=n_threads,
+            udm2_path=udm2_path,
+            cloud_flag=cloud_flag,
+            accumulator=accumulator,
+        ):
+            sca[window.toslices()] = img_prediction
+    return sca, profile
+
+
+def sca_profile(
+    ds: rasterio.io.DatasetReader,
+    nodata_flag: int = 9,
+    compress: Optional[str] = None,
+    tiled: bool = False,
+    nbits: Optional[int] = None,
+) -> dict:
+    """
+    Helper function making the rasterio profile of the SCA image of a PlanetScope image
+
+    Parameters
+    ----------
+        ds: rasterio.io.DatasetReader
+            an open rasterio dataset of a PlanetScope surface reflectance (SR) image
+        nodata_flag: int
+            the value used to represent no data in the predicted snow cover image, default value is 9
+        compress: Optional[str]
+            compression of the SCA image, e.g. "deflate", "lzw" or "zstd", used with horizontal differencing (predictor 2)
+            unless nbits is given, defaults to None (uncompressed)
+        tiled: bool
+            set to True to write the SCA image in SCA_BLOCKSIZE square tiles rather than strips, defaults to False
+        nbits: Optional[int]
+            number of bits per pixel (1 or 2) to pack the SCA image into, defaults to None (8 bits)
+
+    Returns
+    ----------
+        profile: dict
+            keyword arguments of rasterio.open() to write the SCA image
+    """
+    profile = {
+        "driver": "GTiff",
+        "transform": ds.transform,
+        "dtype": rasterio.uint8,
+        "count": 1,
+        "crs": ds.crs,
+        "width": ds.width,
+        "height": ds.height,
+        "nodata": nodata_flag,
+    }
+    if tiled:
+        profile.update(tiled=True, blockxsize=SCA_BLOCKSIZE, blockysize=SCA_BLOCKSIZE)
+    if compress is not None:
+        profile.update(compress=compress)
+        if nbits is None:
+            # horizontal differencing only works on whole bytes
+            profile.update(predictor=2)
+    if nbits is not None:
+        check_nbits(nbits, nodata_flag)
+        profile.update(nbits=nbits)
+    return profile
+
+
+def check_nbits(nbits: Optional[int] = None, nodata_flag: int = 9) -> None:
+    """
+    Helper function checking that the nodata_flag fits in the number of bits per pixel of the SCA images
+
+    Parameters
+    ----------
+        nbits: Optional[int]
+            number of bits per pixel (1 or 2) to pack the SCA images into, or None (8 bits)
+        nodata_flag: int
+            the value used to represent no data in the predicted snow cover images, default value is 9
+    """
+    if nbits is not None and (nbits not in (1, 2) or nodata_flag >= 2**nbits):
+        raise ValueError(
+            f"nbits={nbits} can not hold nodata_flag={nodata_flag}, use nbits=2 with a nodata_flag of 3 or less"
+        )
+
+
+def build_overviews(dst: rasterio.io.DatasetWriter) -> None:
+    """
+    Helper function adding internal overviews to an SCA image, halving its size down to a single tile
+
+    Parameters
+    ----------
+        dst: rasterio.io.DatasetWriter
+            the SCA image, open for writing
+    """
+    factors = []
+    factor = 2
+    while max(dst.width, dst.height) / factor >= SCA_BLOCKSIZE / 2:
+        factors.append(factor)
+        factor *= 2
+    if factors:
+        # nearest neighbour keeps the overviews to the SCA classes
+        dst.build_overviews(factors, Resampling.nearest)
+
+
+def write_cog(
+    src_path: str, file_out: str, compress: str = "deflate", nbits: Optional[int] = None
+) -> None:
+    """
+    Helper function copying an SCA image to a Cloud Optimized GeoTIFF (COG), with tiles and overviews
+
+    Parameters
+    ----------
+        src_path: str
+            file path to the SCA image to copy
+        file_out: str
+            file path to the COG
+        compress: str
+            compression of the COG, e.g. "deflate", "lzw" or "zstd", defaults to "deflate"
+        nbits: Optional[int]
+            number of bits per pixel to pack the COG into, defaults to None (8 bits)
+    """
+    # horizontal differencing only works on whole bytes
+    options = {"predictor": "YES"} if nbits is None else {"nbits": nbits}
+    with span("write", file=file_out):
+        rasterio.shutil.copy(
+            src_path,
+            file_out,
+            driver="COG",
+            compress=compress,
+            blocksize=SCA_BLOCKSIZE,
+            overview_resampling="NEAREST",
+            **options,
+        )
+
+
+def input_fingerprint(
+    f: str, model_digest: str, hash_inputs: bool = False, **options
+) -> str:
+    """
+    Compute a fingerprint of a PlanetScope image, a model and prediction options, which changes whenever the SCA image
+    produced from them would change
+
+    Parameters
+    ----------
+        f: str
+            file path to a single PlanetScope surface reflectance (SR) image
+        model_digest: str
+            hash of the model, see model_hash()
+        hash_inputs: bool
+            set to True to hash the contents of the image, or False to only use its size and modification time, defaults to False
+        **options
+            prediction options that change the SCA image, e.g. nodata_flag
+
+    Returns
+    ----------
+        fingerprint: str
+            hex digest of the SHA-256 hash of the fingerprint
+    """
+    stat = os.stat(f)
+    fingerprint = {"model": model_digest, "size": stat.st_size, **options}
+    if hash_inputs:
+        digest = hashlib.blake2b()
+        with open(f, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+                digest.update(chunk)
+        fingerprint["contents"] = digest.hexdigest()
+    else:
+        fingerprint["mtime_ns"] = stat.st_mtime_ns
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()
+
+
+def options_hash(
+    nodata_flag: int = 9,
+    compress: Optional[str] = None,
+    tiled: bool = False,
+    overviews: bool = False,
+    cog: bool = False,
+    nbits: Optional[int] = None,
+    udm2: bool = False,
+    cloud_flag: int = 8,
+    **kwargs,
+) -> str:
+    """
+    Hash the prediction options that change the SCA images, so that SCA images predicted with other options are told apart
+
+    Parameters
+    ----------
+        nodata_flag, compress, tiled, overviews, cog, nbits, udm2, cloud_flag
+            the options of predict_file() that change the SCA images
+        **kwargs
+            other options of predict_file(), which do not change the SCA images (e.g. windowed or n_threads) and are ignored
+
+    Returns
+    ----------
+        digest: str
+            hex digest of the SHA-256 hash of the options
+    """
+    options = {
+        "nodata_flag": nodata_flag,
+        "compress": compress,
+        "tiled": tiled,
+        "overviews": overviews,
+        "cog": cog,
+        "nbits": nbits,
+        "udm2": udm2,
+        "cloud_flag": cloud_flag,
+    }
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()
+
+
+def read_fingerprint(file_out: str) -> Optional[str]:
+    """
+    Helper function reading the fingerprint stored in the tags of an SCA image
+
+    Parameters
+    ----------
+        file_out: str
+            file path to an SCA image
+
+    Returns
+    ----------
+        fingerprint: Optional[str]
+            the fingerprint, or None if the SCA image does not exist, can not be read, or has no fingerprint
+    """
+    if not os.path.isfile(file_out):
+        return None
+    try:
+        with rasterio.open(file_out) as ds:
+            return ds.tags().get(FINGERPRINT_TAG)
+    except rasterio.errors.RasterioIOError:
+        return None
+
+
+class NumpyForestClassifier:
+    """
+    Vectorized NumPy evaluator for a trained random forest model
+
+    The nodes of every tree are flattened into packed NumPy arrays (feature, threshold, children and leaf class probabilities),
+    and batches of samples are moved through all the trees one level at a time with vectorized gathers. This only depends on
+    NumPy, uses memory proportional to the batch size, and gives the same predictions as the original model.
 
     Parameters
     ----------
-        planet_path: str or List[str]
-            file path to a single PlanetScope surface reflectance (SR) image, a list of file paths, or path to a directory containing multiple SR images
-        model: Union[str, RandomForestClassifier]
-            file path to a model joblib file, or an sklearn.ensemble RandomForestClassifier model object
-        output_dirpath: str
-            the directory where output snow cover images will be stored
+        model: RandomForestClassifier
+            a trained sklearn.ensemble RandomForestClassifier (or other sklearn tree or forest classifier) model object
+        batch_size: int
+            number of samples evaluated at a time, defaults to 8192
+    """
+
+    def __init__(self, model: RandomForestClassifier, batch_size: int = 8192):
+        self.classes_ = model.classes_
+        self.batch_size = batch_size
+
+        trees = [
+            estimator.tree_ for estimator in getattr(model, "estimators_", [model])
+        ]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        self.n_features = model.n_features_in_
+        self.max_depth = max(tree.max_depth for tree in trees)
+        # index of the root node of each tree in the packed arrays
+        self.roots = offsets[:-1].astype(np.intp)
+
+        feature, threshold, left, right, value = [], [], [], [], []
+        for tree, offset in zip(trees, offsets):
+            is_leaf = tree.children_left == -1
+            node = np.arange(tree.node_count)
+            # leaves point back to themselves, so that every sample can take max_depth steps
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+            left.append(np.where(is_leaf, node, tree.children_left) + offset)
+            right.append(np.where(is_leaf, node, tree.children_right) + offset)
+            # class probabilities of each node, normalized the same way as DecisionTreeClassifier.predict_proba
+            proba = tree.value[:, 0, : len(self.classes_)].astype(np.float64)
+            normalizer = proba.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            value.append(proba / normalizer)
+
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = np.concatenate(threshold)
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.value = np.concatenate(value)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predict class probabilities, averaged over the trees in the forest
+
+        Parameters
+        ----------
+            X: np.ndarray
+                an array of input data of shape (n_samples, n_features)
+
+        Returns
+        ----------
+            proba: np.ndarray
+                an array of class probabilities of shape (n_samples, n_classes)
+        """
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        proba = np.empty((len(X), len(self.classes_)), dtype=np.float64)
+
+        for start in range(0, len(X), self.batch_size):
+            X_batch = X[start : start + self.batch_size].reshape(-1)
+            # position of the first feature of each sample in the flattened batch
+            row_start = np.arange(0, len(X_batch), self.n_features)[:, np.newaxis]
+
+            # node of each (sample, tree), moved down one level at a time
+            node = np.broadcast_to(self.roots, (len(row_start), len(self.roots)))
+            for _ in range(self.max_depth):
+                go_left = (
+                    X_batch[row_start + self.feature[node]] <= self.threshold[node]
+                )
+                node = np.where(go_left, self.left[node], self.right[node])
+
+            # sum the leaf probabilities tree by tree, in the same order as sklearn
+            batch_proba = np.zeros((len(row_start), len(self.classes_)))
+            for i in range(len(self.roots)):
+                batch_proba += self.value[node[:, i]]
+            proba[start : start + len(row_start)] = batch_proba / len(self.roots)
+
+        return proba
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predict class labels
+
+        Parameters
+        ----------
+            X: np.ndarray
+                an array of input data of shape (n_samples, n_features)
+
+        Returns
+        ----------
+            predictions: np.ndarray
+                an array of predicted labels of shape (n_samples,)
+        """
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+def bin_grid(
+    edges: np.ndarray, cells_per_edge: int = 16
+) -> Tuple[float, float, np.ndarray]:
+    """
+    Helper function indexing sorted bin edges on a uniform grid, see bin_index()
+
+    Parameters
+    ----------
+        edges: np.ndarray
+            sorted bin edges (float64)
+        cells_per_edge: int
+            number of grid cells per bin edge, so that most cells hold no edge, defaults to 16
+
+    Returns
+    ----------
+        grid: Tuple[float, float, np.ndarray]
+            the start and the inverse cell size of the grid, and the bin index of the start of each cell
+    """
+    if len(edges) == 0:
+        return 0.0, 0.0, np.zeros(1, dtype=np.int64)
+    n_cells = cells_per_edge * len(edges)
+    start, scale = edges[0], n_cells / max(edges[-1] - edges[0], np.finfo(float).tiny)
+    cell_starts = start + np.arange(n_cells) / scale
+    return start, scale, np.searchsorted(edges, cell_starts, side="left")
+
+
+def bin_index(
+    edges: np.ndarray, grid: Tuple[float, float, np.ndarray], x: np.ndarray
+) -> np.ndarray:
+    """
+    Helper function giving the number of bin edges strictly below each value, the same as
+    np.searchsorted(edges, x, side="left") but reading it from the grid of bin_grid() for values in cells without an edge
+
+    Parameters
+    ----------
+        edges: np.ndarray
+            sorted bin edges (float64), at least one
+        grid: Tuple[float, float, np.ndarray]
+            the grid of the bin edges, see bin_grid()
+        x: np.ndarray
+            values (float32)
+
+    Returns
+    ----------
+        index: np.ndarray
+            an int64 array of bin indices, of the same shape as x
+    """
+    start, scale, cell_index = grid
+    x = x.astype(np.float64)
+    cell = np.nan_to_num((x - start) * scale, nan=0.0)
+    cell = np.clip(cell, 0, len(cell_index) - 1).astype(np.intp)
+    index = cell_index[cell]
+    # check each candidate exactly, edges[index - 1] < x <= edges[index], so rounding in
+    # the cell computation (and NaN) only sends values to the binary search
+    below = edges[np.maximum(index - 1, 0)]
+    above = edges[np.minimum(index, len(edges) - 1)]
+    exact = ((index == 0) | (below < x)) & ((index == len(edges)) | (x <= above))
+    if not exact.all():
+        index[~exact] = np.searchsorted(edges, x[~exact], side="left")
+    return index
+
+
+class LookupTableClassifier:
+    """
+    Lookup table accelerator for a trained random forest model
+
+    The split thresholds of every tree are compiled into bin edges for each band, so that each pixel is reduced to an integer code
+    of the bins its reflectance values fall in. All pixels with the same code take the same path through every tree, so the model is
+    only evaluated once per unique code and the predicted labels are memoized across calls (and across images). Predictions are
+    exactly the same as the original model's.
+
+    The memo is a hash table with one slot per hash value, so looking up and adding codes costs the same whatever the size of
+    the memo. It doubles in size as it fills up, to at most max_cache_size slots, and then new codes replace the codes they
+    collide with.
+
+    Parameters
+    ----------
+        model: RandomForestClassifier
+            a trained sklearn.ensemble RandomForestClassifier (or other sklearn tree or forest classifier) model object
+        max_cache_size: int
+            maximum number of memoized codes, rounded up to a power of two, defaults to 10,000,000
+    """
+
+    # initial number of slots of the memo
+    MIN_CACHE_SLOTS = 2**16
+    # Fibonacci hashing multiplier, 2**64 divided by the golden ratio
+    HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self, model: RandomForestClassifier, max_cache_size: int = 10_000_000):
+        self.model = model
+        self.max_cache_size = max_cache_size
+
+        trees = [
+            estimator.tree_ for estimator in getattr(model, "estimators_", [model])
+        ]
+        # sorted unique split thresholds of each feature, leaf nodes have a feature of -2
+        self.bin_edges = [
+            np.unique(
+                np.concatenate([tree.threshold[tree.feature == i] for tree in trees])
+            )
+            for i in range(model.n_features_in_)
+        ]
+
+        # multipliers to combine the bin index of each feature into a single code
+        n_bins = [len(edges) + 1 for edges in self.bin_edges]
+        if np.prod(n_bins, dtype=np.float64) >= 2**63:
+            raise ValueError(
+                "The model has too many split thresholds to encode pixels in 64 bits"
+            )
+        self._multipliers = np.cumprod([1] + n_bins[:0:-1], dtype=np.int64)[::-1]
+        self._grids = [bin_grid(edges) for edges in self.bin_edges]
+
+        self._predict_fn = make_predict_fn(model)
+        self._max_slots = max(
+            self.MIN_CACHE_SLOTS, 1 << (max(max_cache_size, 1) - 1).bit_length()
+        )
+        self._lock = threading.Lock()
+        self.clear_cache()
+
+    @property
+    def classes_(self) -> np.ndarray:
+        return self.model.classes_
+
+    def clear_cache(self) -> None:
+        """
+        Remove all memoized predictions
+        """
+        with self._lock:
+            # memoized codes (-1 for empty slots) and their labels, only used while holding the lock
+            self._keys = np.full(self.MIN_CACHE_SLOTS, -1, dtype=np.int64)
+            self._labels = np.empty(
+                self.MIN_CACHE_SLOTS, dtype=self.model.classes_.dtype
+            )
+            self._n_added = 0
+
+    @property
+    def cache_size(self) -> int:
+        """
+        Number of memoized codes
+        """
+        return int((self._keys >= 0).sum())
+
+    def _slots(self, codes: np.ndarray) -> np.ndarray:
+        # the top bits of the product spread consecutive codes over the whole table
+        shift = np.uint64(64 - (len(self._keys).bit_length() - 1))
+        return ((codes.view(np.uint64) * self.HASH_MULTIPLIER) >> shift).astype(np.intp)
+
+    def _grow(self, n_codes: int) -> None:
+        # double the table until it is at most half full (or at its maximum size), moving the memoized codes over
+        n_slots = len(self._keys)
+        while 2 * n_codes > n_slots and n_slots < self._max_slots:
+            n_slots *= 2
+        if n_slots == len(self._keys):
+            return
+        occupied = self._keys >= 0
+        keys, labels = self._keys[occupied], self._labels[occupied]
+        self._keys = np.full(n_slots, -1, dtype=np.int64)
+        self._labels = np.empty(n_slots, dtype=labels.dtype)
+        self._n_added = 0
+        self._add(keys, labels)
+
+    def _add(self, codes: np.ndarray, labels: np.ndarray) -> None:
+        self._grow(self._n_added + len(codes))
+        # keep a single code for each slot, so that each key is stored with its own label
+        slots, first = np.unique(self._slots(codes), return_index=True)
+        self._keys[slots] = codes[first]
+        self._labels[slots] = labels[first]
+        self._n_added += len(slots)
+
+    def encode(self, X: np.ndarray) -> np.ndarray:
+        """
+        Encode each sample as the integer code of the bins its feature values fall in
+
+        Parameters
+        ----------
+            X: np.ndarray
+                an array of input data of shape (n_samples, n_features)
+
+        Returns
+        ----------
+            codes: np.ndarray
+                an int64 array of codes of shape (n_samples,)
+        """
+        # sklearn trees compare float32 inputs against float64 thresholds, going left when value <= threshold,
+        # so the bin index is the number of thresholds strictly below the value
+        X = np.asarray(X, dtype=np.float32)
+        codes = np.zeros(len(X), dtype=np.int64)
+        for i, (edges, multiplier, grid) in enumerate(
+            zip(self.bin_edges, self._multipliers, self._grids)
+        ):
+            if len(edges) > 0:
+                codes += bin_index(edges, grid, X[:, i]) * multiplier
+        return codes
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predict class labels, evaluating the model only for codes that have not been seen before
+
+        Parameters
+        ----------
+            X: np.ndarray
+                an array of input data of shape (n_samples, n_features)
+
+        Returns
+        ----------
+            predictions: np.ndarray
+                an array of predicted labels of shape (n_samples,)
+        """
+        X = np.asarray(X, dtype=np.float32)
+        codes = self.encode(X)
+        with self._lock:
+            slots = self._slots(codes)
+            found = self._keys[slots] == codes
+            labels = self._labels[slots]
+
+        if not found.all():
+            # evaluate the model once for each new code, using the first sample with that code
+            missing = np.flatnonzero(~found)
+            new_codes, first_index, inverse = np.unique(
+                codes[missing], return_index=True, return_inverse=True
+            )
+            new_labels = self._predict_fn(X[missing[first_index]])
+            labels[missing] = new_labels[inverse.reshape(-1)]
+            with self._lock:
+                self._add(new_codes, new_labels)
+
+        return labels
+
+
+def make_predict_fn(
+    model: Union[
+        RandomForestClassifier,
+        str,
+        bytes,
+        onnx.onnx_ml_pb2.ModelProto,
+        InferenceSession,
+    ],
+    engine: str = "sklearn",
+):
+    """
+    Make the prediction function used by predict_file() for a model
+
+    Parameters
+    ----------
+        model: Union[RandomForestClassifier, str, bytes, onnx.onnx_ml_pb2.ModelProto, InferenceSession]
+            an sklearn.ensemble RandomForestClassifier model object when engine is "sklearn", "numpy" or "lookup_table", or an ONNX model (file path, serialized model, ModelProto or InferenceSession) when engine is "onnx"
+        engine: str
+            the inference engine, one of "sklearn" (the model's own predict method), "numpy" (NumpyForestClassifier), "lookup_table" (LookupTableClassifier) or "onnx" (onnxruntime), defaults to "sklearn"
 
     Returns
+    ----------
+        predict_fn: Callable
+            a function that takes an array of shape (n_samples, 4) and returns predicted labels
+    """
+    if engine == "sklearn":
+        feature_names = getattr(model, "feature_names_in_", None)
+        if feature_names is None:
+            return model.predict
+
+        def predict_fn(X):
+            # models trained on a DataFrame expect named features, wrap the array without copying it
+            return model.predict(pd.DataFrame(X, columns=feature_names, copy=False))
+
+        return predict_fn
+    elif engine == "onnx":
+        # get the onnxruntime session once (reusing a cached one when possible), rather than once per image or window
+        sess = get_inference_session(model)
+
+        def predict_fn(X):
+            # run model prediction with onnxruntime
+            return predict_with_onnxruntime(sess, X)
+
+        return predict_fn
+    elif engine == "numpy":
+        return NumpyForestClassifier(model).predict
+    elif engine == "lookup_table":
+        return LookupTableClassifier(model).predict
+    else:
+        raise ValueError(f"Unknown engine: {engine}")
+
+
+# prediction function of a process pool worker, set once per worker by _init_worker()
+_worker_predict_fn = None
+
+
+def _init_worker(model, engine: str) -> None:
+    global _worker_predict_fn
+    if engine == "onnx" and not isinstance(model, InferenceSession):
+        # each worker handles a single scene at a time, so keep onnxruntime to one
+        # thread per worker instead of every worker trying to use all the cores
+        sess_options = SessionOptions()
+        sess_options.intra_op_num_threads = 1
+        sess_options.inter_op_num_threads = 1
+        model = InferenceSession(model, sess_options)
+    _worker_predict_fn = make_predict_fn(model, engine)
+
+
+def _predict_file_worker(f: str, kwargs: dict):
+    return predict_file(f, _worker_predict_fn, **kwargs)
+
+
+def predict_files(
+    file_list: List[str],
+    model: Union[RandomForestClassifier, str, onnx.onnx_ml_pb2.ModelProto],
+    engine: str = "sklearn",
+    n_workers: Optional[int] = None,
+    catalog_path: Optional[str] = None,
+    incremental: bool = False,
+    **kwargs,
+) -> Union[List[str], Tuple[list, pd.DataFrame]]:
+    """
+    Predict snow cover for a list of PlanetScope images, optionally spreading the images across a pool of worker processes
+
+    Parameters
     ----------
         file_list: List[str]
             a list of filepaths to PlanetScope surface reflectance (SR) images
-        model: RandomForestClassifier
-            an sklearn.ensemble RandomForestClassifier model object
-        output_dirpath: str
-            the directory where output snow cover images will be stored
+        model: Union[RandomForestClassifier, str, onnx.onnx_ml_pb2.ModelProto]
+            the model, see make_predict_fn()
+        engine: str
+            the inference engine, see make_predict_fn(), defaults to "sklearn"
+        n_workers: Optional[int]
+            number of worker processes to use, defaults to None (predict each image in turn in this process)
+        catalog_path: Optional[str]
+            Path to a SQLite catalog (see planetsca.catalog). Images already predicted with the same model, options and output directory, and unchanged
+            since, are skipped and the SCA images produced are recorded in the catalog, defaults to None
+        incremental: bool
+            set to True to keep the SCA images that are up to date with their image and the model, see predict_file(model_digest=...),
+            defaults to False
+        **kwargs
+            other keyword arguments passed on to predict_file()
+
+    Returns
+    ----------
+        sca_image_paths: List[str]
+            list of file paths to the SCA images produced (or with in_memory=True, tuples of labels and rasterio profile), in the same order as file_list. Images that failed are reported with a warning and have None in their place
+        stats: pd.DataFrame
+            with stats=True, the snow cover statistics of each image and zone (see stats.SCAStats.rows()), returned as a
+            tuple (sca_image_paths, stats)
     """
+    if kwargs.get("in_memory") and (incremental or catalog_path is not None):
+        raise ValueError(
+            "in_memory=True does not write SCA images, it can not be used with incremental or catalog_path"
+        )
+    # check the options once, rather than failing on every image
+    check_nbits(kwargs.get("nbits"), kwargs.get("nodata_flag", 9))
+    check_cloud_flag(
+        kwargs.get("cloud_flag", 8),
+        kwargs.get("nodata_flag", 9),
+        kwargs.get("nbits"),
+        kwargs.get("udm2", False),
+    )
+    if incremental:
+        kwargs["model_digest"] = model_hash(model)
+    # read the zones once, rather than in every worker
+    kwargs["zones"] = read_zones(kwargs.get("zones"))
 
-    # if output directory is not empty
-    if output_dirpath != "":
-        # check if the directory already exists
-        if not os.path.exists(output_dirpath):
-            # create the output directory if it does not already exist
-            os.mkdir(output_dirpath)
+    if catalog_path is not None:
+        return predict_files_cataloged(
+            file_list, model, catalog_path, engine=engine, n_workers=n_workers, **kwargs
+        )
 
-    # check if planet_path is a list
-    if isinstance(planet_path, list):
-        # make sure that each file exists
-        if all(os.path.isfile(filepath) for filepath in planet_path):
-            # then the file list is what was provided in planet_path
-            file_list = planet_path
-    # otherwise planet_path should be a string
-    elif isinstance(planet_path, str):
-        # if planet_path is a directory, then find all images with 'SR' flag, meaning surface reflectance data
-        if os.path.isdir(planet_path):
-            file_list = glob.glob(planet_path + "/**/*SR*.tif", recursive=True)
-        # otherwise we are working with a single planet image
-        elif os.path.isfile(planet_path):
-            file_list = [planet_path]
+    if n_workers is None or n_workers <= 1 or len(file_list) <= 1:
+        results = predict_files_serial(file_list, model, engine, kwargs)
+    else:
+        results = predict_files_pool(file_list, model, engine, n_workers, kwargs)
 
-    # if provided with a filepath to a model file
-    if isinstance(model, str) and os.path.isfile(model):
-        # open the model
-        print(f"Reading model from file: {model}")
-        model = joblib.load(model)
-    # otherwise "model" is already our RandomForestClassifier model
+    if kwargs.get("stats"):
+        return split_stats(results)
+    return results
 
-    return file_list, model, output_dirpath
+
+def predict_files_serial(
+    file_list: List[str],
+    model: Union[RandomForestClassifier, str, onnx.onnx_ml_pb2.ModelProto],
+    engine: str,
+    kwargs: dict,
+) -> list:
+    """
+    Helper function predicting a list of PlanetScope images one after the other in this process
+
+    Parameters
+    ----------
+        file_list: List[str]
+            a list of filepaths to PlanetScope surface reflectance (SR) images
+        model: Union[RandomForestClassifier, str, onnx.onnx_ml_pb2.ModelProto]
+            the model, see make_predict_fn()
+        engine: str
+            the inference engine, see make_predict_fn()
+        kwargs: dict
+            keyword arguments passed on to predict_file()
+
+    Returns
+    ----------
+        results: list
+            the results of predict_file() in the same order as file_list, images that failed are reported with a warning
+            and have None in their place
+    """
+    predict_fn = make_predict_fn(model, engine)
+    results = []
+    for f in file_list:
+        try:
+            results.append(predict_file(f, predict_fn, **kwargs))
+        except Exception as e:
+            warnings.warn(f"Failed to predict {f}: {e!r}", stacklevel=3)
+            results.append(None)
+    return results
+
+
+def predict_files_pool(
+    file_list: List[str],
+    model: Union[RandomForestClassifier, str, onnx.onnx_ml_pb2.ModelProto],
+    engine: str,
+    n_workers: int,
+    kwargs: dict,
+) -> list:
+    """
+    Helper function predicting a list of PlanetScope images on a pool of worker processes, each loading the model once
+
+    Parameters
+    ----------
+        file_list: List[str]
+            a list of filepaths to PlanetScope surface reflectance (SR) images
+        model: Union[RandomForestClassifier, str, onnx.onnx_ml_pb2.ModelProto]
+            the model, see make_predict_fn()
+        engine: str
+            the inference engine, see make_predict_fn()
+        n_workers: int
+            number of worker processes to use
+        kwargs: dict
+            keyword arguments passed on to predict_file()
+
+    Returns
+    ----------
+        results: list
+            the results of predict_file() in the same order as file_list, images that failed are reported with a warning
+            and have None in their place
+    """
+    if isinstance(model, InferenceSession):
+        raise ValueError(
+            "An InferenceSession can not be shared with worker processes, provide the ONNX model or its file path instead"
+        )
+    if isinstance(model, onnx.onnx_ml_pb2.ModelProto):
+        # send the serialized model to each worker once
+        model = model.SerializeToString()
+
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=min(n_workers, len(file_list)),
+        initializer=_init_worker,
+        initargs=(model, engine),
+    ) as executor:
+        futures = [executor.submit(_predict_file_worker, f, kwargs) for f in file_list]
+        # collect the results in input order
+        for f, future in zip(file_list, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                warnings.warn(f"Failed to predict {f}: {e!r}", stacklevel=3)
+                results.append(None)
+
+    return results
+
+
+def predict_files_cataloged(
+    file_list: List[str],
+    model: Union[RandomForestClassifier, str, onnx.onnx_ml_pb2.ModelProto],
+    catalog_path: str,
+    engine: str = "sklearn",
+    n_workers: Optional[int] = None,
+    **kwargs,
+) -> Union[List[str], Tuple[List[str], pd.DataFrame]]:
+    """
+    Helper function predicting the images that the catalog has no SCA image for with this model, these options and in
+    this output directory, and recording the new SCA images in the catalog
+
+    Parameters
+    ----------
+        file_list: List[str]
+            a list of filepaths to PlanetScope surface reflectance (SR) images
+        model: Union[RandomForestClassifier, str, onnx.onnx_ml_pb2.ModelProto]
+            the model, see make_predict_fn()
+        catalog_path: str
+            Path to the SQLite catalog database
+        engine: str
+            the inference engine, see make_predict_fn(), defaults to "sklearn"
+        n_workers: Optional[int]
+            number of worker processes to use, see predict_files()
+        **kwargs
+            other keyword arguments passed on to predict_file()
+
+    Returns
+    ----------
+        sca_image_paths: List[str]
+            list of file paths to the SCA images, already produced or new, in the same order as file_list (None for images
+            that failed)
+        stats: pd.DataFrame
+            with stats=True, the snow cover statistics of each image, read from the SCA images already produced, returned
+            as a tuple (sca_image_paths, stats)
+    """
+    digest = model_hash(model)
+    options_digest = options_hash(**kwargs)
+    output_dirpath = kwargs.get("output_dirpath", "")
+    output_paths = {f: sca_output_path(f, output_dirpath) for f in file_list}
+    done = catalog.find_predictions(
+        catalog_path,
+        file_list,
+        digest,
+        options_hash=options_digest,
+        output_paths=output_paths,
+    )
+    # return the SCA images already produced in the same form as the new ones
+    done = {f: output_paths[f] for f in done}
+    if len(done) > 0:
+        print(f"Skipping {len(done)} images already predicted with this model")
+    todo = [f for f in file_list if f not in done]
+
+    results = predict_files(todo, model, engine=engine, n_workers=n_workers, **kwargs)
+    if kwargs.get("stats"):
+        results, stats = results
+    produced = set(results)
+    new = {f: output_paths[f] for f in todo if output_paths[f] in produced}
+    catalog.add_predictions(catalog_path, new, digest, options_hash=options_digest)
+
+    outputs = {**done, **new}
+    sca_image_paths = [outputs.get(f) for f in file_list]
+    if kwargs.get("stats"):
+        return sca_image_paths, add_done_stats(stats, done, file_list, **kwargs)
+    return sca_image_paths
+
+
+def add_done_stats(
+    predicted_stats: pd.DataFrame, done: Dict[str, str], file_list: List[str], **kwargs
+) -> pd.DataFrame:
+    """
+    Helper function adding the statistics of the images that were not predicted again, read from their SCA images
+
+    Parameters
+    ----------
+        predicted_stats: pd.DataFrame
+            the statistics of the images predicted
+        done: Dict[str, str]
+            file path of the SCA image already produced from each image that was not predicted again
+        file_list: List[str]
+            a list of filepaths to PlanetScope surface reflectance (SR) images, giving the order of the statistics
+        **kwargs
+            keyword arguments of predict_file(), e.g. nodata_flag and zones
+
+    Returns
+    ----------
+        stats: pd.DataFrame
+            the statistics of every image, in the same order as file_list
+    """
+    results = [
+        with_stats(
+            sca_path,
+            scene_stats(
+                f,
+                kwargs.get("nodata_flag", 9),
+                kwargs.get("cloud_flag", 8),
+                zones=kwargs.get("zones"),
+                zone_field=kwargs.get("zone_field"),
+            ),
+            sca_path=sca_path,
+        )
+        for f, sca_path in done.items()
+    ]
+    rows = split_stats(results)[1].to_dict("records") + predicted_stats.to_dict(
+        "records"
+    )
+    order = {f: i for i, f in enumerate(file_list)}
+    rows.sort(key=lambda row: order[row["file"]])
+    return pd.DataFrame(rows, columns=predicted_stats.columns)
 
 
 def predict_sca(
@@ -75,9 +1815,29 @@ def predict_sca(
     model: Union[str, RandomForestClassifier],
     output_dirpath: str = "",
     nodata_flag: int = 9,
-) -> Union[str, List[str]]:
+    windowed: bool = False,
+    tile_size: Optional[int] = None,
+    skip_nodata: bool = True,
+    n_workers: Optional[int] = None,
+    engine: str = "sklearn",
+    n_threads: Optional[int] = None,
+    catalog_path: Optional[str] = None,
+    incremental: bool = False,
+    hash_inputs: bool = False,
+    compress: Optional[str] = None,
+    tiled: bool = False,
+    overviews: bool = False,
+    cog: bool = False,
+    nbits: Optional[int] = None,
+    in_memory: bool = False,
+    udm2: bool = False,
+    cloud_flag: int = 8,
+    stats: bool = False,
+    zones: Optional[Union[str, gpd.GeoDataFrame]] = None,
+    zone_field: Optional[str] = None,
+) -> Union[List[str], Tuple[List[str], pd.DataFrame]]:
     """
-    This function predicts binary snow cover from PlanetScope satellite images using an ONNX random forest model
+    This function predicts binary snow cover from PlanetScope satellite images using a random forest model
 
     Parameters
     ----------
@@ -89,90 +1849,199 @@ def predict_sca(
             the directory where output snow cover images will be stored
         nodata_flag: int
             the value used to represent no data in the predicted snow cover image, default value is 9
+        windowed: bool
+            set to True to read, classify and write each image one block window at a time, so that memory use depends on the block size rather than the image size, defaults to False
+        tile_size: Optional[int]
+            size in pixels of square tiles to use instead of the images' internal blocks, implies windowed=True, defaults to None
+        skip_nodata: bool
+            set to True to only send pixels with data to the model, so that inference cost shrinks with the fraction of nodata pixels, or False to classify every pixel, defaults to True
+        n_workers: Optional[int]
+            number of worker processes to spread the images across, each worker loads the model once, defaults to None (predict each image in turn)
+        engine: str
+            the inference engine, one of "sklearn" (the model's own predict method), "numpy" (NumpyForestClassifier, a vectorized NumPy evaluator of the forest) or "lookup_table" (LookupTableClassifier), defaults to "sklearn"
+        n_threads: Optional[int]
+            number of threads that read and classify blocks or row strips of each image at the same time, while a single writer assembles the output. Combined with n_workers, each worker process uses n_threads threads, defaults to None (a single thread)
+        catalog_path: Optional[str]
+            Path to a SQLite catalog (see planetsca.catalog), used to find the images in a directory with a query, to skip images already predicted with the same model, options and output directory, and to record the SCA images produced, defaults to None
+        incremental: bool
+            set to True to skip the images whose SCA image is up to date, from a fingerprint of the image and the model stored in the tags of the SCA image, so that reruns only predict new or changed images, defaults to False
+        hash_inputs: bool
+            set to True to fingerprint the contents of each image in incremental mode, rather than its size and modification time, defaults to False
+        compress: Optional[str]
+            compression of the SCA images, "deflate", "lzw" or "zstd" (with horizontal differencing), which shrinks the mostly uniform SCA images many times over, defaults to None (uncompressed)
+        tiled: bool
+            set to True to write the SCA images in square tiles (SCA_BLOCKSIZE pixels) rather than strips, for fast windowed reads, defaults to False
+        overviews: bool
+            set to True to add internal overviews (nearest neighbour) to the SCA images, defaults to False
+        cog: bool
+            set to True to write the SCA images as Cloud Optimized GeoTIFFs, tiled and with overviews, compressed with DEFLATE unless compress is given, defaults to False
+        nbits: Optional[int]
+            number of bits per pixel to pack the SCA images into, 2 holds snow, no snow and a nodata_flag of 3 or less, defaults to None (8 bits)
+        in_memory: bool
+            set to True to return the predicted labels and rasterio profile of each image, instead of writing the SCA images to disk, defaults to False
+        udm2: bool
+            set to True to read the UDM2 image delivered next to each SR image (*udm2*.tif) window by window, and leave its cloudy and shadowed pixels out of inference, labelled with cloud_flag. Images without a UDM2 image are predicted without it, with a warning, defaults to False
+        cloud_flag: int
+            the value used to represent cloudy and shadowed pixels in the predicted snow cover images when udm2=True, defaults to 8
+        stats: bool
+            set to True to count the pixels of each class while predicting, and return a DataFrame of snow cover statistics of each image (see stats.SCAStats) along with the SCA images, instead of reading the SCA images again to summarize them, defaults to False
+        zones: Optional[Union[str, gpd.GeoDataFrame]]
+            polygons to also compute statistics over when stats=True, e.g. basins, as a GeoDataFrame or a vector file path read once. The polygons are rasterized once per image grid, defaults to None
+        zone_field: Optional[str]
+            column of zones naming each zone in the statistics, defaults to None (the index of zones)
 
     Returns
     ----------
         sca_image_paths: List[str]
-            list of file paths to the SCA images produced
+            list of file paths to the SCA images produced, or with in_memory=True a list of tuples of the predicted labels
+            (np.ndarray) and their rasterio profile (dict, with the transform and crs), in the same order as the images.
+            Images that fail are reported with a warning, without stopping the other images, and have None in their place
+        stats: pd.DataFrame
+            with stats=True, a row of snow cover statistics for each image (zone None) and for each zone of each image:
+            pixel counts of each class, valid_fraction, sca_fraction and snow_area (in the squared units of the crs, e.g.
+            m²), returned as a tuple (sca_image_paths, stats)
     """
 
     #
-    file_list, model, output_dirpath = check_inputs(planet_path, model, output_dirpath)
-
-    # make an empty list to populate with finished sca image filepaths
-    sca_image_paths = []
+    file_list, model, output_dirpath = check_inputs(
+        planet_path, model, output_dirpath, catalog_path=catalog_path
+    )
 
     # open and apply the model to each image in the list
-    for f in file_list:
-        print("Start to predict:".format(), os.path.basename(f))
+    sca_image_paths = predict_files(
+        file_list,
+        model,
+        engine=engine,
+        n_workers=n_workers,
+        output_dirpath=output_dirpath,
+        nodata_flag=nodata_flag,
+        windowed=windowed,
+        tile_size=tile_size,
+        skip_nodata=skip_nodata,
+        n_threads=n_threads,
+        catalog_path=catalog_path,
+        incremental=incremental,
+        hash_inputs=hash_inputs,
+        compress=compress,
+        tiled=tiled,
+        overviews=overviews,
+        cog=cog,
+        nbits=nbits,
+        in_memory=in_memory,
+        udm2=udm2,
+        cloud_flag=cloud_flag,
+        stats=stats,
+        zones=zones,
+        zone_field=zone_field,
+    )
 
-        with rasterio.open(f, "r") as ds:
-            arr = ds.read()  # read all raster values
-            if arr.shape[0] > 4:  # if we have more than 4 bands
-                print(
-                    "Input image has more than the expected 4 bands (blue, green, red, NIR). \
-                This function will continue running using the first four bands in the input image."
-                )
-                # TODO: use UserWarning, warnings, or logging module to handle messages like this
-                arr = arr[:4, :, :]  # use only the first four
-                # TODO: add functionality for other cases where we have more than 4 bands (e.g. using NDVI or pseudo-NDSI)
-
-        print("Image dimension:".format(), arr.shape)
-        X_img = pd.DataFrame(arr.reshape([4, -1]).T)
-        X_img.columns = ["blue", "green", "red", "nir"]
-
-        X_img = X_img / 10000  # scale surface reflectance to 0-1
-
-        X_img["nodata_flag"] = np.where(
-            X_img["blue"] == 0, -1, 1
-        )  # wherever blue band is zero, set to nodata value of -1
-
-        # run model prediction
-        y_img = model.predict(X_img.iloc[:, 0:4])
-
-        out_img = pd.DataFrame()
-        out_img["label"] = y_img
-        out_img["nodata_flag"] = X_img["nodata_flag"]
-        out_img["label"] = np.where(
-            out_img["nodata_flag"] == -1, nodata_flag, out_img["label"]
-        )  # where we set to -1, set to new nodata_flag value
-        # Reshape our classification map
-        img_prediction = out_img["label"].to_numpy().reshape(arr[0, :, :].shape)
-
-        # save the resulting SCA image out as a geotiff
-        file_out = os.path.join(
-            output_dirpath, os.path.splitext(os.path.basename(f))[0] + "_SCA.tif"
+    return sca_image_paths
+
+
+# onnxruntime sessions are expensive to build, keep the most recently used ones
+# around so that repeated calls with the same model reuse them
+SESSION_CACHE_SIZE = 4
+_session_cache = OrderedDict()
+_session_cache_lock = threading.Lock()
+
+
+def model_hash(
+    model: Union[str, bytes, onnx.onnx_ml_pb2.ModelProto, RandomForestClassifier],
+) -> str:
+    """
+    Compute a hash that identifies a model by its contents
+
+    Parameters
+    ----------
+        model: Union[str, bytes, onnx.onnx_ml_pb2.ModelProto, RandomForestClassifier]
+            file path to a model onnx (or joblib) file, a serialized onnx model, an onnx.onnx_ml_pb2.ModelProto model
+            object, or an sklearn model object
+
+    Returns
+    ----------
+        digest: str
+            hex digest of the SHA-256 hash of the serialized model, or the joblib hash of an sklearn model object
+    """
+    if isinstance(model, InferenceSession):
+        raise ValueError(
+            "An InferenceSession can not be hashed, provide the ONNX model or its file path instead"
         )
-        print("Save SCA map to: ".format(), file_out)
-        with rasterio.open(
-            file_out,
-            "w",
-            driver="GTiff",
-            transform=ds.transform,
-            dtype=rasterio.uint8,
-            count=1,
-            crs=ds.crs,
-            width=ds.width,
-            height=ds.height,
-            nodata=nodata_flag,
-        ) as dst:
-            dst.write(img_prediction, indexes=1, masked=True)
+    if isinstance(model, str):
+        with open(model, "rb") as f:
+            model = f.read()
+    elif isinstance(model, onnx.onnx_ml_pb2.ModelProto):
+        model = model.SerializeToString()
+    elif not isinstance(model, bytes):
+        return joblib.hash(model)
+    return hashlib.sha256(model).hexdigest()
 
-        sca_image_paths.append(file_out)
 
-    return sca_image_paths
+def get_inference_session(
+    model: Union[str, bytes, onnx.onnx_ml_pb2.ModelProto, InferenceSession],
+) -> InferenceSession:
+    """
+    Get an onnxruntime InferenceSession for a model, reusing a cached session if one was already built for the same model
+
+    Parameters
+    ----------
+        model: Union[str, bytes, onnx.onnx_ml_pb2.ModelProto, InferenceSession]
+            file path to a model onnx file, a serialized onnx model, an onnx.onnx_ml_pb2.ModelProto model object, or an already built InferenceSession (returned as is)
+
+    Returns
+    ----------
+        sess: InferenceSession
+            an onnxruntime InferenceSession for the model
+    """
+    if isinstance(model, InferenceSession):
+        return model
+
+    if isinstance(model, str):
+        # model files are keyed on their path and modification time so they are only read once
+        stat = os.stat(model)
+        key = (os.path.realpath(model), stat.st_mtime_ns, stat.st_size)
+        model_bytes = None
+    else:
+        model_bytes = model if isinstance(model, bytes) else model.SerializeToString()
+        key = hashlib.sha256(model_bytes).hexdigest()
+
+    with _session_cache_lock:
+        if key in _session_cache:
+            _session_cache.move_to_end(key)
+            return _session_cache[key]
+
+    sess = InferenceSession(model if model_bytes is None else model_bytes)
+
+    with _session_cache_lock:
+        _session_cache[key] = sess
+        # evict the least recently used sessions
+        while len(_session_cache) > SESSION_CACHE_SIZE:
+            _session_cache.popitem(last=False)
+
+    return sess
+
+
+def clear_session_cache() -> None:
+    """
+    Remove all cached onnxruntime InferenceSessions
+
+    Returns
+    ----------
+        None
+    """
+    with _session_cache_lock:
+        _session_cache.clear()
 
 
 def predict_with_onnxruntime(
-    model: onnx.onnx_ml_pb2.ModelProto, X: np.array
+    model: Union[str, onnx.onnx_ml_pb2.ModelProto, InferenceSession], X: np.array
 ) -> np.array:
     """
     Run a prediction with an ONNX model
 
     Parameters
     ----------
-        model: onnx.onnx_ml_pb2.ModelProto
-            an onnx.onnx_ml_pb2.ModelProto model object
+        model: Union[str, onnx.onnx_ml_pb2.ModelProto, InferenceSession]
+            file path to a model onnx file, an onnx.onnx_ml_pb2.ModelProto model object, or an onnxruntime InferenceSession
         X: np.array
             an array of input data of shape (n_samples, 4)
 
@@ -181,17 +2050,18 @@ def predict_with_onnxruntime(
         predictions: np.array
             an array of predicted labels for snow (1) or no snow (0) of shape (n_samples, 4)
     """
-    sess = InferenceSession(model.SerializeToString())
+    sess = get_inference_session(model)
     input_name = sess.get_inputs()[0].name
-    res = sess.run(None, {input_name: X.astype(np.float32)})
+    res = sess.run(None, {input_name: np.asarray(X, dtype=np.float32)})
     predictions = res[0]
     return predictions
 
 
 def check_inputs_onnx(
     planet_path: Union[str, List[str]],
-    model: Union[str, onnx.onnx_ml_pb2.ModelProto],
+    model: Union[str, onnx.onnx_ml_pb2.ModelProto, InferenceSession],
     output_dirpath: str = "",
+    catalog_path: Optional[str] = None,
 ) -> int:
     """
     Check the inputs for the predict_sca_onnx function
@@ -200,17 +2070,20 @@ def check_inputs_onnx(
     ----------
         planet_path: str or List[str]
             file path to a single PlanetScope surface reflectance (SR) image, a list of file paths, or path to a directory containing multiple SR images
-        model: Union[str, onnx.onnx_ml_pb2.ModelProto]
-            file path to a model onnx file, or an onnx.onnx_ml_pb2.ModelProto model object
+        model: Union[str, onnx.onnx_ml_pb2.ModelProto, InferenceSession]
+            file path to a model onnx file, an onnx.onnx_ml_pb2.ModelProto model object, or an onnxruntime InferenceSession
         output_dirpath: str
             the directory where output snow cover images will be stored
+        catalog_path: Optional[str]
+            Path to a SQLite catalog (see planetsca.catalog), to find the images in a directory with a query of the catalog
+            instead of searching the directory, defaults to None
 
     Returns
     ----------
         file_list: List[str]
             a list of filepaths to PlanetScope surface reflectance (SR) images
-        model: onnx.onnx_ml_pb2.ModelProto
-            an onnx.onnx_ml_pb2.ModelProto model object
+        model: Union[str, onnx.onnx_ml_pb2.ModelProto, InferenceSession]
+            the model file path, onnx.onnx_ml_pb2.ModelProto model object, or InferenceSession, ready for get_inference_session()
         output_dirpath: str
             the directory where output snow cover images will be stored
     """
@@ -232,27 +2105,45 @@ def check_inputs_onnx(
     elif isinstance(planet_path, str):
         # if planet_path is a directory, then find all images with 'SR' flag, meaning surface reflectance data
         if os.path.isdir(planet_path):
-            file_list = glob.glob(planet_path + "/**/*SR*.tif", recursive=True)
+            file_list = find_images(planet_path, catalog_path)
         # otherwise we are working with a single planet image
         elif os.path.isfile(planet_path):
             file_list = [planet_path]
 
-    # if provided with a filepath to a model file
+    # if provided with a filepath to a model file, leave it for get_inference_session()
+    # to load, so that the session for that file is built only once per process
     if isinstance(model, str) and os.path.isfile(model):
-        # open the model
         print(f"Reading model from file: {model}")
-        model = onnx.load(model)
-    # otherwise "model" is already our RandomForestClassifier model
+    # otherwise "model" is already our ONNX model or InferenceSession
 
     return file_list, model, output_dirpath
 
 
 def predict_sca_onnx(
     planet_path: Union[str, List[str]],
-    model: Union[str, onnx.onnx_ml_pb2.ModelProto],
+    model: Union[str, onnx.onnx_ml_pb2.ModelProto, InferenceSession],
     output_dirpath: str = "",
     nodata_flag: int = 9,
-) -> Union[str, List[str]]:
+    windowed: bool = False,
+    tile_size: Optional[int] = None,
+    skip_nodata: bool = True,
+    n_workers: Optional[int] = None,
+    n_threads: Optional[int] = None,
+    catalog_path: Optional[str] = None,
+    incremental: bool = False,
+    hash_inputs: bool = False,
+    compress: Optional[str] = None,
+    tiled: bool = False,
+    overviews: bool = False,
+    cog: bool = False,
+    nbits: Optional[int] = None,
+    in_memory: bool = False,
+    udm2: bool = False,
+    cloud_flag: int = 8,
+    stats: bool = False,
+    zones: Optional[Union[str, gpd.GeoDataFrame]] = None,
+    zone_field: Optional[str] = None,
+) -> Union[List[str], Tuple[List[str], pd.DataFrame]]:
     """
     This function predicts binary snow cover from PlanetScope satellite images using an ONNX random forest model
 
@@ -260,83 +2151,94 @@ def predict_sca_onnx(
     ----------
         planet_path: str or List[str]
             file path to a single PlanetScope surface reflectance (SR) image, a list of file paths, or path to a directory containing multiple SR images
-        model: Union[str, onnx.onnx_ml_pb2.ModelProto]
-            file path to a model onnx file, or an onnx.onnx_ml_pb2.ModelProto model object
+        model: Union[str, onnx.onnx_ml_pb2.ModelProto, InferenceSession]
+            file path to a model onnx file, an onnx.onnx_ml_pb2.ModelProto model object, or an onnxruntime InferenceSession
         output_dirpath: str
             the directory where output snow cover images will be stored
         nodata_flag: int
             the value used to represent no data in the predicted snow cover image, default value is 9
+        windowed: bool
+            set to True to read, classify and write each image one block window at a time, so that memory use depends on the block size rather than the image size, defaults to False
+        tile_size: Optional[int]
+            size in pixels of square tiles to use instead of the images' internal blocks, implies windowed=True, defaults to None
+        skip_nodata: bool
+            set to True to only send pixels with data to the model, so that inference cost shrinks with the fraction of nodata pixels, or False to classify every pixel, defaults to True
+        n_workers: Optional[int]
+            number of worker processes to spread the images across, each worker loads the model once, defaults to None (predict each image in turn)
+        n_threads: Optional[int]
+            number of threads that read and classify blocks or row strips of each image at the same time, while a single writer assembles the output. Combined with n_workers, each worker process uses n_threads threads, defaults to None (a single thread)
+        catalog_path: Optional[str]
+            Path to a SQLite catalog (see planetsca.catalog), used to find the images in a directory with a query, to skip images already predicted with the same model, options and output directory, and to record the SCA images produced, defaults to None
+        incremental: bool
+            set to True to skip the images whose SCA image is up to date, from a fingerprint of the image and the model stored in the tags of the SCA image, so that reruns only predict new or changed images, defaults to False
+        hash_inputs: bool
+            set to True to fingerprint the contents of each image in incremental mode, rather than its size and modification time, defaults to False
+        compress: Optional[str]
+            compression of the SCA images, "deflate", "lzw" or "zstd" (with horizontal differencing), which shrinks the mostly uniform SCA images many times over, defaults to None (uncompressed)
+        tiled: bool
+            set to True to write the SCA images in square tiles (SCA_BLOCKSIZE pixels) rather than strips, for fast windowed reads, defaults to False
+        overviews: bool
+            set to True to add internal overviews (nearest neighbour) to the SCA images, defaults to False
+        cog: bool
+            set to True to write the SCA images as Cloud Optimized GeoTIFFs, tiled and with overviews, compressed with DEFLATE unless compress is given, defaults to False
+        nbits: Optional[int]
+            number of bits per pixel to pack the SCA images into, 2 holds snow, no snow and a nodata_flag of 3 or less, defaults to None (8 bits)
+        in_memory: bool
+            set to True to return the predicted labels and rasterio profile of each image, instead of writing the SCA images to disk, defaults to False
+        udm2: bool
+            set to True to read the UDM2 image delivered next to each SR image (*udm2*.tif) window by window, and leave its cloudy and shadowed pixels out of inference, labelled with cloud_flag. Images without a UDM2 image are predicted without it, with a warning, defaults to False
+        cloud_flag: int
+            the value used to represent cloudy and shadowed pixels in the predicted snow cover images when udm2=True, defaults to 8
+        stats: bool
+            set to True to count the pixels of each class while predicting, and return a DataFrame of snow cover statistics of each image (see stats.SCAStats) along with the SCA images, instead of reading the SCA images again to summarize them, defaults to False
+        zones: Optional[Union[str, gpd.GeoDataFrame]]
+            polygons to also compute statistics over when stats=True, e.g. basins, as a GeoDataFrame or a vector file path read once. The polygons are rasterized once per image grid, defaults to None
+        zone_field: Optional[str]
+            column of zones naming each zone in the statistics, defaults to None (the index of zones)
 
     Returns
     ----------
         sca_image_paths: List[str]
-            list of file paths to the SCA images produced
+            list of file paths to the SCA images produced, or with in_memory=True a list of tuples of the predicted labels
+            (np.ndarray) and their rasterio profile (dict, with the transform and crs), in the same order as the images.
+            Images that fail are reported with a warning, without stopping the other images, and have None in their place
+        stats: pd.DataFrame
+            with stats=True, a row of snow cover statistics for each image (zone None) and for each zone of each image:
+            pixel counts of each class, valid_fraction, sca_fraction and snow_area (in the squared units of the crs, e.g.
+            m²), returned as a tuple (sca_image_paths, stats)
     """
 
     #
     file_list, model, output_dirpath = check_inputs_onnx(
-        planet_path, model, output_dirpath
+        planet_path, model, output_dirpath, catalog_path=catalog_path
     )
 
-    # make an empty list to populate with finished sca image filepaths
-    sca_image_paths = []
-
     # open and apply the model to each image in the list
-    for f in file_list:
-        print("Start to predict:".format(), os.path.basename(f))
-
-        with rasterio.open(f, "r") as ds:
-            arr = ds.read()  # read all raster values
-            if arr.shape[0] > 4:  # if we have more than 4 bands
-                print(
-                    "Input image has more than the expected 4 bands (blue, green, red, NIR). \
-                This function will continue running using the first four bands in the input image."
-                )
-                # TODO: use UserWarning, warnings, or logging module to handle messages like this
-                arr = arr[:4, :, :]  # use only the first four
-                # TODO: add functionality for other cases where we have more than 4 bands (e.g. using NDVI or pseudo-NDSI)
-
-        print("Image dimension:".format(), arr.shape)
-        X_img = pd.DataFrame(arr.reshape([4, -1]).T)
-        X_img.columns = ["blue", "green", "red", "nir"]
-
-        X_img = X_img / 10000  # scale surface reflectance to 0-1
-
-        X_img["nodata_flag"] = np.where(
-            X_img["blue"] == 0, -1, 1
-        )  # wherever blue band is zero, set to nodata value of -1
-
-        # run model prediction with onnxruntime
-        y_img = predict_with_onnxruntime(model, X_img.iloc[:, 0:4].to_numpy())
-
-        out_img = pd.DataFrame()
-        out_img["label"] = y_img
-        out_img["nodata_flag"] = X_img["nodata_flag"]
-        out_img["label"] = np.where(
-            out_img["nodata_flag"] == -1, nodata_flag, out_img["label"]
-        )  # where we set to -1, set to new nodata_flag value
-        # Reshape our classification map
-        img_prediction = out_img["label"].to_numpy().reshape(arr[0, :, :].shape)
-
-        # save the resulting SCA image out as a geotiff
-        file_out = os.path.join(
-            output_dirpath, os.path.splitext(os.path.basename(f))[0] + "_SCA.tif"
-        )
-        print("Save SCA map to: ".format(), file_out)
-        with rasterio.open(
-            file_out,
-            "w",
-            driver="GTiff",
-            transform=ds.transform,
-            dtype=rasterio.uint8,
-            count=1,
-            crs=ds.crs,
-            width=ds.width,
-            height=ds.height,
-            nodata=nodata_flag,
-        ) as dst:
-            dst.write(img_prediction, indexes=1, masked=True)
-
-        sca_image_paths.append(file_out)
+    sca_image_paths = predict_files(
+        file_list,
+        model,
+        engine="onnx",
+        n_workers=n_workers,
+        output_dirpath=output_dirpath,
+        nodata_flag=nodata_flag,
+        windowed=windowed,
+        tile_size=tile_size,
+        skip_nodata=skip_nodata,
+        n_threads=n_threads,
+        catalog_path=catalog_path,
+        incremental=incremental,
+        hash_inputs=hash_inputs,
+        compress=compress,
+        tiled=tiled,
+        overviews=overviews,
+        cog=cog,
+        nbits=nbits,
+        in_memory=in_memory,
+        udm2=udm2,
+        cloud_flag=cloud_flag,
+        stats=stats,
+        zones=zones,
+        zone_field=zone_field,
+    )
 
     return sca_image_paths
@@ -1,16 +1,35 @@
-from typing import List, Literal
+import json
+from typing import Iterator, List, Literal, Optional, Union
 
 import geopandas as gpd
+import numpy as np
+import pandas as pd
 import requests
+import shapely
 from requests.auth import HTTPBasicAuth
 from shapely.geometry import shape
+from shapely.geometry.base import BaseGeometry
 
-from planetsca import simplify_aoi
+from planetsca import search_cache, simplify_aoi
 
+QUICK_SEARCH_URL = "https://api.planet.com/data/v1/quick-search"
+# equal-area projection (EASE-Grid 2.0 global) used to compute footprint areas in square meters
+EQUAL_AREA_CRS = "EPSG:6933"
 
-def search(api_key: str, filter: dict, item_type: str = "PSScene") -> gpd.GeoDataFrame:
+
+def search(
+    api_key: str,
+    filter: dict,
+    item_type: str = "PSScene",
+    page_size: int = 250,
+    cache_path: Optional[str] = None,
+    cache_ttl: Optional[float] = 86400,
+    cache_max_bytes: Optional[int] = 1024**3,
+    incremental: bool = True,
+    equal_area: bool = False,
+) -> gpd.GeoDataFrame:
     """
-    Sends a request to the Planet API to find if data is available
+    Sends a request to the Planet API to find if data is available, following the links to every page of results
 
     Parameters
     ----------
@@ -20,6 +39,19 @@ def search(api_key: str, filter: dict, item_type: str = "PSScene") -> gpd.GeoDat
             Dictionary containing data filter information
         item_type: str
             Class of spacecraft and/or processing level of an item, defaults to PSScene. See https://developers.planet.com/docs/apis/data/items-assets/
+        page_size: int
+            Number of items requested per page of results, defaults to 250
+        cache_path: Optional[str]
+            Path to a SQLite database to cache search results in, repeated searches are then read from disk instead of the Planet API, defaults to None (no cache)
+        cache_ttl: Optional[float]
+            Number of seconds cached search results stay valid, defaults to 86400 (one day, None to never expire)
+        cache_max_bytes: Optional[int]
+            Maximum size of the cached search results, the least recently used searches are evicted past this size, defaults to 1 GiB (None for no limit)
+        incremental: bool
+            Set to True to only search the Planet API for the part of the date range that is not cached yet, defaults to True
+        equal_area: bool
+            Set to True to compute intersection_area in square meters in an equal-area projection, instead of in square
+            degrees, defaults to False
 
     Returns
     -------
@@ -27,27 +59,121 @@ def search(api_key: str, filter: dict, item_type: str = "PSScene") -> gpd.GeoDat
             GeoDataFrame containing information about the Planet images returned by the search
     """
 
-    # Search API request object
-    search_endpoint_request = {"item_types": [item_type], "filter": filter}
-    response = requests.post(
-        "https://api.planet.com/data/v1/quick-search",
-        auth=HTTPBasicAuth(api_key, ""),
-        json=search_endpoint_request,
-    )
+    def fetch(filter: dict) -> Iterator[dict]:
+        for page in iter_search_pages(api_key, filter, item_type, page_size=page_size):
+            yield from page
+
+    if cache_path is None:
+        features = list(fetch(filter))
+    else:
+        features = search_cache.cached_search(
+            cache_path,
+            item_type,
+            filter,
+            fetch,
+            ttl=cache_ttl,
+            max_bytes=cache_max_bytes,
+            incremental=incremental,
+        )
 
     # check to make sure we received items in the response
-    if len(response.json()["features"]) > 0:
-        print(f"Search returned {len(response.json()['features'])} items.")
+    if len(features) > 0:
+        print(f"Search returned {len(features)} items.")
         # use the response from the Planet API to make a geodataframe of the returned image IDs and info
-        gdf = response_to_gdf(response, filter)
+        gdf = features_to_gdf(features, filter, equal_area=equal_area)
         return gdf
     else:
-        print(
-            f"Search returned {len(response.json()['features'])} items. Try changing search filters"
-        )
+        print(f"Search returned {len(features)} items. Try changing search filters")
         return None
 
 
+def iter_search_pages(
+    api_key: str,
+    filter: dict,
+    item_type: str = "PSScene",
+    page_size: int = 250,
+    session: Optional[requests.Session] = None,
+) -> Iterator[List[dict]]:
+    """
+    Sends a request to the Planet API to find available data, and yields the features of each page of results in turn
+
+    Parameters
+    ----------
+        api_key: str
+            Planet API key
+        filter: dict
+            Dictionary containing data filter information
+        item_type: str
+            Class of spacecraft and/or processing level of an item, defaults to PSScene. See https://developers.planet.com/docs/apis/data/items-assets/
+        page_size: int
+            Number of items requested per page of results, defaults to 250
+        session: Optional[requests.Session]
+            Session used to make the requests, defaults to None (make a new session)
+
+    Returns
+    -------
+        pages: Iterator[List[dict]]
+            the GeoJSON features of each page of results
+    """
+    if session is None:
+        session = requests.Session()
+    auth = HTTPBasicAuth(api_key, "")
+
+    # Search API request object
+    search_endpoint_request = {"item_types": [item_type], "filter": filter}
+    response = session.post(
+        QUICK_SEARCH_URL,
+        auth=auth,
+        params={"_page_size": page_size},
+        json=search_endpoint_request,
+    )
+    while True:
+        response.raise_for_status()
+        # parse each page only once
+        page = response.json()
+        response.close()
+        yield page["features"]
+
+        next_url = page.get("_links", {}).get("_next")
+        if not next_url or len(page["features"]) == 0:
+            return
+        response = session.get(next_url, auth=auth)
+
+
+def iter_search(
+    api_key: str,
+    filter: dict,
+    item_type: str = "PSScene",
+    page_size: int = 250,
+    equal_area: bool = False,
+) -> Iterator[gpd.GeoDataFrame]:
+    """
+    Sends a request to the Planet API to find available data, and yields a GeoDataFrame for each page of results in turn, so that long searches do not have to be held in memory at once
+
+    Parameters
+    ----------
+        api_key: str
+            Planet API key
+        filter: dict
+            Dictionary containing data filter information
+        item_type: str
+            Class of spacecraft and/or processing level of an item, defaults to PSScene. See https://developers.planet.com/docs/apis/data/items-assets/
+        page_size: int
+            Number of items requested per page of results, defaults to 250
+        equal_area: bool
+            Set to True to compute intersection_area in square meters in an equal-area projection, instead of in square
+            degrees, defaults to False
+
+    Returns
+    -------
+        gdfs: Iterator[geopandas.geodataframe.GeoDataFrame]
+            GeoDataFrames containing information about the Planet images in each page of results
+    """
+    for features in iter_search_pages(api_key, filter, item_type, page_size=page_size):
+        if len(features) > 0:
+            yield features_to_gdf(features, filter, equal_area=equal_area)
+
+
 def response_to_gdf(response: requests.Response, filter: dict):
     """
     Creates geodataframe of image IDs and other information from a Planet API response
@@ -65,24 +191,171 @@ def response_to_gdf(response: requests.Response, filter: dict):
             GeoDataFrame containing information about the Planet images returned by the search
     """
 
-    domain_geometry = shape(get_filter(filter, "GeometryFilter")["config"])
-
     # view available data and prepare the list of planet IDs to download
     geojson_data = response.json()
-    gdf = gpd.GeoDataFrame.from_features(geojson_data["features"])
+    return features_to_gdf(geojson_data["features"], filter)
+
+
+def features_to_gdf(features: List[dict], filter: dict, equal_area: bool = False):
+    """
+    Creates geodataframe of image IDs and other information from the features returned by a Planet API search
+
+    Parameters
+    ----------
+        features: List[dict]
+            GeoJSON features from the Planet API with information about images that matched search criteria
+        filter: dict
+            Dictionary containing data filter information
+        equal_area: bool
+            Set to True to compute intersection_area in square meters in an equal-area projection (EPSG:6933), instead of in
+            square degrees, defaults to False
+
+    Returns
+    -------
+        gdf: geopandas.geodataframe.GeoDataFrame
+            GeoDataFrame containing information about the Planet images returned by the search
+    """
+
+    domain_geometry = shape(get_filter(filter, "GeometryFilter")["config"])
+
+    # build the geodataframe directly from the parsed features
+    geometry = features_to_geometry(features)
+    properties = pd.DataFrame([feature["properties"] for feature in features])
+    gdf = gpd.GeoDataFrame({"geometry": geometry, **properties})
+
+    # only intersect the footprints whose bounding boxes intersect the domain
+    candidates = gdf.sindex.query(domain_geometry, predicate="intersects")
+    footprints = geometry[candidates]
+    if equal_area:
+        footprints = gpd.GeoSeries(footprints, crs="EPSG:4326").to_crs(EQUAL_AREA_CRS)
+        footprints = footprints.values.to_numpy()
+        domain_geometry = (
+            gpd.GeoSeries([domain_geometry], crs="EPSG:4326")
+            .to_crs(EQUAL_AREA_CRS)
+            .iloc[0]
+        )
+
+    # footprints within the domain, or containing it, don't need an exact intersection
+    shapely.prepare(domain_geometry)
+    within = shapely.within(footprints, domain_geometry)
+    contains = shapely.contains(footprints, domain_geometry)
+    candidate_area = np.where(within, shapely.area(footprints), domain_geometry.area)
+    partial = ~(within | contains)
+    candidate_area[partial] = shapely.area(
+        shapely.intersection(footprints[partial], domain_geometry)
+    )
 
     # Add a new column to 'gdf' with the intersection area
-    gdf["intersection_area"] = gdf["geometry"].intersection(domain_geometry).area
+    intersection_area = np.zeros(len(gdf))
+    intersection_area[candidates] = candidate_area
+    gdf["intersection_area"] = intersection_area
 
     # Calculate the percentage overlap
     gdf["overlap_percentage"] = (gdf["intersection_area"] / domain_geometry.area) * 100
 
     # get image IDs and add to geodataframe
-    gdf["id"] = [feature["id"] for idx, feature in enumerate(geojson_data["features"])]
+    gdf["id"] = [feature["id"] for feature in features]
 
     return gdf
 
 
+def features_to_geometry(features: List[dict]) -> np.ndarray:
+    """
+    Helper function to make an array of shapely geometries from GeoJSON features
+
+    Parameters
+    ----------
+        features: List[dict]
+            GeoJSON features from the Planet API
+
+    Returns
+    -------
+        geometry: numpy.ndarray
+            array of shapely geometries, one per feature
+    """
+    geometries = [feature["geometry"] for feature in features]
+    if all(g["type"] == "Polygon" and len(g["coordinates"]) == 1 for g in geometries):
+        # footprints are polygons without holes, build them from their coordinates in one call
+        rings = [g["coordinates"][0] for g in geometries]
+        ring_offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+        np.cumsum([len(ring) for ring in rings], out=ring_offsets[1:])
+        coords = np.array([xy[:2] for ring in rings for xy in ring], dtype=np.float64)
+        return shapely.from_ragged_array(
+            shapely.GeometryType.POLYGON,
+            coords,
+            (ring_offsets, np.arange(len(rings) + 1)),
+        )
+    return shapely.from_geojson([json.dumps(g) for g in geometries])
+
+
+def select_scenes(
+    gdf: gpd.GeoDataFrame,
+    aoi: Union[dict, BaseGeometry],
+    target_coverage: float = 95,
+    time_window: str = "1D",
+    cloud_cover_weight: float = 1.0,
+) -> gpd.GeoDataFrame:
+    """
+    Select the smallest set of scenes in each time window that covers the area of interest, preferring less cloudy scenes
+
+    Scenes are picked greedily in each time window: the next scene is the one that adds the most uncovered area, weighted by
+    (1 - cloud_cover_weight * cloud_cover), until the scenes picked cover target_coverage percent of the area of interest.
+    Time windows where every scene has been picked before reaching the target coverage keep all their useful scenes.
+
+    Parameters
+    ----------
+        gdf: geopandas.geodataframe.GeoDataFrame
+            GeoDataFrame of search results, from search()
+        aoi: Union[dict, shapely.geometry.base.BaseGeometry]
+            area of interest, either a shapely geometry or the filter dict used for the search
+        target_coverage: float
+            percentage of the area of interest to cover in each time window, defaults to 95
+        time_window: str
+            pandas frequency string of the time windows scenes are selected in, defaults to "1D" (one day)
+        cloud_cover_weight: float
+            how strongly cloud cover (from 0 to 1) penalizes a scene, 0 to ignore cloud cover, defaults to 1.0
+
+    Returns
+    -------
+        selected: geopandas.geodataframe.GeoDataFrame
+            the selected rows of gdf in the order they were picked, with the added columns "window" (start of the time
+            window) and "coverage" (percentage of the area of interest covered once the scene is added)
+    """
+    if isinstance(aoi, dict):
+        aoi = shape(get_filter(aoi, "GeometryFilter")["config"])
+    aoi_area = aoi.area
+
+    # only scenes that intersect the area of interest can add coverage
+    candidates = gdf.iloc[np.sort(gdf.sindex.query(aoi, predicate="intersects"))]
+    windows = pd.to_datetime(candidates["acquired"]).dt.floor(time_window)
+    weights = 1 - cloud_cover_weight * candidates["cloud_cover"].to_numpy()
+    footprints = candidates.geometry.values.to_numpy()
+
+    picks, picked_windows, coverages = [], [], []
+    for window, positions in candidates.groupby(windows, sort=True).indices.items():
+        uncovered = aoi
+        remaining = positions
+        while len(remaining) > 0:
+            gain = shapely.area(shapely.intersection(footprints[remaining], uncovered))
+            if not (gain > 0).any():
+                break
+            # scenes adding no coverage are never picked, even when cloudier scenes score below zero
+            score = np.where(gain > 0, gain * weights[remaining], -np.inf)
+            best = np.argmax(score)
+            uncovered = uncovered.difference(footprints[remaining[best]])
+            picks.append(remaining[best])
+            picked_windows.append(window)
+            coverages.append((1 - uncovered.area / aoi_area) * 100)
+            if coverages[-1] >= target_coverage:
+                break
+            remaining = np.delete(remaining, best)
+
+    selected = candidates.iloc[picks].copy()
+    selected["window"] = picked_windows
+    selected["coverage"] = coverages
+    return selected
+
+
 def make_domain_geometry_from_bounds(bounds: List[float]):
     """
     Make a shapely geometry polygon from from longitude and latitude bounds (a rectangular area)
@@ -0,0 +1,315 @@
+import copy
+import datetime
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    key TEXT PRIMARY KEY,
+    item_type TEXT,
+    filter TEXT,
+    created REAL,
+    last_used REAL,
+    size INTEGER
+);
+CREATE TABLE IF NOT EXISTS date_ranges (
+    key TEXT,
+    gte TEXT,
+    lte TEXT
+);
+CREATE TABLE IF NOT EXISTS features (
+    key TEXT,
+    id TEXT,
+    acquired TEXT,
+    feature TEXT,
+    PRIMARY KEY (key, id)
+);
+CREATE INDEX IF NOT EXISTS features_acquired ON features (key, acquired);
+"""
+
+
+def filter_hash(item_type: str, filter: dict) -> str:
+    """
+    Compute a canonical hash of a Planet API search
+
+    Parameters
+    ----------
+        item_type: str
+            Class of spacecraft and/or processing level of an item
+        filter: dict
+            Dictionary containing data filter information
+
+    Returns
+    -------
+        digest: str
+            hex digest of the SHA-256 hash of the search, the same for equal filters regardless of key order
+    """
+    canonical = json.dumps(
+        {"item_type": item_type, "filter": filter},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def normalize_date(date: str) -> str:
+    """
+    Normalize a Planet API date string to the UTC format 'YYYY-mm-ddTHH:MM:SS.ffffffZ', which sorts in time order
+
+    Parameters
+    ----------
+        date: str
+            date string, e.g. '2023-07-25T00:00:00Z'
+
+    Returns
+    -------
+        date: str
+            the normalized date string
+    """
+    dt = datetime.datetime.fromisoformat(date.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def split_date_range(filter: dict) -> Tuple[dict, Optional[dict]]:
+    """
+    Separate the "acquired" date range from the rest of a search filter
+
+    Parameters
+    ----------
+        filter: dict
+            Dictionary containing data filter information, an AndFilter made with search.combine_filters()
+
+    Returns
+    -------
+        base_filter: dict
+            copy of the filter with the date range replaced by a placeholder, or the filter itself if it has no date range
+        date_range_filter: Optional[dict]
+            the DateRangeFilter on the "acquired" field, or None if there is none
+    """
+    if filter.get("type") != "AndFilter":
+        return filter, None
+    for i, sub_filter in enumerate(filter["config"]):
+        if (
+            sub_filter.get("type") == "DateRangeFilter"
+            and sub_filter.get("field_name") == "acquired"
+            and set(sub_filter["config"]) == {"gte", "lte"}
+        ):
+            base_filter = copy.deepcopy(filter)
+            base_filter["config"][i] = {
+                "type": "DateRangeFilter",
+                "field_name": "acquired",
+            }
+            return base_filter, sub_filter
+    return filter, None
+
+
+def with_date_range(filter: dict, gte: str, lte: str) -> dict:
+    """
+    Copy of a search filter with its "acquired" date range replaced
+    """
+    filter = copy.deepcopy(filter)
+    for sub_filter in filter["config"]:
+        if (
+            sub_filter.get("type") == "DateRangeFilter"
+            and sub_filter.get("field_name") == "acquired"
+        ):
+            sub_filter["config"] = {"gte": gte, "lte": lte}
+    return filter
+
+
+def missing_date_ranges(
+    gte: str, lte: str, cached: List[Tuple[str, str]]
+) -> List[Tuple[str, str]]:
+    """
+    Find the parts of a date range that are not covered by cached date ranges
+
+    Parameters
+    ----------
+        gte: str
+            start of the date range (normalized)
+        lte: str
+            end of the date range (normalized)
+        cached: List[Tuple[str, str]]
+            (gte, lte) date ranges already in the cache (normalized)
+
+    Returns
+    -------
+        missing: List[Tuple[str, str]]
+            (gte, lte) date ranges still to be searched
+    """
+    missing = []
+    start = gte
+    overlapped = False
+    for cached_gte, cached_lte in sorted(cached):
+        if cached_lte < start:
+            continue
+        if cached_gte > lte:
+            break
+        if cached_gte > start:
+            missing.append((start, cached_gte))
+        start = max(start, cached_lte)
+        overlapped = True
+    if not overlapped or start < lte:
+        missing.append((start, lte))
+    return missing
+
+
+def connect(cache_path: str) -> sqlite3.Connection:
+    """
+    Open (and create if needed) a search cache database
+    """
+    connection = sqlite3.connect(cache_path, timeout=60)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def cached_search(
+    cache_path: str,
+    item_type: str,
+    filter: dict,
+    fetch: Callable[[dict], Iterator[dict]],
+    ttl: Optional[float] = 86400,
+    max_bytes: Optional[int] = 1024**3,
+    incremental: bool = True,
+) -> List[dict]:
+    """
+    Search features through a local SQLite cache, only asking the Planet API for searches (or date ranges) that are not cached yet
+
+    Parameters
+    ----------
+        cache_path: str
+            Path to the SQLite cache database
+        item_type: str
+            Class of spacecraft and/or processing level of an item
+        filter: dict
+            Dictionary containing data filter information
+        fetch: Callable[[dict], Iterator[dict]]
+            function that takes a filter and returns the features found by the Planet API, e.g. from search.iter_search_pages()
+        ttl: Optional[float]
+            Number of seconds a cached search stays valid, defaults to 86400 (one day, None to never expire)
+        max_bytes: Optional[int]
+            Maximum total size of the cached features, least recently used searches are evicted past this size, defaults to 1 GiB (None for no limit)
+        incremental: bool
+            Set to True to cache searches by their filter without the "acquired" date range, so that only date ranges not cached yet are searched, defaults to True
+
+    Returns
+    -------
+        features: List[dict]
+            GeoJSON features found by the search
+    """
+    base_filter, date_range_filter = (
+        split_date_range(filter) if incremental else (filter, None)
+    )
+    key = filter_hash(item_type, base_filter)
+    if date_range_filter is None:
+        gte, lte = "", "~"  # a date range covering every date
+    else:
+        gte = normalize_date(date_range_filter["config"]["gte"])
+        lte = normalize_date(date_range_filter["config"]["lte"])
+
+    connection = connect(cache_path)
+    try:
+        now = time.time()
+        row = connection.execute(
+            "SELECT created FROM searches WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and ttl is not None and now - row[0] > ttl:
+            # the cached search has expired
+            delete_search(connection, key)
+            row = None
+        if row is None:
+            connection.execute(
+                "INSERT INTO searches VALUES (?, ?, ?, ?, ?, 0)",
+                (key, item_type, json.dumps(base_filter, sort_keys=True), now, now),
+            )
+
+        cached = connection.execute(
+            "SELECT gte, lte FROM date_ranges WHERE key = ?", (key,)
+        ).fetchall()
+        for missing_gte, missing_lte in missing_date_ranges(gte, lte, cached):
+            if date_range_filter is None:
+                missing_filter = filter
+            else:
+                missing_filter = with_date_range(filter, missing_gte, missing_lte)
+            print(f"Searching Planet API for {missing_gte} to {missing_lte}")
+            rows = [
+                (
+                    key,
+                    feature["id"],
+                    normalize_date(feature["properties"]["acquired"]),
+                    json.dumps(feature),
+                )
+                for feature in fetch(missing_filter)
+            ]
+            connection.executemany(
+                "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?)", rows
+            )
+            connection.execute(
+                "INSERT INTO date_ranges VALUES (?, ?, ?)",
+                (key, missing_gte, missing_lte),
+            )
+
+        features = [
+            json.loads(feature)
+            for (feature,) in connection.execute(
+                "SELECT feature FROM features WHERE key = ? AND acquired >= ? AND acquired <= ? ORDER BY rowid",
+                (key, gte, lte),
+            )
+        ]
+        connection.execute(
+            "UPDATE searches SET last_used = ?, size = (SELECT COALESCE(SUM(LENGTH(feature)), 0) FROM features WHERE key = ?) WHERE key = ?",
+            (now, key, key),
+        )
+        if max_bytes is not None:
+            evict(connection, max_bytes, keep=key)
+        connection.commit()
+    finally:
+        connection.close()
+
+    return features
+
+
+def delete_search(connection: sqlite3.Connection, key: str) -> None:
+    """
+    Remove a search, its date ranges and its features from the cache
+    """
+    connection.execute("DELETE FROM searches WHERE key = ?", (key,))
+    connection.execute("DELETE FROM date_ranges WHERE key = ?", (key,))
+    connection.execute("DELETE FROM features WHERE key = ?", (key,))
+
+
+def evict(connection: sqlite3.Connection, max_bytes: int, keep: str = "") -> None:
+    """
+    Remove the least recently used searches until the cached features fit in max_bytes
+    """
+    rows = connection.execute(
+        "SELECT key, size FROM searches ORDER BY last_used DESC"
+    ).fetchall()
+    total = 0
+    for key, size in rows:
+        total += size
+        if total > max_bytes and key != keep:
+            delete_search(connection, key)
+
+
+def clear_cache(cache_path: str) -> None:
+    """
+    Remove every search from a search cache database
+
+    Parameters
+    ----------
+        cache_path: str
+            Path to the SQLite cache database
+    """
+    connection = connect(cache_path)
+    try:
+        for table in ("searches", "date_ranges", "features"):
+            connection.execute(f"DELETE FROM {table}")
+        connection.commit()
+    finally:
+        connection.close()
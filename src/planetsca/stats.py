@@ -0,0 +1,304 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Union
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import rasterio
+import rasterio.features
+from rasterio.windows import Window
+
+# number of possible labels in a (uint8) SCA image
+N_LABELS = 256
+
+# columns of the statistics DataFrame
+COLUMNS = [
+    "file",
+    "zone",
+    "pixels",
+    "snow_pixels",
+    "no_snow_pixels",
+    "cloud_pixels",
+    "nodata_pixels",
+    "valid_fraction",
+    "sca_fraction",
+    "snow_area",
+]
+
+# zone rasters are expensive to build for large polygon layers, keep the most recently
+# used ones around so that scenes on the same grid rasterize the zones only once
+ZONE_CACHE_SIZE = 8
+_zone_cache = OrderedDict()
+_zone_cache_lock = threading.Lock()
+
+
+def read_zones(zones: Union[str, gpd.GeoDataFrame, None]) -> Optional[gpd.GeoDataFrame]:
+    """
+    Helper function reading a polygon layer of zones, e.g. basins or elevation bands
+
+    Parameters
+    ----------
+        zones: Union[str, gpd.GeoDataFrame, None]
+            file path to a vector file that geopandas can read, or a GeoDataFrame of polygons
+
+    Returns
+    ----------
+        zones: Optional[gpd.GeoDataFrame]
+            the zones as a GeoDataFrame, or None if no zones were given
+    """
+    if isinstance(zones, str):
+        return gpd.read_file(zones)
+    return zones
+
+
+def zones_hash(zones: gpd.GeoDataFrame) -> str:
+    """
+    Helper function hashing the geometries and crs of a polygon layer of zones
+    """
+    digest = hashlib.sha1(str(zones.crs).encode())
+    for wkb in zones.geometry.to_wkb():
+        digest.update(wkb or b"")
+    return digest.hexdigest()
+
+
+def rasterize_zones(
+    zones: gpd.GeoDataFrame, ds: rasterio.io.DatasetReader
+) -> np.ndarray:
+    """
+    Rasterize a polygon layer of zones on the grid of an image, once per grid
+
+    Parameters
+    ----------
+        zones: gpd.GeoDataFrame
+            polygons of the zones, reprojected to the crs of the image if needed
+        ds: rasterio.io.DatasetReader
+            an open rasterio dataset, whose crs, transform and shape give the grid
+
+    Returns
+    ----------
+        zone_raster: np.ndarray
+            array of shape (rows, cols) holding the position of the zone covering each pixel plus one (the last zone where
+            zones overlap), or 0 for pixels outside every zone
+    """
+    key = (
+        zones_hash(zones),
+        None if ds.crs is None else ds.crs.to_wkt(),
+        tuple(ds.transform),
+        ds.height,
+        ds.width,
+    )
+    with _zone_cache_lock:
+        if key in _zone_cache:
+            _zone_cache.move_to_end(key)
+            return _zone_cache[key]
+
+    if zones.crs is not None and ds.crs is not None:
+        zones = zones.to_crs(ds.crs)
+    zone_raster = rasterio.features.rasterize(
+        (
+            (geometry, i + 1)
+            for i, geometry in enumerate(zones.geometry)
+            if geometry is not None and not geometry.is_empty
+        ),
+        out_shape=(ds.height, ds.width),
+        transform=ds.transform,
+        fill=0,
+        dtype=np.uint16 if len(zones) < 2**16 else np.uint32,
+    )
+
+    with _zone_cache_lock:
+        _zone_cache[key] = zone_raster
+        while len(_zone_cache) > ZONE_CACHE_SIZE:
+            _zone_cache.popitem(last=False)
+    return zone_raster
+
+
+def clear_zone_cache() -> None:
+    """
+    Drop the cached zone rasters
+    """
+    with _zone_cache_lock:
+        _zone_cache.clear()
+
+
+class SCAStats:
+    """
+    Snow cover statistics of an SCA image, accumulated window by window while the image is predicted
+
+    Counts the pixels of each label in the whole scene, and in each zone of an optional polygon layer rasterized on the
+    grid of the scene, so that the SCA image does not need to be read again to summarize it.
+
+    Parameters
+    ----------
+        f: str
+            file path to the PlanetScope image (or SCA image) whose grid the statistics are computed on
+        nodata_flag: int
+            the value used to represent no data in the SCA image, default value is 9
+        cloud_flag: int
+            the value used to represent cloudy and shadowed pixels in the SCA image, defaults to 8
+        zones: Optional[gpd.GeoDataFrame]
+            polygons to compute zonal statistics over, e.g. basins, defaults to None (scene statistics only)
+        zone_field: Optional[str]
+            column of zones naming each zone in the statistics, defaults to None (the index of zones)
+    """
+
+    def __init__(
+        self,
+        f: str,
+        nodata_flag: int = 9,
+        cloud_flag: int = 8,
+        zones: Optional[gpd.GeoDataFrame] = None,
+        zone_field: Optional[str] = None,
+    ):
+        self.f = f
+        self.nodata_flag = nodata_flag
+        self.cloud_flag = cloud_flag
+        self.zone_raster = None
+        self.zone_names = []
+        with rasterio.open(f) as ds:
+            transform = ds.transform
+            if zones is not None:
+                self.zone_raster = rasterize_zones(zones, ds)
+                self.zone_names = list(
+                    zones.index if zone_field is None else zones[zone_field]
+                )
+        # area of a pixel, in the (squared) units of the crs
+        self.pixel_area = abs(transform.a * transform.e - transform.b * transform.d)
+        # pixel counts of each label outside every zone (row 0) and in each zone
+        self.counts = np.zeros((len(self.zone_names) + 1, N_LABELS), dtype=np.int64)
+
+    def add(self, window: Window, labels: np.ndarray) -> None:
+        """
+        Count the labels of a window of the SCA image
+
+        Parameters
+        ----------
+            window: Window
+                the window of the SCA image
+            labels: np.ndarray
+                the labels (uint8 array) of the window
+        """
+        if self.zone_raster is None:
+            self.counts[0] += np.bincount(labels.ravel(), minlength=N_LABELS)
+            return
+        zone = self.zone_raster[window.toslices()]
+        # count each (zone, label) pair at once
+        pairs = zone.ravel().astype(np.int64) * N_LABELS + labels.ravel()
+        self.counts += np.bincount(pairs, minlength=self.counts.size).reshape(
+            self.counts.shape
+        )
+
+    def add_file(self, sca_path: str) -> None:
+        """
+        Count the labels of an SCA image already on disk, one block window at a time
+
+        Parameters
+        ----------
+            sca_path: str
+                file path to the SCA image, on the grid of the statistics
+        """
+        with rasterio.open(sca_path) as ds:
+            for _, window in ds.block_windows(1):
+                self.add(window, ds.read(1, window=window))
+
+    def row(self, counts: np.ndarray, zone=None) -> dict:
+        """
+        Helper function summarizing the label counts of the scene or a zone
+        """
+        total = int(counts.sum())
+        snow, no_snow = int(counts[1]), int(counts[0])
+        valid = snow + no_snow
+        return {
+            "file": self.f,
+            "zone": zone,
+            "pixels": total,
+            "snow_pixels": snow,
+            "no_snow_pixels": no_snow,
+            "cloud_pixels": int(counts[self.cloud_flag]),
+            "nodata_pixels": int(counts[self.nodata_flag]),
+            "valid_fraction": valid / total if total > 0 else np.nan,
+            "sca_fraction": snow / valid if valid > 0 else np.nan,
+            "snow_area": snow * self.pixel_area,
+        }
+
+    def rows(self) -> List[dict]:
+        """
+        Summarize the statistics of the scene, and of each zone
+
+        Returns
+        ----------
+            rows: List[dict]
+                one row for the scene (zone None) and one per zone, with the pixel counts of each class, the valid fraction
+                (snow and no snow pixels over all pixels), the snow covered fraction of the valid pixels (sca_fraction) and
+                the snow covered area (snow_area, in the squared units of the crs, e.g. m²)
+        """
+        rows = [self.row(self.counts.sum(axis=0))]
+        for name, counts in zip(self.zone_names, self.counts[1:]):
+            rows.append(self.row(counts, zone=name))
+        return rows
+
+
+def scene_stats(
+    f: str,
+    nodata_flag: int = 9,
+    cloud_flag: int = 8,
+    zones: Union[str, gpd.GeoDataFrame, None] = None,
+    zone_field: Optional[str] = None,
+    stats: bool = True,
+) -> Optional[SCAStats]:
+    """
+    Helper function starting the statistics of a scene, or returning None when stats=False
+    """
+    if not stats:
+        return None
+    return SCAStats(
+        f, nodata_flag, cloud_flag, zones=read_zones(zones), zone_field=zone_field
+    )
+
+
+def with_stats(result, accumulator: Optional[SCAStats], sca_path: Optional[str] = None):
+    """
+    Helper function returning the result of a prediction along with the statistics rows, when they are computed
+
+    Parameters
+    ----------
+        result
+            the result of the prediction, e.g. the file path to the SCA image
+        accumulator: Optional[SCAStats]
+            the statistics of the scene, or None when they are not computed
+        sca_path: Optional[str]
+            file path to an SCA image that was not predicted again, to read the statistics from, defaults to None
+
+    Returns
+    ----------
+        result
+            the result, or a tuple of the result and the statistics rows (List[dict]) when they are computed
+    """
+    if accumulator is None:
+        return result
+    if sca_path is not None:
+        accumulator.add_file(sca_path)
+    return result, accumulator.rows()
+
+
+def split_stats(results: list) -> tuple:
+    """
+    Helper function separating the results of several predictions from their statistics
+
+    Parameters
+    ----------
+        results: list
+            (result, rows) tuples, see with_stats(), or None for predictions that failed
+
+    Returns
+    ----------
+        results: list
+            the results, None for predictions that failed
+        stats: pd.DataFrame
+            the statistics rows of every prediction
+    """
+    results = [(None, []) if result is None else result for result in results]
+    rows = [row for _, result_rows in results for row in result_rows]
+    return [result for result, _ in results], pd.DataFrame(rows, columns=COLUMNS)
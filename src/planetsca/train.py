@@ -13,6 +13,8 @@ from rasterio.enums import MergeAlg
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import RepeatedStratifiedKFold, cross_val_score
 
+from planetsca.instrument import span
+
 warnings.filterwarnings("ignore")
 
 
@@ -55,15 +57,19 @@ def vector_rasterize(
     )
 
     # Rasterize vector using the shape and transform of the raster
-    rasterized = features.rasterize(
-        geom_value,
-        out_shape=raster.shape,
-        transform=raster.transform,
-        all_touched=True,
-        fill=9,  # background value
-        merge_alg=MergeAlg.replace,
-        dtype=np.float32,
-    )
+    with span(
+        "rasterize", file=labeled_polygons_filepath, pixels=raster.width * raster.height
+    ) as rasterize_span:
+        rasterized = features.rasterize(
+            geom_value,
+            out_shape=raster.shape,
+            transform=raster.transform,
+            all_touched=True,
+            fill=9,  # background value
+            merge_alg=MergeAlg.replace,
+            dtype=np.float32,
+        )
+        rasterize_span.set(bytes=rasterized.nbytes)
 
     if isinstance(rasterized_mask_output_filepath, str):
         print(
@@ -122,7 +128,9 @@ def data_training_new(
     # save surface reflectance and label to csv file
     N_scale = 10000.0
     img = rasterio.open(training_image_filepath)
-    img_read = img.read() / N_scale
+    with span("read", file=training_image_filepath) as read_span:
+        img_read = img.read() / N_scale
+        read_span.set(pixels=img.width * img.height, bytes=img_read.nbytes)
     df_img = pd.DataFrame(img_read.reshape([4, -1]).T)
     df_label = pd.DataFrame(ROI.reshape([1, -1]).T)
     training_data_df = pd.concat([df_img, df_label], axis=1)
@@ -202,21 +210,23 @@ def train_model(
     cv = RepeatedStratifiedKFold(
         n_splits=n_splits, n_repeats=n_repeats, random_state=random_state
     )
-    n_accuracy = cross_val_score(
-        model, X, y, scoring="accuracy", cv=cv, n_jobs=-1, error_score="raise"
-    )
-    n_f1 = cross_val_score(
-        model, X, y, scoring="f1", cv=cv, n_jobs=-1, error_score="raise"
-    )
-    n_balanced_accuracy = cross_val_score(
-        model,
-        X,
-        y,
-        scoring="balanced_accuracy",
-        cv=cv,
-        n_jobs=-1,
-        error_score="raise",
-    )
+    # the folds run in joblib worker processes, whose CPU time is not in the span's cpu_time_s
+    with span("cross_validation", pixels=len(X), bytes=int(X.memory_usage().sum())):
+        n_accuracy = cross_val_score(
+            model, X, y, scoring="accuracy", cv=cv, n_jobs=-1, error_score="raise"
+        )
+        n_f1 = cross_val_score(
+            model, X, y, scoring="f1", cv=cv, n_jobs=-1, error_score="raise"
+        )
+        n_balanced_accuracy = cross_val_score(
+            model,
+            X,
+            y,
+            scoring="balanced_accuracy",
+            cv=cv,
+            n_jobs=-1,
+            error_score="raise",
+        )
     # report performance
     plt.hist(n_f1)
     print("Repeat times:".format(), len(n_f1))
@@ -228,7 +238,8 @@ def train_model(
     print("Accuracy: %.5f (%.5f)" % (n_accuracy.mean(), n_accuracy.std()))
 
     # fit model with all observations
-    model.fit(X, y)
+    with span("fit", pixels=len(X), bytes=int(X.memory_usage().sum())):
+        model.fit(X, y)
     # save model
     joblib.dump(model, new_model_filepath)
     print(f"Model saved to {new_model_filepath}")
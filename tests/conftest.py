@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from sklearn.ensemble import RandomForestClassifier
+
+
+@pytest.fixture
+def planet_image(tmp_path):
+    # a synthetic 4-band PlanetScope SR image with a clipped (nodata) corner
+    rng = np.random.default_rng(0)
+    arr = rng.integers(1, 10000, size=(4, 300, 200), dtype=np.uint16)
+    arr[:, :50, :80] = 0
+    filepath = str(tmp_path / "20240101_000000_00_0000_3B_AnalyticMS_SR_clip.tif")
+    with rasterio.open(
+        filepath,
+        "w",
+        driver="GTiff",
+        transform=from_origin(600000, 4200000, 3, 3),
+        dtype=rasterio.uint16,
+        count=4,
+        crs="EPSG:32611",
+        width=arr.shape[2],
+        height=arr.shape[1],
+        tiled=True,
+        blockxsize=64,
+        blockysize=64,
+    ) as dst:
+        dst.write(arr)
+    return filepath
+
+
+@pytest.fixture
+def model():
+    rng = np.random.default_rng(1)
+    X = rng.random((500, 4))
+    y = (X[:, 0] + X[:, 3] > 1).astype(int)
+    return RandomForestClassifier(n_estimators=5, max_depth=6, random_state=0).fit(X, y)
+
+
+@pytest.fixture
+def onnx_model(model):
+    from skl2onnx import to_onnx
+
+    return to_onnx(model, np.zeros((1, 4), dtype=np.float32), target_opset=12)
@@ -0,0 +1,105 @@
+import os
+import shutil
+
+import rasterio
+
+from planetsca import catalog, predict
+
+
+def make_scenes(planet_image, tmp_path):
+    scene_dir = tmp_path / "scenes"
+    paths = []
+    for name in ["20240101_000000_00_0000", "20240205_181500_1a2b"]:
+        (scene_dir / name).mkdir(parents=True)
+        path = str(scene_dir / name / f"{name}_3B_AnalyticMS_SR_clip.tif")
+        shutil.copy(planet_image, path)
+        paths.append(path)
+    return str(scene_dir), paths
+
+
+def test_parse_scene_id():
+    assert catalog.parse_scene_id(
+        "/data/20230725_180512_37_2479_3B_AnalyticMS_SR_clip.tif"
+    ) == ("20230725_180512_37_2479", "2023-07-25T18:05:12Z")
+    assert catalog.parse_scene_id("/data/model.tif") == (None, None)
+
+
+def test_find_scenes(planet_image, tmp_path):
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    scene_dir, paths = make_scenes(planet_image, tmp_path)
+    assert catalog.scan_directory(catalog_path, scene_dir) == 2
+    # scenes already in the catalog are not added again
+    assert catalog.scan_directory(catalog_path, scene_dir) == 0
+
+    assert catalog.find_scenes(catalog_path, dirpath=scene_dir) == paths
+    assert catalog.find_scenes(catalog_path, start="2024-02-01") == paths[1:]
+    assert catalog.find_scenes(catalog_path, dirpath=str(tmp_path / "other")) == []
+    # the synthetic image is near (-115.86, 37.94)
+    assert catalog.find_scenes(catalog_path, bounds=[-116, 37, -115, 38]) == paths
+    assert catalog.find_scenes(catalog_path, bounds=[0, 0, 1, 1]) == []
+
+
+def test_predict_sca_catalog(planet_image, model, tmp_path, capsys):
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    scene_dir, paths = make_scenes(planet_image, tmp_path)
+    out = str(tmp_path / "out")
+
+    sca_paths = predict.predict_sca(scene_dir, model, out, catalog_path=catalog_path)
+    assert [os.path.basename(p) for p in sca_paths] == [
+        os.path.basename(predict.sca_output_path(p)) for p in paths
+    ]
+
+    # a rerun with the same model skips both scenes
+    capsys.readouterr()
+    again = predict.predict_sca(scene_dir, model, out, catalog_path=catalog_path)
+    assert again == sca_paths
+    assert "Start to predict" not in capsys.readouterr().out
+
+    # a changed scene is predicted again
+    os.utime(paths[0], ns=(0, 0))
+    predict.predict_sca(scene_dir, model, out, catalog_path=catalog_path)
+    assert capsys.readouterr().out.count("Start to predict") == 1
+
+
+def test_predict_sca_catalog_options(planet_image, model, tmp_path, capsys):
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    scene_dir, paths = make_scenes(planet_image, tmp_path)
+    out = str(tmp_path / "out")
+    predict.predict_sca(scene_dir, model, out, catalog_path=catalog_path)
+
+    # options that change the SCA images are predicted again
+    capsys.readouterr()
+    sca_paths = predict.predict_sca(
+        scene_dir,
+        model,
+        out,
+        catalog_path=catalog_path,
+        nodata_flag=3,
+        compress="deflate",
+    )
+    assert capsys.readouterr().out.count("Start to predict") == 2
+    with rasterio.open(sca_paths[0]) as ds:
+        assert ds.nodata == 3
+        assert ds.compression is not None
+
+    # so are SCA images written to another directory
+    other = str(tmp_path / "other")
+    sca_paths = predict.predict_sca(scene_dir, model, other, catalog_path=catalog_path)
+    assert capsys.readouterr().out.count("Start to predict") == 2
+    assert all(os.path.dirname(p) == other for p in sca_paths)
+    assert all(os.path.isfile(p) for p in sca_paths)
+
+
+def test_predict_sca_catalog_overwritten(planet_image, model, tmp_path, capsys):
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    scene_dir, paths = make_scenes(planet_image, tmp_path)
+    out = str(tmp_path / "out")
+    predict.predict_sca(scene_dir, model, out, catalog_path=catalog_path)
+
+    # an SCA image overwritten without the catalog is predicted again
+    predict.predict_sca(paths[0], model, out, nodata_flag=3)
+    capsys.readouterr()
+    sca_paths = predict.predict_sca(scene_dir, model, out, catalog_path=catalog_path)
+    assert capsys.readouterr().out.count("Start to predict") == 1
+    with rasterio.open(sca_paths[0]) as ds:
+        assert ds.nodata == 9
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from planetsca import download, search
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    # files served by the test server, keyed on their URL path
+    files = {}
+    # (path, Range header) of each request received
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("Range")))
+        body = self.files.get(self.path)
+        if isinstance(body, list):
+            # scripted (status, headers, json) responses, the last one repeats
+            status, headers, data = body.pop(0) if len(body) > 1 else body[0]
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps(data).encode())
+            return
+        if body is None:
+            self.send_error(404)
+            return
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if match is None:
+            self.send_response(200)
+            start = 0
+        elif int(match.group(1)) >= len(body):
+            self.send_error(416)
+            return
+        else:
+            start = int(match.group(1))
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}"
+            )
+        self.send_header("Content-Length", str(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+    def do_POST(self):
+        # a mock of submitting an order to the Planet Orders API
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.requests.append((self.path, payload["name"]))
+        if payload["name"] == "bad_order":
+            self.send_error(400)
+            return
+        order_id = payload["name"]
+        results = [
+            {
+                "location": f"http://{self.headers['Host']}/file_{i}",
+                "name": f"{order_id}/file_{i}.tif",
+            }
+            for i in range(2)
+        ]
+        self.files[f"/orders/{order_id}"] = [
+            (200, {}, {"state": "running"}),
+            (200, {}, {"state": "success", "_links": {"results": results}}),
+        ]
+        self.send_response(202)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps({"id": order_id}).encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def file_server():
+    FileHandler.requests = []
+    FileHandler.files = {f"/file_{i}": os.urandom(100_000 + i) for i in range(5)}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", FileHandler.files
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_results(file_server, tmp_path):
+    url, files = file_server
+    results = [
+        {"location": url + name, "name": f"order/{name[1:]}.tif"} for name in files
+    ]
+    paths = download.download_results(
+        results, str(tmp_path), max_workers=3, chunk_size=4096
+    )
+    assert paths == [str(tmp_path / result["name"]) for result in results]
+    for path, body in zip(paths, files.values()):
+        with open(path, "rb") as f:
+            assert f.read() == body
+
+
+def test_download_file_resume(file_server, tmp_path):
+    url, files = file_server
+    body = files["/file_0"]
+    path = str(tmp_path / "file_0.tif")
+    # an interrupted download left the first part of the file behind
+    with open(path + ".part", "wb") as f:
+        f.write(body[:30_000])
+
+    session = download.make_session()
+    download.download_file(
+        session, url + "/file_0", path, digests={"md5": hashlib.md5(body).hexdigest()}
+    )
+    with open(path, "rb") as f:
+        assert f.read() == body
+    assert not os.path.exists(path + ".part")
+    assert FileHandler.requests == [("/file_0", "bytes=30000-")]
+
+
+def test_download_file_checksum_mismatch(file_server, tmp_path):
+    url, files = file_server
+    path = str(tmp_path / "file_0.tif")
+    with pytest.raises(OSError, match="Checksum mismatch"):
+        download.download_file(
+            download.make_session(),
+            url + "/file_0",
+            path,
+            digests={"sha256": hashlib.sha256(b"something else").hexdigest()},
+        )
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + ".part")
+
+
+def test_download_results_manifest(file_server, tmp_path):
+    url, files = file_server
+    manifest = {
+        "files": [
+            {
+                "path": f"PSScene/{name[1:]}.tif",
+                "size": len(body),
+                "digests": {"md5": hashlib.md5(body).hexdigest()},
+            }
+            for name, body in files.items()
+        ]
+    }
+    files["/manifest.json"] = json.dumps(manifest).encode()
+    results = [
+        {"location": url + name, "name": f"order/PSScene/{name[1:]}.tif"}
+        for name in files
+        if name != "/manifest.json"
+    ] + [{"location": url + "/manifest.json", "name": "order/manifest.json"}]
+
+    # a truncated file from an earlier run, which is downloaded again
+    truncated = tmp_path / "order" / "PSScene" / "file_1.tif"
+    truncated.parent.mkdir(parents=True)
+    truncated.write_bytes(files["/file_1"][:10])
+
+    paths = download.download_results(results, str(tmp_path), max_workers=2)
+    for path, result in zip(paths, results):
+        with open(path, "rb") as f:
+            assert f.read() == files[result["location"][len(url) :].replace(".tif", "")]
+    # the manifest is downloaded before the files it describes
+    assert FileHandler.requests[0][0] == "/manifest.json"
+
+
+def test_download_polls_order_state(file_server, tmp_path):
+    url, files = file_server
+    results = [
+        {"location": url + name, "name": f"order/{name[1:]}.tif"} for name in files
+    ]
+    files["/orders/1"] = [
+        (429, {"Retry-After": "0"}, {}),
+        (200, {}, {"state": "queued", "_links": {}}),
+        (200, {}, {"state": "running", "_links": {}}),
+        (200, {}, {"state": "success", "_links": {"results": results}}),
+    ]
+
+    paths = download.download(
+        "api_key", url + "/orders/1", str(tmp_path), timeout=None, initial_delay=0.01
+    )
+    assert len(paths) == 5
+    assert [path for path, _ in FileHandler.requests[:4]] == ["/orders/1"] * 4
+    # the order is not polled again once it succeeded
+    assert [path for path, _ in FileHandler.requests].count("/orders/1") == 4
+
+
+def test_wait_for_order_timeout_and_failure(file_server):
+    url, files = file_server
+    files["/orders/running"] = [(200, {}, {"state": "running"})]
+    files["/orders/failed"] = [(200, {}, {"state": "failed"})]
+    session = download.make_session("api_key")
+    with pytest.raises(TimeoutError):
+        download.wait_for_order(
+            url + "/orders/running", session, timeout=0.2, initial_delay=0.05
+        )
+    with pytest.raises(RuntimeError, match="failed"):
+        download.wait_for_order(url + "/orders/failed", session)
+
+
+def test_order_and_download_many(file_server, tmp_path):
+    url, files = file_server
+    payloads = [{"name": f"order_{i}"} for i in range(4)] + [{"name": "bad_order"}]
+
+    completed = []
+    orders = download.order_and_download_many(
+        "api_key",
+        payloads,
+        str(tmp_path),
+        max_concurrent_orders=3,
+        max_download_workers=2,
+        requests_per_second=100,
+        initial_delay=0.01,
+        orders_url=url + "/orders",
+        on_complete=completed.append,
+    )
+    assert [order["name"] for order in orders] == [p["name"] for p in payloads]
+    # each order is reported as soon as it completes
+    assert sorted(completed, key=orders.index) == orders
+    for order in orders[:4]:
+        assert order["error"] is None
+        assert order["order_url"] == f"{url}/orders/{order['name']}"
+        assert order["paths"] == [
+            str(tmp_path / order["name"] / f"file_{i}.tif") for i in range(2)
+        ]
+    assert orders[4]["error"] is not None and orders[4]["paths"] == []
+
+
+def test_rate_limited_session(file_server):
+    url, files = file_server
+    session = download.make_session(requests_per_second=20)
+    start = time.monotonic()
+    for _ in range(5):
+        session.get(url + "/file_0")
+    # the first request goes straight away, the others are spaced 50 ms apart
+    assert time.monotonic() - start >= 0.2
+
+
+def test_order_too_many_ids():
+    ids = [f"20230101_{i:06d}_00_0000" for i in range(download.MAX_ITEMS_PER_ORDER + 1)]
+    filter = search.make_geometry_filter_from_bounds([-119.6, 37.7, -119.4, 37.9])
+    # an order the API would reject is not submitted
+    with pytest.raises(ValueError, match="order_and_download_chunks"):
+        download.order("api_key", ids, filter)
+
+
+def test_chunk_ids():
+    ids = [f"202301{day:02d}_{i:06d}_00_0000" for i in range(12) for day in (3, 1, 2)]
+    chunks = download.chunk_ids(ids, max_items=10)
+    assert sorted(sum(chunks, [])) == sorted(ids)
+    assert all(len(chunk) <= 10 for chunk in chunks)
+    # days larger than a chunk (12 items) are split, filling up the chunks in date order
+    assert [len(chunk) for chunk in chunks] == [10, 10, 10, 6]
+    assert {item_id[:8] for item_id in chunks[0]} == {"20230101"}
+
+    payloads = download.build_payloads(
+        ids, [[[0, 0], [1, 0], [1, 1], [0, 0]]], max_items=10
+    )
+    names = [payload["name"] for payload in payloads]
+    assert len(set(names)) == len(names)
+    # names are deterministic
+    assert names == [
+        p["name"]
+        for p in download.build_payloads(
+            ids[::-1], [[[0, 0], [1, 0], [1, 1], [0, 0]]], max_items=10
+        )
+    ]
+
+
+def test_order_and_download_chunks(file_server, tmp_path):
+    url, files = file_server
+    ids = [f"202301{day:02d}_{i:06d}_00_0000" for i in range(3) for day in (1, 2)]
+    filter = search.combine_filters(
+        [search.make_geometry_filter_from_bounds([-119.6, 37.7, -119.4, 37.9])]
+    )
+    orders = download.order_and_download_chunks(
+        "api_key",
+        ids,
+        filter,
+        str(tmp_path),
+        max_items=3,
+        requests_per_second=100,
+        initial_delay=0.01,
+        orders_url=url + "/orders",
+    )
+    assert len(orders) == 2
+    assert all(order["error"] is None and len(order["paths"]) == 2 for order in orders)
@@ -0,0 +1,36 @@
+import json
+
+from planetsca import instrument, predict
+
+
+def test_span_disabled():
+    instrument.clear_sinks()
+    assert not instrument.enabled()
+    with instrument.span("read", pixels=1) as s:
+        s.set(bytes=1)
+    assert s is instrument.span("write")
+
+
+def test_predict_sca_spans(planet_image, model, tmp_path):
+    sink = instrument.add_sink(instrument.ListSink())
+    jsonl_sink = instrument.add_sink(
+        instrument.JSONLinesSink(str(tmp_path / "spans.jsonl"))
+    )
+    try:
+        predict.predict_sca(planet_image, model, str(tmp_path), tile_size=128)
+    finally:
+        instrument.clear_sinks()
+
+    names = [record["name"] for record in sink]
+    assert set(names) == {"read", "preprocess", "inference", "write"}
+    # six 128 pixel tiles cover the 300 x 200 image
+    assert names.count("write") == 6
+    assert sum(r["pixels"] for r in sink if r["name"] == "read") == 300 * 200
+    assert sum(r["pixels"] for r in sink if r["name"] == "inference") == (
+        300 * 200 - 50 * 80
+    )
+    for record in sink:
+        assert record["wall_time_s"] >= 0 and record["cpu_time_s"] >= 0
+
+    with open(jsonl_sink.filepath) as f:
+        assert [json.loads(line) for line in f] == list(sink)
@@ -0,0 +1,380 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+
+from planetsca import instrument, predict
+
+
+def read_sca(filepath):
+    with rasterio.open(filepath) as ds:
+        return ds.read(1)
+
+
+def test_predict_sca(planet_image, model, tmp_path):
+    [sca_path] = predict.predict_sca(planet_image, model, str(tmp_path / "out"))
+    sca = read_sca(sca_path)
+    assert sca.shape == (300, 200)
+    assert (sca[:50, :80] == 9).all()
+    assert set(np.unique(sca)) <= {0, 1, 9}
+
+
+@pytest.mark.parametrize("tile_size", [None, 128])
+def test_predict_sca_windowed(planet_image, model, tmp_path, tile_size):
+    [expected] = predict.predict_sca(planet_image, model, str(tmp_path / "full"))
+    [windowed] = predict.predict_sca(
+        planet_image,
+        model,
+        str(tmp_path / "windowed"),
+        windowed=True,
+        tile_size=tile_size,
+    )
+    np.testing.assert_array_equal(read_sca(windowed), read_sca(expected))
+
+
+def test_iter_windows_merges_strips(planet_image, model, tmp_path, monkeypatch):
+    # a striped copy of the image, with GDAL's default strips of a few rows
+    striped = str(tmp_path / "striped_SR.tif")
+    with rasterio.open(planet_image) as src:
+        profile = {**src.profile, "tiled": False}
+        del profile["blockxsize"], profile["blockysize"]
+        with rasterio.open(striped, "w", **profile) as dst:
+            dst.write(src.read())
+
+    with rasterio.open(striped) as ds:
+        block_height = ds.block_shapes[0][0]
+        windows = list(predict.iter_windows(ds, min_pixels=5000))
+        assert block_height * ds.width < 5000
+        # full-width strips of whole blocks rows covering the image, each with at least 5000 pixels but the last
+        assert all(w.col_off == 0 and w.width == ds.width for w in windows)
+        assert [w.row_off for w in windows] == list(
+            range(0, ds.height, windows[0].height)
+        )
+        assert windows[0].height % block_height == 0
+        assert all(w.width * w.height >= 5000 for w in windows[:-1])
+        assert len(list(predict.iter_windows(ds, min_pixels=1))) == len(
+            list(ds.block_windows(1))
+        )
+
+    [expected] = predict.predict_sca(striped, model, str(tmp_path / "full"))
+    monkeypatch.setattr(predict, "WINDOW_MIN_PIXELS", 5000)
+    [windowed] = predict.predict_sca(
+        striped, model, str(tmp_path / "windowed"), windowed=True
+    )
+    np.testing.assert_array_equal(read_sca(windowed), read_sca(expected))
+
+
+def test_predict_sca_onnx_windowed(planet_image, onnx_model, tmp_path):
+    [expected] = predict.predict_sca_onnx(
+        planet_image, onnx_model, str(tmp_path / "full")
+    )
+    [windowed] = predict.predict_sca_onnx(
+        planet_image, onnx_model, str(tmp_path / "windowed"), tile_size=100
+    )
+    np.testing.assert_array_equal(read_sca(windowed), read_sca(expected))
+
+
+def test_inference_session_cache(onnx_model, tmp_path):
+    predict.clear_session_cache()
+    sess = predict.get_inference_session(onnx_model)
+    assert predict.get_inference_session(onnx_model) is sess
+    assert predict.get_inference_session(sess) is sess
+
+    filepath = str(tmp_path / "model.onnx")
+    with open(filepath, "wb") as f:
+        f.write(onnx_model.SerializeToString())
+    assert predict.get_inference_session(filepath) is predict.get_inference_session(
+        filepath
+    )
+
+    X = np.random.default_rng(2).random((10, 4))
+    np.testing.assert_array_equal(
+        predict.predict_with_onnxruntime(filepath, X),
+        predict.predict_with_onnxruntime(onnx_model, X),
+    )
+    assert predict.model_hash(filepath) == predict.model_hash(onnx_model)
+
+
+def test_predict_sca_n_workers(planet_image, model, tmp_path):
+    bad_image = str(tmp_path / "bad_SR.tif")
+    with open(bad_image, "w") as f:
+        f.write("not a tiff")
+    other_image = str(tmp_path / "other_SR.tif")
+    shutil.copy(planet_image, other_image)
+
+    [expected] = predict.predict_sca(planet_image, model, str(tmp_path / "serial"))
+    # failed images keep their place, with or without worker processes
+    for n_workers in [2, None]:
+        with pytest.warns(UserWarning, match="bad_SR.tif"):
+            sca_image_paths = predict.predict_sca(
+                [planet_image, bad_image, other_image],
+                model,
+                str(tmp_path / f"workers_{n_workers}"),
+                n_workers=n_workers,
+            )
+        assert sca_image_paths[1] is None
+        assert os.path.basename(sca_image_paths[0]) == os.path.basename(expected)
+        assert os.path.basename(sca_image_paths[2]) == "other_SR_SCA.tif"
+        for sca_path in [sca_image_paths[0], sca_image_paths[2]]:
+            np.testing.assert_array_equal(read_sca(sca_path), read_sca(expected))
+
+
+def test_predict_sca_onnx_n_workers(planet_image, onnx_model, tmp_path):
+    other_image = str(tmp_path / "other_SR.tif")
+    shutil.copy(planet_image, other_image)
+
+    [expected] = predict.predict_sca_onnx(
+        planet_image, onnx_model, str(tmp_path / "serial")
+    )
+    sca_image_paths = predict.predict_sca_onnx(
+        [planet_image, other_image],
+        onnx_model,
+        str(tmp_path / "parallel"),
+        n_workers=2,
+    )
+    assert len(sca_image_paths) == 2
+    for sca_path in sca_image_paths:
+        np.testing.assert_array_equal(read_sca(sca_path), read_sca(expected))
+
+
+def classify_array_pandas(arr, predict_fn, nodata_flag=9):
+    # the original pandas implementation of predict.classify_array
+    X_img = pd.DataFrame(arr.reshape([4, -1]).T)
+    X_img.columns = ["blue", "green", "red", "nir"]
+    X_img = X_img / 10000
+    X_img["nodata_flag"] = np.where(X_img["blue"] == 0, -1, 1)
+    y_img = predict_fn(X_img.iloc[:, 0:4].to_numpy())
+    out_img = pd.DataFrame()
+    out_img["label"] = y_img
+    out_img["nodata_flag"] = X_img["nodata_flag"]
+    out_img["label"] = np.where(
+        out_img["nodata_flag"] == -1, nodata_flag, out_img["label"]
+    )
+    return out_img["label"].to_numpy().reshape(arr[0, :, :].shape)
+
+
+def test_classify_array_matches_pandas(planet_image, model):
+    with rasterio.open(planet_image) as ds:
+        arr = predict.read_bands(ds)
+    img_prediction = predict.classify_array(arr, model.predict)
+    assert img_prediction.dtype == np.uint8
+    np.testing.assert_array_equal(
+        img_prediction, classify_array_pandas(arr, model.predict)
+    )
+
+
+def test_classify_array_skip_nodata(planet_image, model):
+    with rasterio.open(planet_image) as ds:
+        arr = predict.read_bands(ds)
+    n_samples = []
+
+    def predict_fn(X):
+        n_samples.append(len(X))
+        return model.predict(X)
+
+    np.testing.assert_array_equal(
+        predict.classify_array(arr, predict_fn, skip_nodata=True),
+        predict.classify_array(arr, predict_fn, skip_nodata=False),
+    )
+    assert n_samples == [300 * 200 - 50 * 80, 300 * 200]
+
+    # images without any data are not sent to the model at all
+    assert (predict.classify_array(np.zeros_like(arr), predict_fn) == 9).all()
+    assert len(n_samples) == 2
+
+
+def test_lookup_table_classifier(planet_image, model, tmp_path):
+    lut = predict.LookupTableClassifier(model)
+    X = np.random.default_rng(3).integers(0, 10000, size=(5000, 4)) / 10000
+    np.testing.assert_array_equal(lut.predict(X), model.predict(X))
+    # the second call is served from the memo
+    n_memo = lut.cache_size
+    np.testing.assert_array_equal(lut.predict(X), model.predict(X))
+    assert lut.cache_size == n_memo
+
+    [expected] = predict.predict_sca(planet_image, model, str(tmp_path / "sklearn"))
+    [sca_path] = predict.predict_sca(planet_image, lut, str(tmp_path / "lut"))
+    np.testing.assert_array_equal(read_sca(sca_path), read_sca(expected))
+
+
+def test_numpy_forest_classifier(model):
+    forest = predict.NumpyForestClassifier(model, batch_size=1000)
+    X = np.random.default_rng(4).integers(0, 10000, size=(5000, 4)) / 10000
+    np.testing.assert_array_equal(forest.predict_proba(X), model.predict_proba(X))
+    np.testing.assert_array_equal(forest.predict(X), model.predict(X))
+
+
+@pytest.mark.parametrize("engine", ["numpy", "lookup_table"])
+def test_predict_sca_engine(planet_image, model, tmp_path, engine):
+    [expected] = predict.predict_sca(planet_image, model, str(tmp_path / "sklearn"))
+    [sca_path] = predict.predict_sca(
+        planet_image, model, str(tmp_path / engine), engine=engine
+    )
+    np.testing.assert_array_equal(read_sca(sca_path), read_sca(expected))
+
+
+@pytest.mark.parametrize("tile_size", [None, 64])
+def test_predict_sca_n_threads(planet_image, model, tmp_path, tile_size):
+    [expected] = predict.predict_sca(planet_image, model, str(tmp_path / "serial"))
+    [threaded] = predict.predict_sca(
+        planet_image,
+        model,
+        str(tmp_path / "threaded"),
+        tile_size=tile_size,
+        engine="lookup_table",
+        n_threads=4,
+    )
+    np.testing.assert_array_equal(read_sca(threaded), read_sca(expected))
+
+
+def test_predict_sca_incremental(planet_image, model, tmp_path, capsys):
+    out = str(tmp_path / "out")
+    [sca_path] = predict.predict_sca(planet_image, model, out, incremental=True)
+    with rasterio.open(sca_path) as ds:
+        assert predict.FINGERPRINT_TAG in ds.tags()
+
+    # nothing changed, the SCA image is kept
+    capsys.readouterr()
+    predict.predict_sca(planet_image, model, out, incremental=True)
+    assert "Start to predict" not in capsys.readouterr().out
+
+    # a new image is predicted, the up to date one is kept
+    new_image = str(tmp_path / "20240102_000000_00_0000_3B_AnalyticMS_SR_clip.tif")
+    shutil.copy(planet_image, new_image)
+    predict.predict_sca([planet_image, new_image], model, out, incremental=True)
+    assert capsys.readouterr().out.count("Start to predict") == 1
+
+    # another model invalidates the SCA images
+    model.set_params(n_estimators=6).fit(
+        np.random.default_rng(0).random((50, 4)), [0, 1] * 25
+    )
+    predict.predict_sca(planet_image, model, out, incremental=True, hash_inputs=True)
+    assert capsys.readouterr().out.count("Start to predict") == 1
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"compress": "deflate", "tiled": True, "overviews": True},
+        {"compress": "zstd"},
+        {"cog": True},
+    ],
+)
+def test_predict_sca_output_profile(planet_image, model, tmp_path, options):
+    [expected] = predict.predict_sca(planet_image, model, str(tmp_path / "plain"))
+    [sca_path] = predict.predict_sca(
+        planet_image, model, str(tmp_path / "out"), incremental=True, **options
+    )
+    np.testing.assert_array_equal(read_sca(sca_path), read_sca(expected))
+    assert os.listdir(tmp_path / "out") == [os.path.basename(sca_path)]
+    with rasterio.open(sca_path) as ds:
+        assert ds.compression.value == options.get("compress", "deflate").upper()
+        if options.get("tiled") or options.get("cog"):
+            assert ds.block_shapes[0] == (256, 256)
+            assert ds.overviews(1) == [2]
+        assert predict.FINGERPRINT_TAG in ds.tags()
+        if options.get("cog"):
+            assert ds.tags(ns="IMAGE_STRUCTURE")["LAYOUT"] == "COG"
+
+
+def test_predict_sca_nbits(planet_image, model, tmp_path):
+    [expected] = predict.predict_sca(planet_image, model, str(tmp_path / "full"))
+    [packed] = predict.predict_sca(
+        planet_image, model, str(tmp_path / "packed"), nodata_flag=3, nbits=2
+    )
+    with rasterio.open(packed) as ds:
+        assert ds.tags(1, ns="IMAGE_STRUCTURE")["NBITS"] == "2"
+        assert ds.nodata == 3
+    sca = read_sca(expected)
+    np.testing.assert_array_equal(read_sca(packed), np.where(sca == 9, 3, sca))
+    assert os.path.getsize(packed) < os.path.getsize(expected) / 3
+
+    [cog] = predict.predict_sca(
+        planet_image, model, str(tmp_path / "cog"), nodata_flag=3, nbits=2, cog=True
+    )
+    np.testing.assert_array_equal(read_sca(cog), read_sca(packed))
+
+    with pytest.raises(ValueError):
+        predict.predict_sca(planet_image, model, str(tmp_path / "bad"), nbits=2)
+
+
+def test_predict_sca_in_memory(planet_image, model, tmp_path):
+    [expected] = predict.predict_sca(planet_image, model, str(tmp_path / "full"))
+    out = tmp_path / "memory"
+    [(sca, profile)] = predict.predict_sca(
+        planet_image, model, str(out), windowed=True, in_memory=True
+    )
+    assert os.listdir(out) == []
+    np.testing.assert_array_equal(sca, read_sca(expected))
+    with rasterio.open(expected) as ds:
+        assert profile["transform"] == ds.transform
+        assert profile["crs"] == ds.crs
+        assert profile["nodata"] == 9
+
+
+@pytest.fixture
+def udm2_image(planet_image):
+    # a UDM2 image next to the SR image, with a cloud and a shadow
+    udm2 = np.zeros((8, 300, 200), dtype=np.uint8)
+    udm2[5, 100:150, 50:150] = 1  # cloud
+    udm2[2, 200:220, :] = 1  # shadow
+    filepath = planet_image.replace("AnalyticMS_SR_clip", "udm2_clip")
+    with rasterio.open(planet_image) as ds:
+        profile = ds.profile
+    profile.update(count=8, dtype=rasterio.uint8)
+    with rasterio.open(filepath, "w", **profile) as dst:
+        dst.write(udm2)
+    return filepath
+
+
+@pytest.mark.parametrize(
+    "options", [{}, {"windowed": True}, {"n_threads": 2}, {"in_memory": True}]
+)
+def test_predict_sca_udm2(planet_image, udm2_image, model, tmp_path, options):
+    assert predict.find_udm2(planet_image) == udm2_image
+    [expected] = predict.predict_sca(planet_image, model, str(tmp_path / "full"))
+    sca = read_sca(expected)
+    masked = np.zeros(sca.shape, dtype=bool)
+    masked[100:150, 50:150] = True
+    masked[200:220, :] = True
+    sca[masked & (sca != 9)] = 8
+
+    records = instrument.add_sink(instrument.ListSink())
+    try:
+        [result] = predict.predict_sca(
+            planet_image, model, str(tmp_path / "udm2"), udm2=True, **options
+        )
+    finally:
+        instrument.remove_sink(records)
+    udm2_sca = result[0] if options.get("in_memory") else read_sca(result)
+    np.testing.assert_array_equal(udm2_sca, sca)
+    # cloudy and shadowed pixels are not classified
+    inference = sum(r["pixels"] for r in records if r["name"] == "inference")
+    assert inference == (sca < 8).sum()
+
+
+def test_predict_sca_udm2_missing(planet_image, model, tmp_path):
+    with pytest.warns(UserWarning, match="No UDM2 image"):
+        predict.predict_sca(planet_image, model, str(tmp_path), udm2=True)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"cloud_flag": 1},
+        {"cloud_flag": 9},
+        {"cloud_flag": 8, "nodata_flag": 3, "nbits": 2},
+    ],
+)
+def test_predict_sca_udm2_bad_cloud_flag(
+    planet_image, udm2_image, model, tmp_path, options
+):
+    # bad options are rejected up front, not image by image
+    with pytest.raises(ValueError, match="cloud_flag"):
+        predict.predict_sca(
+            planet_image, model, str(tmp_path / "bad"), udm2=True, **options
+        )
+    assert not os.listdir(tmp_path / "bad")
@@ -0,0 +1,229 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+from shapely.geometry import box, mapping, shape
+
+from planetsca import search, search_cache
+
+BOUNDS = [-119.6, 37.7, -119.4, 37.9]
+
+
+def make_features(n, seed=0):
+    rng = np.random.default_rng(seed)
+    features = []
+    for i in range(n):
+        x, y = rng.uniform(-119.8, -119.4), rng.uniform(37.6, 37.9)
+        day = 1 + i % 28
+        features.append(
+            {
+                "type": "Feature",
+                "id": f"202301{day:02d}_{i:06d}_00_0000",
+                "geometry": mapping(box(x, y, x + 0.25, y + 0.12)),
+                "properties": {
+                    "acquired": f"2023-01-{day:02d}T18:00:00Z",
+                    "cloud_cover": float(rng.uniform(0, 1)),
+                },
+            }
+        )
+    return features
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    # features returned by the mock quick-search, split into pages
+    features = []
+    # features matching the date range of the last search
+    matched = []
+    # (method, path) of each request received
+    requests = []
+
+    def send_page(self, start, page_size):
+        page = self.matched[start : start + page_size]
+        links = {}
+        if start + page_size < len(self.matched):
+            links["_next"] = (
+                f"http://{self.headers['Host']}/page?start={start + page_size}"
+                f"&size={page_size}"
+            )
+        body = json.dumps(
+            {"type": "FeatureCollection", "features": page, "_links": links}
+        )
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.requests.append(("POST", self.path))
+        date_range = [
+            f["config"]
+            for f in body["filter"]["config"]
+            if f["type"] == "DateRangeFilter"
+        ][0]
+        gte = search_cache.normalize_date(date_range["gte"])
+        lte = search_cache.normalize_date(date_range["lte"])
+        SearchHandler.matched = [
+            f
+            for f in self.features
+            if gte <= search_cache.normalize_date(f["properties"]["acquired"]) <= lte
+        ]
+        self.send_page(0, int(self.path.split("_page_size=")[1]))
+
+    def do_GET(self):
+        self.requests.append(("GET", self.path))
+        query = dict(p.split("=") for p in self.path.split("?")[1].split("&"))
+        self.send_page(int(query["start"]), int(query["size"]))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def search_server(monkeypatch):
+    SearchHandler.features = make_features(23)
+    SearchHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SearchHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(
+        search, "QUICK_SEARCH_URL", f"http://127.0.0.1:{server.server_port}/search"
+    )
+    yield SearchHandler
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def filter():
+    return search.combine_filters(
+        [
+            search.make_geometry_filter_from_bounds(BOUNDS),
+            search.make_date_range_filter(
+                "2023-01-01T00:00:00Z", "2023-01-31T00:00:00Z"
+            ),
+        ]
+    )
+
+
+def test_search_follows_next_links(search_server, filter):
+    gdf = search.search("api_key", filter, page_size=10)
+    assert list(gdf["id"]) == [f["id"] for f in search_server.features]
+    assert [method for method, _ in search_server.requests] == ["POST", "GET", "GET"]
+
+
+def test_iter_search(search_server, filter):
+    gdfs = list(search.iter_search("api_key", filter, page_size=10))
+    assert [len(gdf) for gdf in gdfs] == [10, 10, 3]
+
+
+def test_search_cache(search_server, filter, tmp_path):
+    cache_path = str(tmp_path / "search.sqlite")
+    gdf = search.search("api_key", filter, cache_path=cache_path)
+    assert len(search_server.requests) == 1
+
+    # the same search is read from the cache
+    cached = search.search("api_key", filter, cache_path=cache_path)
+    assert len(search_server.requests) == 1
+    assert list(cached["id"]) == list(gdf["id"])
+
+    # an expired search is sent to the API again
+    search.search("api_key", filter, cache_path=cache_path, cache_ttl=0)
+    assert len(search_server.requests) == 2
+
+
+def test_search_cache_incremental(search_server, filter, tmp_path):
+    cache_path = str(tmp_path / "search.sqlite")
+    first_half = search_cache.with_date_range(
+        filter, "2023-01-01T00:00:00Z", "2023-01-15T00:00:00Z"
+    )
+    search.search("api_key", first_half, cache_path=cache_path)
+
+    # only the uncached part of the date range is searched
+    gdf = search.search("api_key", filter, cache_path=cache_path)
+    assert len(search_server.requests) == 2
+    assert sorted(gdf["id"]) == sorted(f["id"] for f in search_server.features)
+
+
+def test_missing_date_ranges():
+    assert search_cache.missing_date_ranges("a", "z", []) == [("a", "z")]
+    assert search_cache.missing_date_ranges("c", "k", [("a", "d"), ("f", "g")]) == [
+        ("d", "f"),
+        ("g", "k"),
+    ]
+    assert search_cache.missing_date_ranges("c", "c", [("a", "d")]) == []
+
+
+def test_search_cache_eviction(search_server, filter, tmp_path):
+    cache_path = str(tmp_path / "search.sqlite")
+    other = search_cache.with_date_range(
+        filter, "2023-01-01T00:00:00Z", "2023-01-10T00:00:00Z"
+    )
+    search.search("api_key", filter, cache_path=cache_path, incremental=False)
+    search.search(
+        "api_key", other, cache_path=cache_path, incremental=False, cache_max_bytes=1
+    )
+    # the least recently used search was evicted
+    search.search("api_key", filter, cache_path=cache_path, incremental=False)
+    assert len(search_server.requests) == 3
+
+
+def test_features_to_gdf_overlap(filter):
+    features = make_features(200)
+    gdf = search.features_to_gdf(features, filter)
+    domain = box(*BOUNDS)
+    expected = [shape(f["geometry"]).intersection(domain).area for f in features]
+    np.testing.assert_allclose(gdf["intersection_area"], expected)
+    assert list(gdf["id"]) == [f["id"] for f in features]
+    assert (gdf["overlap_percentage"] <= 100).all()
+
+    equal_area = search.features_to_gdf(features, filter, equal_area=True)
+    # areas in square meters, overlap percentages close to the ones in degrees
+    assert equal_area["intersection_area"].max() > 1e6
+    np.testing.assert_allclose(
+        equal_area["overlap_percentage"], gdf["overlap_percentage"], atol=1
+    )
+
+
+def test_select_scenes(filter):
+    x0, y0, x1, y1 = BOUNDS
+    xm = (x0 + x1) / 2
+
+    def feature(id, geometry, day, cloud_cover):
+        return {
+            "type": "Feature",
+            "id": id,
+            "geometry": mapping(geometry),
+            "properties": {
+                "acquired": f"2023-01-{day:02d}T18:00:00Z",
+                "cloud_cover": cloud_cover,
+            },
+        }
+
+    features = [
+        # day 1: two halves of the AOI, a cloudy copy of the west half, a sliver and a scene far away
+        feature("west", box(x0, y0, xm, y1), 1, 0.0),
+        feature("west_cloudy", box(x0, y0, xm, y1), 1, 0.8),
+        feature("east", box(xm, y0, x1, y1), 1, 0.1),
+        feature("sliver", box(x0, y0, x1, y0 + 0.01), 1, 0.0),
+        feature("far", box(0, 0, 1, 1), 1, 0.0),
+        # day 2: one scene covering the whole AOI
+        feature("whole", box(x0 - 0.1, y0 - 0.1, x1 + 0.1, y1 + 0.1), 2, 0.2),
+    ]
+    gdf = search.features_to_gdf(features, filter)
+    selected = search.select_scenes(gdf, filter, target_coverage=99)
+    assert list(selected["id"]) == ["west", "east", "whole"]
+    assert selected["coverage"].iloc[-1] == pytest.approx(100)
+    assert selected["window"].nunique() == 2
+
+    # a cloudy scene adding coverage is picked over a clear scene adding none
+    features = [
+        feature("west", box(x0, y0, xm, y1), 1, 0.0),
+        feature("west_copy", box(x0, y0, xm, y1), 1, 0.0),
+        feature("east_cloudy", box(xm, y0, x1, y1), 1, 0.9),
+    ]
+    gdf = search.features_to_gdf(features, filter)
+    selected = search.select_scenes(gdf, filter, cloud_cover_weight=2)
+    assert list(selected["id"]) == ["west", "east_cloudy"]
@@ -0,0 +1,125 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import rasterio
+from shapely.geometry import box
+
+from planetsca import predict, stats
+
+
+def read_sca(filepath):
+    with rasterio.open(filepath) as ds:
+        return ds.read(1)
+
+
+@pytest.fixture
+def zones():
+    # the west and east halves of the synthetic image
+    return gpd.GeoDataFrame(
+        {"name": ["west", "east"]},
+        geometry=[
+            box(600000, 4199100, 600300, 4200000),
+            box(600300, 4199100, 600600, 4200000),
+        ],
+        crs="EPSG:32611",
+    )
+
+
+@pytest.mark.parametrize(
+    "options", [{}, {"windowed": True}, {"n_threads": 2}, {"in_memory": True}]
+)
+def test_predict_sca_stats(planet_image, model, tmp_path, options):
+    [sca_path] = predict.predict_sca(planet_image, model, str(tmp_path / "sca"))
+    sca = read_sca(sca_path)
+
+    results, df = predict.predict_sca(
+        planet_image, model, str(tmp_path / "stats"), stats=True, **options
+    )
+    assert len(results) == 1
+    [row] = df.to_dict("records")
+    assert row["file"] == planet_image
+    assert row["zone"] is None or np.isnan(row["zone"])
+    assert row["pixels"] == sca.size
+    assert row["snow_pixels"] == (sca == 1).sum()
+    assert row["nodata_pixels"] == (sca == 9).sum()
+    assert row["sca_fraction"] == pytest.approx((sca == 1).sum() / (sca < 2).sum())
+    assert row["snow_area"] == (sca == 1).sum() * 9
+
+
+def test_predict_sca_zonal_stats(planet_image, model, tmp_path, zones):
+    zones_path = str(tmp_path / "zones.gpkg")
+    # zones in another crs are reprojected to the grid of the image
+    zones.to_crs("EPSG:4326").to_file(zones_path)
+
+    [sca_path], df = predict.predict_sca(
+        planet_image,
+        model,
+        str(tmp_path),
+        stats=True,
+        zones=zones_path,
+        zone_field="name",
+    )
+    sca = read_sca(sca_path)
+    # a row for the scene, then one per zone
+    assert df["zone"].isna().iloc[0]
+    assert list(df["zone"].iloc[1:]) == ["west", "east"]
+    df = df.set_index("zone", drop=False)
+    for name, columns in [("west", slice(None, 100)), ("east", slice(100, None))]:
+        # pixels on the edges of the reprojected zones may fall on either side
+        assert df.loc[name, "pixels"] == pytest.approx(sca[:, columns].size, rel=0.02)
+        assert df.loc[name, "snow_pixels"] == pytest.approx(
+            (sca[:, columns] == 1).sum(), rel=0.02
+        )
+
+
+def test_sca_stats_zones(planet_image, zones):
+    stats.clear_zone_cache()
+    accumulator = stats.SCAStats(planet_image, zones=zones)
+    zone_raster = accumulator.zone_raster
+    assert (zone_raster[:, :100] == 1).all() and (zone_raster[:, 100:] == 2).all()
+    # the zones are rasterized once per grid
+    assert stats.SCAStats(planet_image, zones=zones).zone_raster is zone_raster
+
+    labels = np.zeros(zone_raster.shape, dtype=np.uint8)
+    labels[:, 150:] = 1
+    accumulator.add(rasterio.windows.Window(0, 0, 200, 300), labels)
+    rows = accumulator.rows()
+    assert [row["snow_pixels"] for row in rows] == [15000, 0, 15000]
+    assert [row["sca_fraction"] for row in rows] == [0.25, 0, 0.5]
+
+
+def test_predict_sca_stats_incremental(planet_image, model, tmp_path):
+    _, df = predict.predict_sca(
+        planet_image, model, str(tmp_path), incremental=True, stats=True
+    )
+    # the statistics of up to date SCA images are read from them
+    _, up_to_date = predict.predict_sca(
+        planet_image, model, str(tmp_path), incremental=True, stats=True
+    )
+    assert up_to_date.equals(df)
+
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    predict.predict_sca(planet_image, model, str(tmp_path), catalog_path=catalog_path)
+    _, cataloged = predict.predict_sca(
+        planet_image, model, str(tmp_path), catalog_path=catalog_path, stats=True
+    )
+    assert cataloged.equals(df)
+
+
+def test_predict_sca_stats_catalog_options(planet_image, model, tmp_path):
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    predict.predict_sca(planet_image, model, str(tmp_path), catalog_path=catalog_path)
+
+    # the SCA image written with nodata_flag=9 is not summarized with nodata_flag=3
+    [sca_path], df = predict.predict_sca(
+        planet_image,
+        model,
+        str(tmp_path),
+        catalog_path=catalog_path,
+        nodata_flag=3,
+        stats=True,
+    )
+    sca = read_sca(sca_path)
+    assert (sca == 9).sum() == 0
+    assert df["nodata_pixels"].iloc[0] == (sca == 3).sum() > 0
+    assert df["valid_fraction"].iloc[0] == pytest.approx((sca < 2).mean())